@@ -1,58 +1,183 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, Set, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 import asyncio
+import time
 
 from models import (
     KalshiMarket, KalshiOrderBook, KalshiTrade, KalshiCandlestick,
-    MarketAnalytics, OrderBookAnalytics, LiquidityMetrics,
+    MarketAnalytics, OrderBookAnalytics, LiquidityMetrics, TradeFlowMetrics,
     ArbitrageOpportunity, DashboardStats, ConfidenceLevel,
-    ChartDataPoint
+    ChartDataPoint, EventArbitrageOpportunity, ComplementArbitrageOpportunity,
+    AnalyticsRequest
 )
 from kalshi_client import KalshiClient
+from arbitrage import ArbitrageScanner
+from compact import CompactOrderBook, TradeColumns, BookDiff, to_epoch
+from depth import price_gaps
+from trade_flow import trade_flow
+import profiling
+from budget import AdmissionMode
+import scheduler
+from scheduler import Priority
+
+# Trades as models or as columns from the bulk ingestion path
+Trades = Union[List[KalshiTrade], TradeColumns]
+
+# Order books sampled for dashboard liquidity, normally and under a tight budget
+LIQUIDITY_SAMPLE = 50
+DEGRADED_LIQUIDITY_SAMPLE = 10
+
+# Upstream inputs each MarketAnalytics field is computed from
+FIELD_INPUTS = {
+    "volatility": {"trades"},
+    "momentum": {"trades"},
+    "volume_trend": {"trades"},
+    "price_efficiency": {"trades"},
+    "liquidity_score": {"orderbook"},
+    "risk_score": {"market", "orderbook", "trades"},
+    "orderbook_analytics": {"orderbook"},
+    "liquidity_metrics": {"orderbook", "trades"},
+    "trade_flow": {"trades"},
+    "recent_trades": {"trades"}
+}
+
+class BookMemo:
+    """Book-only results for one order book snapshot, keyed by its fingerprint"""
+
+    __slots__ = ("fingerprint", "bid_volume", "ask_volume", "levels", "results")
+
+    def __init__(self, fingerprint: str, bid_volume: int, ask_volume: int, levels: int):
+        self.fingerprint = fingerprint
+        # Yes-side totals, rolled forward from book diffs where possible
+        self.bid_volume = bid_volume
+        self.ask_volume = ask_volume
+        self.levels = levels
+        self.results: Dict[str, Any] = {}
 
 class AnalyticsEngine:
     def __init__(self):
         self.cache_ttl = 300  # 5 minutes cache TTL
         self.analytics_cache = {}
+        # Last good dashboard stats and when they were computed (epoch seconds)
+        self.dashboard_stats: Optional[DashboardStats] = None
+        self.dashboard_stats_at = 0.0
+        self.arbitrage_scanner = ArbitrageScanner()
+        # Latest book-only results per market; quiet markets repeat the same book
+        self.book_memos: Dict[str, BookMemo] = {}
+        self.book_memo_hits = 0
+        self.book_memo_misses = 0
+        # Trade-flow metrics for the last trade columns seen, shared by the fields that use them
+        self._last_flow: Tuple[Optional[TradeColumns], Dict[str, Any]] = (None, {})
+        # Local series/event graph when the service keeps one; see hierarchy.MarketHierarchy
+        self.hierarchy = None
     
-    async def calculate_market_analytics(self, market: KalshiMarket, 
-                                       orderbook: KalshiOrderBook,
-                                       trades: List[KalshiTrade]) -> MarketAnalytics:
-        """Calculate comprehensive analytics for a market"""
-        
-        # Calculate order book analytics
-        orderbook_analytics = self._calculate_orderbook_analytics(orderbook)
-        
-        # Calculate liquidity metrics
-        liquidity_metrics = self._calculate_liquidity_metrics(orderbook, trades)
-        
-        # Calculate market metrics
-        volatility = self._calculate_volatility(trades)
-        momentum = self._calculate_momentum(trades)
-        volume_trend = self._calculate_volume_trend(trades)
-        price_efficiency = self._calculate_price_efficiency(trades)
-        liquidity_score = self._calculate_liquidity_score(orderbook)
-        risk_score = self._calculate_risk_score(market, orderbook, trades)
-        
-        return MarketAnalytics(
-            market_ticker=market.ticker,
-            volatility=volatility,
-            momentum=momentum,
-            volume_trend=volume_trend,
-            price_efficiency=price_efficiency,
-            liquidity_score=liquidity_score,
-            risk_score=risk_score,
-            orderbook_analytics=orderbook_analytics,
-            liquidity_metrics=liquidity_metrics,
-            recent_trades=trades[-50:],  # Last 50 trades
-            price_history=[]  # This would be populated from candlestick data
-        )
+    def plan(self, request: AnalyticsRequest) -> Tuple[Set[str], Set[str]]:
+        """Resolve the requested fields and the minimal set of inputs they need.
+
+        Fields that depend on an excluded input (include_orderbook /
+        include_trades) are dropped. Raises ValueError for unknown fields.
+        """
+        fields = set(request.fields) if request.fields else set(FIELD_INPUTS)
+        unknown = fields - set(FIELD_INPUTS)
+        if unknown:
+            raise ValueError(
+                f"Unknown analytics fields: {', '.join(sorted(unknown))}; "
+                f"expected any of {', '.join(FIELD_INPUTS)}"
+            )
+
+        excluded = set()
+        if not request.include_orderbook:
+            excluded.add("orderbook")
+        if not request.include_trades:
+            excluded.add("trades")
+
+        fields = {field for field in fields if not FIELD_INPUTS[field] & excluded}
+        inputs = set().union(*(FIELD_INPUTS[field] for field in fields))
+        return fields, inputs
+    
+    async def calculate_market_analytics(self, market: Optional[KalshiMarket], 
+                                       orderbook: Optional[KalshiOrderBook],
+                                       trades: Optional[Trades],
+                                       market_ticker: Optional[str] = None,
+                                       fields: Optional[Set[str]] = None,
+                                       changes: Optional[BookDiff] = None) -> MarketAnalytics:
+        """Calculate analytics for a market, limited to `fields` when given.
+
+        `changes` is the order book's diff against its previous snapshot,
+        used to roll the memoized book totals forward instead of re-summing.
+        """
+        fields = set(FIELD_INPUTS) if fields is None else fields
+        market_ticker = market_ticker or market.ticker
+        if trades is not None:
+            trades = self._trade_columns(trades, market_ticker)
+        if orderbook is not None:
+            self._book_memo(orderbook, changes)
+        
+        # Each metric only runs when requested; inputs for the rest may be missing
+        calculators = {
+            "orderbook_analytics": lambda: self._calculate_orderbook_analytics(orderbook),
+            "liquidity_metrics": lambda: self._calculate_liquidity_metrics(orderbook, trades),
+            "trade_flow": lambda: self._calculate_trade_flow(trades),
+            "volatility": lambda: self._calculate_volatility(trades),
+            "momentum": lambda: self._calculate_momentum(trades),
+            "volume_trend": lambda: self._calculate_volume_trend(trades),
+            "price_efficiency": lambda: self._calculate_price_efficiency(trades),
+            "liquidity_score": lambda: self._calculate_liquidity_score(orderbook),
+            "risk_score": lambda: self._calculate_risk_score(market, orderbook, trades),
+            "recent_trades": lambda: trades.to_models(limit=50)  # Last 50 trades
+        }
+        
+        with profiling.phase("compute"):
+            return MarketAnalytics(
+                market_ticker=market_ticker,
+                price_history=[],  # This would be populated from candlestick data
+                **{field: calculate() for field, calculate in calculators.items() if field in fields}
+            )
     
+    def _book_memo(self, orderbook: KalshiOrderBook, changes: Optional[BookDiff] = None) -> BookMemo:
+        """Memo for this exact book, reusing the last one when the book is unchanged"""
+        fingerprint = orderbook.fingerprint or CompactOrderBook.from_model(orderbook).fingerprint
+        memo = self.book_memos.get(orderbook.market_ticker)
+        if memo is not None and memo.fingerprint == fingerprint:
+            self.book_memo_hits += 1
+            return memo
+
+        self.book_memo_misses += 1
+        if (memo is not None and changes is not None
+                and changes.base == memo.fingerprint and changes.fingerprint == fingerprint):
+            memo = BookMemo(
+                fingerprint,
+                memo.bid_volume + changes.size_delta("yes_bids"),
+                memo.ask_volume + changes.size_delta("yes_asks"),
+                memo.levels + changes.level_delta("yes_bids") + changes.level_delta("yes_asks")
+            )
+        else:
+            memo = BookMemo(
+                fingerprint,
+                sum([bid.size for bid in orderbook.yes_bids]),
+                sum([ask.size for ask in orderbook.yes_asks]),
+                len(orderbook.yes_bids) + len(orderbook.yes_asks)
+            )
+        self.book_memos[orderbook.market_ticker] = memo
+        return memo
+
+    def _memoized(self, orderbook: KalshiOrderBook, key: str, calculate):
+        """Result of `calculate(memo)` computed at most once per book fingerprint"""
+        memo = self._book_memo(orderbook)
+        if key not in memo.results:
+            memo.results[key] = calculate(memo)
+        return memo.results[key]
+
     def _calculate_orderbook_analytics(self, orderbook: KalshiOrderBook) -> OrderBookAnalytics:
         """Calculate order book analytics"""
+        return self._memoized(
+            orderbook, "orderbook_analytics", lambda memo: self._orderbook_analytics(orderbook, memo)
+        )
+
+    def _orderbook_analytics(self, orderbook: KalshiOrderBook, memo: BookMemo) -> OrderBookAnalytics:
         
         # Calculate mid price
         best_bid = max([bid.price for bid in orderbook.yes_bids], default=0)
@@ -71,9 +196,9 @@ class AnalyticsEngine:
         bid_price_1000 = self._calculate_bid_price(orderbook.yes_bids, 1000)
         ask_price_1000 = self._calculate_ask_price(orderbook.yes_asks, 1000)
         
-        # Calculate total volumes
-        total_bid_volume = sum([bid.size for bid in orderbook.yes_bids])
-        total_ask_volume = sum([ask.size for ask in orderbook.yes_asks])
+        # Total volumes are kept on the memo
+        total_bid_volume = memo.bid_volume
+        total_ask_volume = memo.ask_volume
         
         # Detect price gaps
         gaps = self._detect_price_gaps(orderbook)
@@ -94,78 +219,81 @@ class AnalyticsEngine:
         )
     
     def _calculate_liquidity_metrics(self, orderbook: KalshiOrderBook, 
-                                   trades: List[KalshiTrade]) -> LiquidityMetrics:
+                                   trades: Trades) -> LiquidityMetrics:
         """Calculate liquidity metrics"""
+        book = self._memoized(orderbook, "book_liquidity", lambda memo: self._book_liquidity(orderbook))
+        bid_ask_spread = book["bid_ask_spread"]
+        
+        # Effective spreads paid by recent trades; the quoted spread until both sides have traded
+        flow = self._trade_flow(self._trade_columns(trades, orderbook.market_ticker))
+        avg_spread = flow["mean_effective_spread"]
+        if avg_spread is None:
+            avg_spread = bid_ask_spread
+        volume_weighted_spread = flow["effective_spread"]
+        if volume_weighted_spread is None:
+            volume_weighted_spread = avg_spread
         
+        return LiquidityMetrics(
+            avg_spread=avg_spread,
+            market_depth=book["market_depth"],
+            bid_ask_spread=bid_ask_spread,
+            volume_weighted_spread=volume_weighted_spread,
+            price_impact_100=book["price_impact_100"],
+            price_impact_1000=book["price_impact_1000"]
+        )
+    
+    def _book_liquidity(self, orderbook: KalshiOrderBook) -> Dict[str, float]:
+        """The order book side of the liquidity metrics"""
         # Calculate bid-ask spread
         best_bid = max([bid.price for bid in orderbook.yes_bids], default=0)
         best_ask = min([ask.price for ask in orderbook.yes_asks], default=1)
         bid_ask_spread = best_ask - best_bid if best_bid > 0 and best_ask < 1 else 0
         
-        # Calculate average spread over recent trades
-        recent_spreads = []
-        for trade in trades[-20:]:  # Last 20 trades
-            # Estimate spread based on trade price deviation
-            spread_estimate = abs(trade.price - 0.5) * 2  # Simple estimate
-            recent_spreads.append(spread_estimate)
-        
-        avg_spread = np.mean(recent_spreads) if recent_spreads else bid_ask_spread
-        
         # Calculate market depth (total volume at best prices)
         best_bid_volume = sum([bid.size for bid in orderbook.yes_bids 
                               if abs(bid.price - best_bid) < 0.01])
         best_ask_volume = sum([ask.size for ask in orderbook.yes_asks 
                               if abs(ask.price - best_ask) < 0.01])
-        market_depth = (best_bid_volume + best_ask_volume) / 2
         
-        # Calculate volume-weighted spread
-        total_volume = sum([trade.size for trade in trades[-50:]])
-        if total_volume > 0:
-            weighted_spreads = [trade.size * avg_spread for trade in trades[-50:]]
-            volume_weighted_spread = sum(weighted_spreads) / total_volume
-        else:
-            volume_weighted_spread = avg_spread
-        
-        # Calculate price impact for different order sizes
-        price_impact_100 = self._calculate_price_impact(orderbook, 100)
-        price_impact_1000 = self._calculate_price_impact(orderbook, 1000)
-        
-        return LiquidityMetrics(
-            avg_spread=avg_spread,
-            market_depth=market_depth,
-            bid_ask_spread=bid_ask_spread,
-            volume_weighted_spread=volume_weighted_spread,
-            price_impact_100=price_impact_100,
-            price_impact_1000=price_impact_1000
-        )
+        return {
+            "bid_ask_spread": bid_ask_spread,
+            "market_depth": (best_bid_volume + best_ask_volume) / 2,
+            # Calculate price impact for different order sizes
+            "price_impact_100": self._calculate_price_impact(orderbook, 100),
+            "price_impact_1000": self._calculate_price_impact(orderbook, 1000)
+        }
+    
+    def _calculate_trade_flow(self, trades: Trades) -> TradeFlowMetrics:
+        """VWAP windows, order-flow imbalance, size distribution, price impact and spreads"""
+        return TradeFlowMetrics(**self._trade_flow(self._trade_columns(trades)))
     
-    def _calculate_volatility(self, trades: List[KalshiTrade]) -> float:
+    def _trade_flow(self, trades: TradeColumns) -> Dict[str, Any]:
+        columns, flow = self._last_flow
+        if columns is not trades:
+            flow = trade_flow(trades)
+            self._last_flow = (trades, flow)
+        return flow
+    
+    def _calculate_volatility(self, trades: Trades) -> float:
         """Calculate price volatility from recent trades"""
-        if len(trades) < 2:
-            return 0.0
-        
-        prices = [trade.price for trade in trades[-50:]]
+        prices = self._trade_columns(trades).prices[-50:]
         if len(prices) < 2:
             return 0.0
         
-        returns = []
-        for i in range(1, len(prices)):
-            if prices[i-1] > 0:
-                ret = (prices[i] - prices[i-1]) / prices[i-1]
-                returns.append(ret)
+        previous = prices[:-1]
+        valid = previous > 0
+        returns = (prices[1:][valid] - previous[valid]) / previous[valid]
         
-        return float(np.std(returns)) if returns else 0.0
+        return float(np.std(returns)) if len(returns) else 0.0
     
-    def _calculate_momentum(self, trades: List[KalshiTrade]) -> float:
+    def _calculate_momentum(self, trades: Trades) -> float:
         """Calculate price momentum from recent trades"""
-        if len(trades) < 2:
+        prices = self._trade_columns(trades).prices
+        if len(prices) < 2:
             return 0.0
         
-        recent_trades = trades[-10:]
-        older_trades = trades[-20:-10] if len(trades) >= 20 else []
-        
-        recent_avg = np.mean([trade.price for trade in recent_trades])
-        older_avg = np.mean([trade.price for trade in older_trades]) if older_trades else recent_avg
+        recent_avg = np.mean(prices[-10:])
+        older_avg = np.mean(prices[-20:-10]) if len(prices) >= 20 else recent_avg
         
         if older_avg > 0:
             momentum = (recent_avg - older_avg) / older_avg
@@ -174,16 +302,14 @@ class AnalyticsEngine:
         
         return float(momentum)
     
-    def _calculate_volume_trend(self, trades: List[KalshiTrade]) -> float:
+    def _calculate_volume_trend(self, trades: Trades) -> float:
         """Calculate volume trend from recent trades"""
-        if len(trades) < 2:
+        sizes = self._trade_columns(trades).sizes
+        if len(sizes) < 2:
             return 0.0
         
-        recent_trades = trades[-10:]
-        older_trades = trades[-20:-10] if len(trades) >= 20 else []
-        
-        recent_volume = sum([trade.size for trade in recent_trades])
-        older_volume = sum([trade.size for trade in older_trades]) if older_trades else recent_volume
+        recent_volume = int(sizes[-10:].sum())
+        older_volume = int(sizes[-20:-10].sum()) if len(sizes) >= 20 else recent_volume
         
         if older_volume > 0:
             volume_trend = (recent_volume - older_volume) / older_volume
@@ -192,23 +318,14 @@ class AnalyticsEngine:
         
         return float(volume_trend)
     
-    def _calculate_price_efficiency(self, trades: List[KalshiTrade]) -> float:
+    def _calculate_price_efficiency(self, trades: Trades) -> float:
         """Calculate price efficiency (how quickly prices adjust to new information)"""
-        if len(trades) < 5:
-            return 0.5  # Neutral efficiency
-        
         # Calculate autocorrelation of price changes
-        prices = [trade.price for trade in trades[-50:]]
+        prices = self._trade_columns(trades).prices[-50:]
         if len(prices) < 5:
-            return 0.5
-        
-        price_changes = []
-        for i in range(1, len(prices)):
-            change = prices[i] - prices[i-1]
-            price_changes.append(change)
+            return 0.5  # Neutral efficiency
         
-        if len(price_changes) < 2:
-            return 0.5
+        price_changes = np.diff(prices)
         
         # Calculate autocorrelation with lag 1
         autocorr = np.corrcoef(price_changes[:-1], price_changes[1:])[0, 1]
@@ -220,7 +337,9 @@ class AnalyticsEngine:
     
     def _calculate_liquidity_score(self, orderbook: KalshiOrderBook) -> float:
         """Calculate overall liquidity score"""
-        
+        return self._memoized(orderbook, "liquidity_score", lambda memo: self._liquidity_score(orderbook, memo))
+    
+    def _liquidity_score(self, orderbook: KalshiOrderBook, memo: BookMemo) -> float:
         # Factors: spread, depth, volume distribution
         best_bid = max([bid.price for bid in orderbook.yes_bids], default=0)
         best_ask = min([ask.price for ask in orderbook.yes_asks], default=1)
@@ -230,12 +349,11 @@ class AnalyticsEngine:
         spread_score = max(0, 1 - spread * 10)  # Normalize spread
         
         # Total volume = higher liquidity
-        total_volume = sum([bid.size for bid in orderbook.yes_bids]) + \
-                      sum([ask.size for ask in orderbook.yes_asks])
+        total_volume = memo.bid_volume + memo.ask_volume
         volume_score = min(1, total_volume / 1000)  # Normalize volume
         
         # Number of price levels = higher liquidity
-        num_levels = len(orderbook.yes_bids) + len(orderbook.yes_asks)
+        num_levels = memo.levels
         levels_score = min(1, num_levels / 20)  # Normalize levels
         
         # Weighted combination
@@ -243,8 +361,16 @@ class AnalyticsEngine:
         
         return float(np.clip(liquidity_score, 0, 1))
     
+    def _calculate_time_risk(self, market: KalshiMarket) -> float:
+        """Time to expiry risk, from 0 (a month or more out) to 1 (expiring)"""
+        if not market.expiry_date:
+            return 0.5  # Default neutral
+        # Whole days, as timedelta.days counts them; to_epoch copes with naive and aware expiries
+        days_to_expiry = (to_epoch(market.expiry_date) - time.time()) // 86400
+        return min(1, max(0, 1 - days_to_expiry / 30))  # Higher risk closer to expiry
+    
     def _calculate_risk_score(self, market: KalshiMarket, orderbook: KalshiOrderBook, 
-                            trades: List[KalshiTrade]) -> float:
+                            trades: Trades) -> float:
         """Calculate overall risk score for the market"""
         
         # Factors: volatility, liquidity, time to expiry, volume
@@ -252,10 +378,7 @@ class AnalyticsEngine:
         liquidity_score = self._calculate_liquidity_score(orderbook)
         
         # Time to expiry risk
-        time_risk = 0.5  # Default neutral
-        if market.expiry_date:
-            days_to_expiry = (market.expiry_date - datetime.utcnow()).days
-            time_risk = min(1, max(0, 1 - days_to_expiry / 30))  # Higher risk closer to expiry
+        time_risk = self._calculate_time_risk(market)
         
         # Volume risk (low volume = higher risk)
         volume_risk = max(0, 1 - (market.volume or 0) / 10000)
@@ -266,6 +389,13 @@ class AnalyticsEngine:
         
         return float(np.clip(risk_score, 0, 1))
     
+    @staticmethod
+    def _trade_columns(trades: Trades, market_ticker: str = "") -> TradeColumns:
+        """Trades as columns, converting model lists on the way in"""
+        if isinstance(trades, TradeColumns):
+            return trades
+        return TradeColumns.from_models(trades[0].market_ticker if trades else market_ticker, trades)
+    
     def _calculate_sweep_price(self, asks: List, target_size: int) -> float:
         """Calculate price to sweep target size from order book"""
         if not asks:
@@ -326,27 +456,20 @@ class AnalyticsEngine:
     
     def _detect_price_gaps(self, orderbook: KalshiOrderBook) -> List[Dict[str, Any]]:
         """Detect significant price gaps in the order book"""
-        gaps = []
-        
-        # Combine and sort all price levels
-        all_levels = []
-        for bid in orderbook.yes_bids:
-            all_levels.append(('bid', bid.price, bid.size))
-        for ask in orderbook.yes_asks:
-            all_levels.append(('ask', ask.price, ask.size))
-        
-        all_levels.sort(key=lambda x: x[1])  # Sort by price
-        
-        # Find gaps larger than 1 cent
-        for i in range(1, len(all_levels)):
-            price_diff = all_levels[i][1] - all_levels[i-1][1]
-            if price_diff > 0.01:  # Gap larger than 1 cent
-                gaps.append({
-                    "range": f"${all_levels[i-1][1]:.2f} - ${all_levels[i][1]:.2f}",
-                    "gap": f"{price_diff:.3f}"
-                })
-        
-        return gaps
+        prices = np.array(
+            [bid.price for bid in orderbook.yes_bids] + [ask.price for ask in orderbook.yes_asks],
+            dtype=np.float64
+        )
+        return [
+            {
+                "range": f"${low:.2f} - ${high:.2f}",
+                "gap": f"{high - low:.3f}",
+                "low": low,
+                "high": high,
+                "width": round(high - low, 10)
+            }
+            for low, high in price_gaps(prices)
+        ]
     
     async def find_arbitrage_opportunities(self, client: KalshiClient) -> List[ArbitrageOpportunity]:
         """Find arbitrage opportunities within Kalshi markets."""
@@ -365,13 +488,34 @@ class AnalyticsEngine:
             logger.error(f"Error finding arbitrage opportunities: {e}")
             return []
     
+    def find_event_arbitrage(self, markets: List[KalshiMarket],
+                             orderbooks: Dict[str, CompactOrderBook],
+                             exclusive_events: set,
+                             event_titles: Optional[Dict[str, str]] = None) -> List[EventArbitrageOpportunity]:
+        """Find mispriced yes baskets across mutually exclusive events"""
+        try:
+            return self.arbitrage_scanner.scan_events(markets, orderbooks, exclusive_events, event_titles)
+        except Exception as e:
+            logger.error(f"Error scanning event arbitrage: {e}")
+            return []
+    
+    def find_complement_arbitrage(self, orderbooks: Dict[str, CompactOrderBook],
+                                  markets: Optional[Dict[str, KalshiMarket]] = None) -> List[ComplementArbitrageOpportunity]:
+        """Find markets whose yes and no books are crossed"""
+        try:
+            return self.arbitrage_scanner.scan_complements(orderbooks, markets)
+        except Exception as e:
+            logger.error(f"Error scanning complement arbitrage: {e}")
+            return []
+    
     def _group_similar_markets(self, markets: List[KalshiMarket]) -> List[List[KalshiMarket]]:
         """Group markets by similar events or series"""
         groups = {}
         
         for market in markets:
-            # Group by series ticker
-            series_key = market.series_ticker
+            # Group by series, resolved through the hierarchy when the market omits it, else by event
+            series_key = self.hierarchy.series_of(market.ticker) if self.hierarchy is not None else None
+            series_key = series_key or market.series_ticker or market.event_ticker
             if series_key not in groups:
                 groups[series_key] = []
             groups[series_key].append(market)
@@ -513,7 +657,32 @@ class AnalyticsEngine:
         else:
             return ConfidenceLevel.LOW
     
-    async def get_dashboard_stats(self, client: KalshiClient) -> DashboardStats:
+    async def get_cached_dashboard_stats(self, client: KalshiClient,
+                                         mode: AdmissionMode = AdmissionMode.FULL) -> Optional[DashboardStats]:
+        """Dashboard stats, recomputed at most once per cache TTL.
+
+        Under a tight upstream budget a degraded request serves stale stats or
+        samples fewer order books, and a cached-only request never goes
+        upstream (None when nothing is cached yet).
+        """
+        fresh = time.time() - self.dashboard_stats_at < self.cache_ttl
+        if self.dashboard_stats is not None and (fresh or mode != AdmissionMode.FULL):
+            return self.dashboard_stats
+        if mode == AdmissionMode.CACHED:
+            return None
+        sample = DEGRADED_LIQUIDITY_SAMPLE if mode == AdmissionMode.DEGRADED else LIQUIDITY_SAMPLE
+        return await self.refresh_dashboard_stats(client, liquidity_sample=sample)
+    
+    async def refresh_dashboard_stats(self, client: KalshiClient,
+                                      liquidity_sample: int = LIQUIDITY_SAMPLE) -> DashboardStats:
+        stats = await self.get_dashboard_stats(client, liquidity_sample=liquidity_sample)
+        # Failures come back as zeroed stats; keep serving the last good ones
+        if stats.total_markets > 0:
+            self.dashboard_stats = stats
+            self.dashboard_stats_at = time.time()
+        return self.dashboard_stats or stats
+    
+    async def get_dashboard_stats(self, client: KalshiClient, liquidity_sample: int = LIQUIDITY_SAMPLE) -> DashboardStats:
         """Get comprehensive dashboard statistics"""
         
         try:
@@ -531,9 +700,11 @@ class AnalyticsEngine:
             total_liquidity = 0
             liquidity_count = 0
             
-            for market in active_markets[:50]:  # Sample first 50 for performance
+            for market in active_markets[:liquidity_sample]:  # Sample for performance
                 try:
-                    orderbook = await client.get_market_orderbook(market.ticker)
+                    # The sweep yields to interactive calls queued behind it
+                    with scheduler.priority(Priority.BACKGROUND):
+                        orderbook = await client.get_market_orderbook(market.ticker)
                     liquidity_score = self._calculate_liquidity_score(orderbook)
                     total_liquidity += liquidity_score
                     liquidity_count += 1
@@ -554,8 +725,11 @@ class AnalyticsEngine:
                 for market in top_volume_markets
             ]
             
-            # Get all events and series for counts
-            events = await client.get_events(limit=1000)
+            # Count events from the local hierarchy once it has synced
+            if self.hierarchy is not None and self.hierarchy.events:
+                total_events = len(self.hierarchy.events)
+            else:
+                total_events = len(await client.get_events(limit=1000))
             
             return DashboardStats(
                 total_volume=f"${total_volume/1000000:.1f}M",
@@ -563,7 +737,7 @@ class AnalyticsEngine:
                 arbitrage_opportunities=len(arbitrage_opportunities),
                 avg_liquidity=f"{avg_liquidity*100:.1f}%",
                 total_markets=len(markets),
-                total_events=len(events),
+                total_events=total_events,
                 avg_spread=0.02,  # Placeholder - would calculate from sample
                 top_volume_markets=top_markets_data
             )
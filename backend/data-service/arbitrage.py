@@ -0,0 +1,248 @@
+import numpy as np
+from typing import List, Dict, Optional, Set, Tuple
+
+from models import (
+    KalshiMarket, EventArbitrageOpportunity, ComplementArbitrageOpportunity,
+    ConfidenceLevel, MarketStatus
+)
+from compact import CompactOrderBook
+
+# Settlement value of a winning contract
+PAYOUT = 1.0
+
+TRADABLE_STATUSES = (MarketStatus.OPEN, MarketStatus.ACTIVE)
+
+class ArbitrageScanner:
+    """Vectorized arbitrage scans over the whole local market universe"""
+
+    def __init__(self, min_edge: float = 0.005):
+        # Minimum per-contract edge before an opportunity is reported
+        self.min_edge = min_edge
+
+    def scan_events(self, markets: List[KalshiMarket],
+                    orderbooks: Dict[str, CompactOrderBook],
+                    exclusive_events: Set[str],
+                    event_titles: Optional[Dict[str, str]] = None) -> List[EventArbitrageOpportunity]:
+        """Find mutually exclusive events whose yes baskets are mispriced.
+
+        Buying one yes contract in every market of an exclusive event pays out
+        exactly once, so a basket of yes asks below the payout is an arbitrage;
+        likewise selling the basket at yes bids above the payout. Top of book
+        is evaluated for every event at once with grouped sums; only flagged
+        events are walked level by level to size the trade.
+        """
+        rows = [market for market in markets if market.event_ticker in exclusive_events]
+        if not rows:
+            return []
+
+        event_tickers, codes = np.unique([market.event_ticker for market in rows], return_inverse=True)
+        quotes = np.array([self._top_of_book(market, orderbooks.get(market.ticker)) for market in rows])
+        best_bid, best_ask = quotes[:, 0], quotes[:, 1]
+        tradable = np.array([market.status in TRADABLE_STATUSES for market in rows])
+
+        event_count = len(event_tickers)
+        legs = np.bincount(codes, minlength=event_count)
+        # Any non-tradable leg or missing quote disqualifies the whole event
+        blocked = np.bincount(codes, weights=~tradable, minlength=event_count) > 0
+        missing_ask = np.bincount(codes, weights=np.isnan(best_ask), minlength=event_count) > 0
+        missing_bid = np.bincount(codes, weights=np.isnan(best_bid), minlength=event_count) > 0
+
+        basket_ask = np.bincount(codes, weights=np.nan_to_num(best_ask), minlength=event_count)
+        basket_bid = np.bincount(codes, weights=np.nan_to_num(best_bid), minlength=event_count)
+
+        eligible = (legs >= 2) & ~blocked
+        buy = eligible & ~missing_ask & (PAYOUT - basket_ask >= self.min_edge)
+        sell = eligible & ~missing_bid & (basket_bid - PAYOUT >= self.min_edge)
+
+        members: Dict[int, List[int]] = {}
+        for row, code in enumerate(codes):
+            if buy[code] or sell[code]:
+                members.setdefault(code, []).append(row)
+
+        opportunities = []
+        for code, member_rows in members.items():
+            legs_markets = [rows[row] for row in member_rows]
+            event_ticker = str(event_tickers[code])
+            title = (event_titles or {}).get(event_ticker)
+
+            if buy[code]:
+                opportunities.append(self._event_opportunity(
+                    event_ticker, title, "buy_all_yes", legs_markets,
+                    best_ask[member_rows], basket_ask[code], orderbooks
+                ))
+            if sell[code]:
+                opportunities.append(self._event_opportunity(
+                    event_ticker, title, "sell_all_yes", legs_markets,
+                    best_bid[member_rows], basket_bid[code], orderbooks
+                ))
+
+        opportunities.sort(key=lambda opportunity: opportunity.potential_profit, reverse=True)
+        return opportunities
+
+    def scan_complements(self, orderbooks: Dict[str, CompactOrderBook],
+                         markets: Optional[Dict[str, KalshiMarket]] = None) -> List[ComplementArbitrageOpportunity]:
+        """Find markets whose yes and no books cross each other.
+
+        A yes and a no contract together always pay out exactly once, so
+        best yes bid + best no bid above the payout (sell both) or best yes
+        ask + best no ask below it (buy both) is a riskless edge. Every
+        watched book is checked in one pass over top-of-book arrays; crossed
+        markets are then walked through both books to size the trade.
+        """
+        tickers = list(orderbooks)
+        if not tickers:
+            return []
+
+        tops = np.array([self._complement_top(orderbooks[ticker]) for ticker in tickers])
+        yes_bid, no_bid, yes_ask, no_ask = tops.T
+
+        # NaN comparisons are False, so one-sided books drop out on their own
+        with np.errstate(invalid="ignore"):
+            sell = (yes_bid + no_bid) - PAYOUT >= self.min_edge
+            buy = PAYOUT - (yes_ask + no_ask) >= self.min_edge
+
+        opportunities = []
+        for row in np.flatnonzero(buy | sell):
+            ticker = tickers[row]
+            book = orderbooks[ticker]
+            market = (markets or {}).get(ticker)
+
+            if buy[row]:
+                sides = [self._levels(book, "yes_asks"), self._levels(book, "no_asks")]
+                opportunities.append(self._complement_opportunity(
+                    ticker, market, "buy_yes_and_no", yes_ask[row], no_ask[row], sides
+                ))
+            if sell[row]:
+                sides = [self._levels(book, "yes_bids"), self._levels(book, "no_bids")]
+                opportunities.append(self._complement_opportunity(
+                    ticker, market, "sell_yes_and_no", yes_bid[row], no_bid[row], sides
+                ))
+
+        opportunities.sort(key=lambda opportunity: opportunity.potential_profit, reverse=True)
+        return opportunities
+
+    def _complement_opportunity(self, ticker: str, market: Optional[KalshiMarket], strategy: str,
+                                yes_price: float, no_price: float,
+                                sides: List[Tuple[List[float], List[int]]]) -> ComplementArbitrageOpportunity:
+        buying = strategy == "buy_yes_and_no"
+        combined = yes_price + no_price
+        edge = PAYOUT - combined if buying else combined - PAYOUT
+        size, profit = self._walk_basket(sides, buying)
+
+        if size >= 100 and edge / combined >= 0.02:
+            confidence = ConfidenceLevel.HIGH
+        elif size > 0:
+            confidence = ConfidenceLevel.MEDIUM
+        else:
+            confidence = ConfidenceLevel.LOW
+
+        return ComplementArbitrageOpportunity(
+            market_ticker=ticker,
+            strategy=strategy,
+            yes_price=float(yes_price),
+            no_price=float(no_price),
+            combined_price=float(combined),
+            edge=float(edge),
+            edge_percentage=float(edge / combined * 100) if combined > 0 else 0.0,
+            executable_size=size,
+            potential_profit=float(profit),
+            confidence=confidence,
+            market_title=market.title if market else None,
+            expiry_date=market.expiry_date if market else None
+        )
+
+    def _event_opportunity(self, event_ticker: str, title: Optional[str], strategy: str,
+                           markets: List[KalshiMarket], prices: np.ndarray,
+                           basket_price: float,
+                           orderbooks: Dict[str, CompactOrderBook]) -> EventArbitrageOpportunity:
+        buying = strategy == "buy_all_yes"
+        edge = PAYOUT - basket_price if buying else basket_price - PAYOUT
+
+        books = [orderbooks.get(market.ticker) for market in markets]
+        if all(book is not None for book in books):
+            sides = [self._levels(book, "yes_asks" if buying else "yes_bids") for book in books]
+            size, profit = self._walk_basket(sides, buying)
+        else:
+            # Quotes come from the market listing; depth is unknown
+            size, profit = 0, 0.0
+
+        if size == 0:
+            confidence = ConfidenceLevel.LOW
+        elif size >= 100 and edge / basket_price >= 0.02:
+            confidence = ConfidenceLevel.HIGH
+        else:
+            confidence = ConfidenceLevel.MEDIUM
+
+        expiries = [market.expiry_date for market in markets if market.expiry_date is not None]
+        return EventArbitrageOpportunity(
+            event_ticker=event_ticker,
+            strategy=strategy,
+            market_tickers=[market.ticker for market in markets],
+            prices=[float(price) for price in prices],
+            basket_price=float(basket_price),
+            edge=float(edge),
+            edge_percentage=float(edge / basket_price * 100) if basket_price > 0 else 0.0,
+            executable_size=size,
+            potential_profit=float(profit),
+            confidence=confidence,
+            event_title=title,
+            expiry_date=max(expiries) if expiries else None
+        )
+
+    def _walk_basket(self, sides: List[Tuple[List[float], List[int]]], buying: bool) -> Tuple[int, float]:
+        """Fill the basket level by level while the marginal basket stays profitable"""
+        positions = [0] * len(sides)
+        remaining = [sizes[0] if len(sizes) else 0 for _, sizes in sides]
+        size = 0
+        profit = 0.0
+
+        while all(position < len(prices) for position, (prices, _) in zip(positions, sides)):
+            marginal = sum(prices[position] for position, (prices, _) in zip(positions, sides))
+            edge = PAYOUT - marginal if buying else marginal - PAYOUT
+            if edge < self.min_edge:
+                break
+
+            quantity = int(min(remaining))
+            size += quantity
+            profit += quantity * edge
+
+            for leg, (prices, sizes) in enumerate(sides):
+                remaining[leg] -= quantity
+                if remaining[leg] <= 0:
+                    positions[leg] += 1
+                    if positions[leg] < len(prices):
+                        remaining[leg] = sizes[positions[leg]]
+
+        return size, profit
+
+    @staticmethod
+    def _levels(orderbook: CompactOrderBook, side: str) -> Tuple[List[float], List[int]]:
+        """Prices and sizes ordered best price first"""
+        prices, sizes = orderbook.side(side)
+        return prices.tolist(), sizes.tolist()
+
+    @staticmethod
+    def _top_of_book(market: KalshiMarket, orderbook: Optional[CompactOrderBook]) -> Tuple[float, float]:
+        """Best yes bid and ask, from the book when cached, else the market listing"""
+        best_bid = market.yes_bid if market.yes_bid is not None else np.nan
+        best_ask = market.yes_price if market.yes_price is not None else np.nan
+
+        if orderbook is not None:
+            book_bid = orderbook.best("yes_bids")
+            book_ask = orderbook.best("yes_asks")
+            if not np.isnan(book_bid):
+                best_bid = book_bid
+            if not np.isnan(book_ask):
+                best_ask = book_ask
+
+        return best_bid, best_ask
+
+    @staticmethod
+    def _complement_top(orderbook: CompactOrderBook) -> Tuple[float, float, float, float]:
+        """Best yes bid, no bid, yes ask and no ask (NaN for an empty side)"""
+        return (
+            orderbook.best("yes_bids"),
+            orderbook.best("no_bids"),
+            orderbook.best("yes_asks"),
+            orderbook.best("no_asks")
+        )
@@ -0,0 +1,94 @@
+"""Bytes per tracked market: Pydantic models vs compact internal structures.
+
+Run from backend/data-service:
+
+    python benchmarks/memory_footprint.py --markets 2000 --levels 20 --trades 500
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import KalshiOrderBook, KalshiOrderBookLevel, KalshiTrade, OrderSide
+from compact import CompactOrderBook, TradeBuffer, BOOK_SIDES
+
+def make_levels(count: int):
+    return [(round(random.uniform(0.01, 0.99), 2), random.randint(1, 500)) for _ in range(count)]
+
+def make_trades(ticker: str, count: int):
+    start = datetime.utcnow() - timedelta(days=1)
+    return [
+        KalshiTrade(
+            market_ticker=ticker,
+            trade_id=f"{ticker}-{i:08d}",
+            price=round(random.uniform(0.01, 0.99), 2),
+            size=random.randint(1, 100),
+            side=random.choice((OrderSide.BID, OrderSide.ASK)),
+            timestamp=start + timedelta(seconds=i),
+            yes_no=random.choice(("yes", "no"))
+        )
+        for i in range(count)
+    ]
+
+def measure(build):
+    """Net bytes allocated by build() and still alive afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    held = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return held, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--markets", type=int, default=1000)
+    parser.add_argument("--levels", type=int, default=20, help="levels per book side")
+    parser.add_argument("--trades", type=int, default=500, help="buffered trades per market")
+    args = parser.parse_args()
+
+    random.seed(7)
+    tickers = [f"KXBENCH-{i:05d}" for i in range(args.markets)]
+    books = {ticker: {side: make_levels(args.levels) for side in BOOK_SIDES} for ticker in tickers}
+    trades = {ticker: make_trades(ticker, args.trades) for ticker in tickers}
+
+    def build_models():
+        return {
+            ticker: (
+                KalshiOrderBook(
+                    market_ticker=ticker,
+                    timestamp=datetime.utcnow(),
+                    **{side: [KalshiOrderBookLevel(price=p, size=s) for p, s in levels]
+                       for side, levels in books[ticker].items()}
+                ),
+                [trade.model_copy() for trade in trades[ticker]]
+            )
+            for ticker in tickers
+        }
+
+    def build_compact():
+        held = {}
+        for ticker in tickers:
+            buffer = TradeBuffer(ticker, capacity=max(args.trades, 1))
+            buffer.extend(trades[ticker])
+            held[ticker] = (CompactOrderBook(ticker, books[ticker]), buffer)
+        return held
+
+    models_held, model_bytes = measure(build_models)
+    del models_held
+    compact_held, compact_bytes = measure(build_compact)
+    del compact_held
+
+    print(f"markets={args.markets} levels/side={args.levels} trades/market={args.trades}")
+    print(f"pydantic models : {model_bytes / args.markets:>12,.0f} bytes/market")
+    print(f"compact         : {compact_bytes / args.markets:>12,.0f} bytes/market")
+    print(f"reduction       : {model_bytes / max(compact_bytes, 1):>12.1f}x")
+
+if __name__ == "__main__":
+    main()
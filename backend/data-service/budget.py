@@ -0,0 +1,204 @@
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from enum import Enum
+from typing import Dict, Any, Optional
+
+# Routes expected to cost at most this many upstream calls are always admitted
+CHEAP_COST = 1.0
+
+# Weight of the newest request in a route's moving average cost
+COST_SMOOTHING = 0.2
+
+# Route name charged for upstream calls made outside any request
+BACKGROUND_ROUTE = "background"
+
+# Window the rate limit is counted over, in seconds
+WINDOW_SECONDS = 60.0
+
+class AdmissionMode(str, Enum):
+    FULL = "full"          # Run normally
+    DEGRADED = "degraded"  # Run with a cheaper plan, e.g. a smaller sample
+    CACHED = "cached"      # Serve cached results only; no upstream calls
+
+class BudgetExhausted(Exception):
+    def __init__(self, route: str, expected_cost: float, remaining: int, retry_after: float):
+        super().__init__(
+            f"Upstream budget too low for {route}: needs ~{expected_cost:.0f} calls, {remaining} left this minute"
+        )
+        self.retry_after = retry_after
+
+class RouteBudget:
+    """Upstream call accounting for one route"""
+
+    def __init__(self, route: str, default_cost: float):
+        self.route = route
+        self.requests = 0
+        self.upstream_calls = 0
+        self.degraded = 0
+        self.cached = 0
+        self.rejected = 0
+        # Moving average of calls per request, seeded with the declared cost
+        self.expected_cost = default_cost
+
+    def finish(self, calls: int, learn: bool = True):
+        self.requests += 1
+        if learn:
+            self.expected_cost += COST_SMOOTHING * (calls - self.expected_cost)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "avg_cost": round(self.upstream_calls / self.requests, 2) if self.requests else None,
+            "expected_cost": round(self.expected_cost, 2),
+            "degraded": self.degraded,
+            "cached": self.cached,
+            "rejected": self.rejected
+        }
+
+class Admission:
+    """An admitted request; counts the upstream calls made on its behalf"""
+
+    def __init__(self, route: RouteBudget, mode: AdmissionMode):
+        self.route = route
+        self.mode = mode
+        self.calls = 0
+        # Restores the previous current admission on release
+        self.token: Optional[Token] = None
+
+    @property
+    def degraded(self) -> bool:
+        return self.mode != AdmissionMode.FULL
+
+_current: ContextVar[Optional[Admission]] = ContextVar("upstream_admission", default=None)
+
+class UpstreamBudget:
+    """Shares the client's per-minute rate budget out between routes.
+
+    Every upstream call is charged to the route of the request that made
+    it. Routes declare a rough cost up front, which is then learned from
+    what they actually spend. As the minute's remaining budget shrinks,
+    expensive routes are degraded or refused so cheap, interactive routes
+    keep working.
+    """
+
+    def __init__(self, rate_limiter, degrade_fraction: float = 0.5, reject_fraction: float = 0.2,
+                 background_fraction: float = 0.0):
+        self.rate_limiter = rate_limiter
+        self.degrade_fraction = degrade_fraction
+        self.reject_fraction = reject_fraction
+        # Share of the rate limit set aside for background-priority calls (e.g. the book poller)
+        self.background_fraction = background_fraction
+        self.routes: Dict[str, RouteBudget] = {}
+        self.background = RouteBudget(BACKGROUND_ROUTE, 0.0)
+        # Times of background- and bulk-priority calls in the current window
+        self._background_times: deque = deque()
+
+    def remaining(self) -> int:
+        return self.rate_limiter.remaining()
+
+    def background_used(self) -> int:
+        """Background-priority calls made in the current window"""
+        cutoff = time.time() - WINDOW_SECONDS
+        while self._background_times and self._background_times[0] <= cutoff:
+            self._background_times.popleft()
+        return len(self._background_times)
+
+    def interactive_capacity(self) -> float:
+        return self.rate_limiter.requests_per_minute * (1 - self.background_fraction)
+
+    def interactive_remaining(self) -> int:
+        """Calls left for requests once the background share is set aside.
+
+        Background calls count against their own share rather than this
+        one, so a busy poller does not push requests into degraded or
+        rejected modes; background calls beyond their share still do,
+        through the overall remaining budget.
+        """
+        remaining = self.remaining()
+        used = self.rate_limiter.requests_per_minute - remaining
+        interactive_used = max(0, used - self.background_used())
+        return max(0, min(remaining, int(self.interactive_capacity() - interactive_used)))
+
+    def admit(self, route: str, default_cost: float, degraded_cost: Optional[float] = None) -> Admission:
+        """Decide how a request may run and start charging its calls to the route.
+
+        Routes with a cheaper plan pass its cost as `degraded_cost`; they run
+        degraded below the degrade fraction or when the full plan does not
+        fit the remaining budget, and serve cached results only when even
+        the cheaper plan does not fit. Raises BudgetExhausted when the route
+        can neither run nor degrade.
+        """
+        budget = self.routes.get(route)
+        if budget is None:
+            budget = self.routes[route] = RouteBudget(route, default_cost)
+
+        capacity = self.interactive_capacity()
+        remaining = self.interactive_remaining()
+        fraction = remaining / capacity if capacity > 0 else 0.0
+        expected = budget.expected_cost
+        degradable = degraded_cost is not None
+        reserve_kept = fraction >= self.reject_fraction
+
+        if expected <= CHEAP_COST:
+            mode = AdmissionMode.FULL
+        elif reserve_kept and expected <= remaining and (fraction >= self.degrade_fraction or not degradable):
+            mode = AdmissionMode.FULL
+        elif degradable and reserve_kept and degraded_cost <= remaining:
+            mode = AdmissionMode.DEGRADED
+        elif degradable:
+            mode = AdmissionMode.CACHED
+        else:
+            budget.rejected += 1
+            raise BudgetExhausted(route, expected, remaining, self.rate_limiter.seconds_until_available())
+
+        if mode == AdmissionMode.DEGRADED:
+            budget.degraded += 1
+        elif mode == AdmissionMode.CACHED:
+            budget.cached += 1
+
+        admission = Admission(budget, mode)
+        admission.token = _current.set(admission)
+        return admission
+
+    def release(self, admission: Admission):
+        """Fold a finished request's call count into the route's expected cost"""
+        # Degraded runs are cheaper by design and would drag the estimate down
+        admission.route.finish(admission.calls, learn=admission.mode == AdmissionMode.FULL)
+        if admission.token is not None:
+            try:
+                _current.reset(admission.token)
+            except (ValueError, RuntimeError):
+                # Released from another context or twice; that context's value is not ours to restore
+                pass
+            admission.token = None
+
+    def charge(self, background: bool = False):
+        """Record one upstream call against the current request's route.
+
+        `background` marks calls made at background or bulk priority, which
+        draw on the background share whichever route they are charged to.
+        """
+        if background:
+            self._background_times.append(time.time())
+        admission = _current.get()
+        if admission is None:
+            self.background.upstream_calls += 1
+            return
+        admission.calls += 1
+        admission.route.upstream_calls += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit_per_minute": self.rate_limiter.requests_per_minute,
+            "remaining": self.remaining(),
+            "interactive_remaining": self.interactive_remaining(),
+            "background_reserved": round(self.rate_limiter.requests_per_minute * self.background_fraction, 2),
+            "background_used": self.background_used(),
+            "degrade_below": self.degrade_fraction,
+            "reject_below": self.reject_fraction,
+            "routes": {name: budget.stats() for name, budget in self.routes.items()},
+            "background_calls": self.background.upstream_calls,
+            "updated_at": time.time()
+        }
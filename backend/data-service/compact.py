@@ -0,0 +1,445 @@
+import hashlib
+import itertools
+import sys
+import time
+import numpy as np
+import pandas as pd
+from typing import Optional, List, Dict, Tuple, Iterable, Any
+from datetime import datetime, timezone
+
+from models import KalshiOrderBook, KalshiOrderBookLevel, KalshiTrade, OrderSide
+
+# Order book sides in storage order
+BOOK_SIDES = ("yes_bids", "yes_asks", "no_bids", "no_asks")
+
+# Small integer codes used in place of enum and string values
+SIDE_CODES = {OrderSide.BID: 0, OrderSide.ASK: 1}
+SIDE_VALUES = (OrderSide.BID, OrderSide.ASK)
+YES_NO_CODES = {"yes": 0, "no": 1}
+YES_NO_VALUES = ("yes", "no")
+
+# Process-wide book versions; every new book snapshot gets the next one
+_book_versions = itertools.count(1)
+
+def _to_datetime(epoch_ms: int) -> datetime:
+    """Naive UTC datetime, matching the rest of the service"""
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+def to_epoch(value: datetime) -> float:
+    """Seconds since the epoch, treating naive datetimes as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _to_epoch_ms(value: datetime) -> int:
+    return int(to_epoch(value) * 1000)
+
+def parse_timestamps(values: Iterable[Any]) -> np.ndarray:
+    """Vectorized parse of API timestamps to int64 epoch milliseconds.
+
+    Accepts ISO-8601 strings and numeric epochs (seconds, or milliseconds
+    when large enough); anything missing or unparseable becomes "now".
+    """
+    series = pd.Series(list(values), dtype=object)
+    result = np.full(len(series), int(time.time() * 1000), dtype=np.int64)
+    if series.empty:
+        return result
+
+    numeric = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+    is_numeric = ~np.isnan(numeric)
+    seconds = is_numeric & (numeric < 1e11)
+    result[seconds] = (numeric[seconds] * 1000).astype(np.int64)
+    result[is_numeric & ~seconds] = numeric[is_numeric & ~seconds].astype(np.int64)
+
+    is_text = ~is_numeric & series.notna().to_numpy()
+    if is_text.any():
+        parsed = pd.to_datetime(series[is_text], utc=True, format="ISO8601", errors="coerce")
+        valid = parsed.notna().to_numpy()
+        millis = parsed[valid].dt.tz_convert(None).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+        positions = np.flatnonzero(is_text)[valid]
+        result[positions] = millis
+
+    return result
+
+class CompactOrderBook:
+    """Order book held as two flat arrays with per-side offsets.
+
+    Each side is stored best price first (bids descending, asks ascending),
+    so walking the book is a slice rather than a sort.
+    """
+
+    __slots__ = ("market_ticker", "prices", "sizes", "bounds", "timestamp", "version", "fingerprint", "changes")
+
+    def __init__(self, market_ticker: str,
+                 sides: Dict[str, Iterable[Tuple[float, int]]],
+                 timestamp: Optional[datetime] = None):
+        self.market_ticker = sys.intern(market_ticker)
+
+        prices = []
+        sizes = []
+        bounds = [0]
+        for name in BOOK_SIDES:
+            levels = sorted(sides.get(name) or (), key=lambda level: level[0], reverse=name.endswith("bids"))
+            prices.extend(level[0] for level in levels)
+            sizes.extend(level[1] for level in levels)
+            bounds.append(len(prices))
+
+        self.prices = np.array(prices, dtype=np.float64)
+        self.sizes = np.array(sizes, dtype=np.int64)
+        self.bounds = tuple(bounds)
+        self.timestamp = _to_epoch_ms(timestamp or datetime.utcnow())
+        self.version = next(_book_versions)
+        self.fingerprint = self._fingerprint()
+        self.changes: Optional[BookDiff] = None
+
+    @classmethod
+    def from_model(cls, orderbook: KalshiOrderBook) -> "CompactOrderBook":
+        return cls(
+            orderbook.market_ticker,
+            {name: [(level.price, level.size) for level in getattr(orderbook, name)] for name in BOOK_SIDES},
+            orderbook.timestamp
+        )
+
+    @classmethod
+    def from_arrays(cls, market_ticker: str, prices: np.ndarray, sizes: np.ndarray,
+                    bounds: Iterable[int], timestamp: int) -> "CompactOrderBook":
+        """Rebuild a book from already ordered arrays, e.g. a snapshot"""
+        book = cls.__new__(cls)
+        book.market_ticker = sys.intern(market_ticker)
+        book.prices = prices
+        book.sizes = sizes
+        book.bounds = tuple(int(bound) for bound in bounds)
+        book.timestamp = int(timestamp)
+        book.version = next(_book_versions)
+        book.fingerprint = book._fingerprint()
+        book.changes = None
+        return book
+
+    def _fingerprint(self) -> str:
+        """Digest of the levels alone, so identical polls of a quiet market match"""
+        digest = hashlib.blake2b(np.asarray(self.bounds, dtype=np.int64).tobytes(), digest_size=8)
+        digest.update(np.ascontiguousarray(self.prices, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(self.sizes, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    def follow(self, previous: Optional["CompactOrderBook"]):
+        """Record the changes since `previous`, the last snapshot of the same market.
+
+        An unchanged book inherits the previous version, so caches keyed on
+        version (depth ladders, analytics) keep hitting across polls.
+        """
+        if previous is None:
+            return
+        self.changes = BookDiff.between(previous, self)
+        if self.changes.empty:
+            self.version = previous.version
+
+    def side(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Price and size views for one side, best price first"""
+        index = BOOK_SIDES.index(name)
+        start, stop = self.bounds[index], self.bounds[index + 1]
+        return self.prices[start:stop], self.sizes[start:stop]
+
+    def best(self, name: str) -> float:
+        """Best price on a side, NaN when the side is empty"""
+        index = BOOK_SIDES.index(name)
+        start, stop = self.bounds[index], self.bounds[index + 1]
+        return float(self.prices[start]) if stop > start else np.nan
+
+    @property
+    def nbytes(self) -> int:
+        return self.prices.nbytes + self.sizes.nbytes
+
+    def to_model(self) -> KalshiOrderBook:
+        """Pydantic order book for the API boundary, levels in ascending price order"""
+        sides = {}
+        for name in BOOK_SIDES:
+            prices, sizes = self.side(name)
+            if name.endswith("bids"):
+                prices, sizes = prices[::-1], sizes[::-1]
+            sides[name] = [
+                KalshiOrderBookLevel(price=price, size=size)
+                for price, size in zip(prices.tolist(), sizes.tolist())
+            ]
+        return KalshiOrderBook(
+            market_ticker=self.market_ticker,
+            timestamp=_to_datetime(self.timestamp),
+            fingerprint=self.fingerprint,
+            **sides
+        )
+
+class BookDiff:
+    """Levels that changed between two snapshots of one order book.
+
+    Per side, holds the changed prices with their old and new sizes; a
+    size of zero on either end means the level was added or removed.
+    """
+
+    __slots__ = ("base", "fingerprint", "sides")
+
+    def __init__(self, base: str, fingerprint: str,
+                 sides: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        self.base = base
+        self.fingerprint = fingerprint
+        self.sides = sides
+
+    @classmethod
+    def between(cls, previous: CompactOrderBook, current: CompactOrderBook) -> "BookDiff":
+        sides = {}
+        if previous.fingerprint != current.fingerprint:
+            for name in BOOK_SIDES:
+                old_prices, old_sizes = previous.side(name)
+                new_prices, new_sizes = current.side(name)
+                prices = np.union1d(old_prices, new_prices)
+                old = np.zeros(len(prices), dtype=np.int64)
+                new = np.zeros(len(prices), dtype=np.int64)
+                np.add.at(old, np.searchsorted(prices, old_prices), old_sizes)
+                np.add.at(new, np.searchsorted(prices, new_prices), new_sizes)
+                changed = old != new
+                if changed.any():
+                    sides[name] = (prices[changed], old[changed], new[changed])
+        return cls(previous.fingerprint, current.fingerprint, sides)
+
+    @property
+    def empty(self) -> bool:
+        return not self.sides
+
+    def __len__(self) -> int:
+        return sum(len(prices) for prices, _, _ in self.sides.values())
+
+    def size_delta(self, name: str) -> int:
+        """Net change in resting size on a side"""
+        if name not in self.sides:
+            return 0
+        _, old, new = self.sides[name]
+        return int((new - old).sum())
+
+    def level_delta(self, name: str) -> int:
+        """Net change in the number of price levels on a side"""
+        if name not in self.sides:
+            return 0
+        _, old, new = self.sides[name]
+        return int(np.count_nonzero(old == 0) - np.count_nonzero(new == 0))
+
+class TradeColumns:
+    """A batch of one market's trades as parallel arrays"""
+
+    __slots__ = ("market_ticker", "timestamps", "prices", "sizes", "sides", "yes_no", "trade_ids")
+
+    def __init__(self, market_ticker: str, timestamps: np.ndarray, prices: np.ndarray,
+                 sizes: np.ndarray, sides: np.ndarray, yes_no: np.ndarray, trade_ids: np.ndarray):
+        self.market_ticker = sys.intern(market_ticker)
+        self.timestamps = timestamps
+        self.prices = prices
+        self.sizes = sizes
+        self.sides = sides
+        self.yes_no = yes_no
+        self.trade_ids = trade_ids
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def empty(cls, market_ticker: str) -> "TradeColumns":
+        return cls(
+            market_ticker,
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64),
+            np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8),
+            np.zeros(0, dtype=np.int8), np.zeros(0, dtype=object)
+        )
+
+    @classmethod
+    def from_records(cls, market_ticker: str, records: List[Dict[str, Any]]) -> "TradeColumns":
+        """Build columns from a page of raw API trades without per-row model parsing"""
+        if not records:
+            return cls.empty(market_ticker)
+
+        frame = pd.DataFrame.from_records(
+            records, columns=["trade_id", "price", "size", "side", "timestamp", "yes_no"]
+        )
+        sides = frame["side"].fillna("bid").map(SIDE_CODES)
+        # Trades with an unknown side are dropped, as the per-row parser rejects them
+        known = sides.notna().to_numpy()
+
+        columns = cls(
+            market_ticker,
+            parse_timestamps(frame["timestamp"]),
+            frame["price"].fillna(0.0).to_numpy(dtype=np.float64),
+            frame["size"].fillna(0).to_numpy(dtype=np.int32),
+            sides.fillna(0).to_numpy(dtype=np.int8),
+            frame["yes_no"].fillna("yes").map(YES_NO_CODES).fillna(0).to_numpy(dtype=np.int8),
+            frame["trade_id"].fillna("").to_numpy(dtype=object)
+        )
+        return columns if known.all() else columns.take(np.flatnonzero(known))
+
+    @classmethod
+    def from_models(cls, market_ticker: str, trades: List[KalshiTrade]) -> "TradeColumns":
+        return cls(
+            market_ticker,
+            np.array([_to_epoch_ms(trade.timestamp) for trade in trades], dtype=np.int64),
+            np.array([trade.price for trade in trades], dtype=np.float64),
+            np.array([trade.size for trade in trades], dtype=np.int32),
+            np.array([SIDE_CODES[trade.side] for trade in trades], dtype=np.int8),
+            np.array([YES_NO_CODES.get(trade.yes_no, 0) for trade in trades], dtype=np.int8),
+            np.array([trade.trade_id for trade in trades], dtype=object)
+        )
+
+    @classmethod
+    def concat(cls, market_ticker: str, batches: List["TradeColumns"]) -> "TradeColumns":
+        if not batches:
+            return cls.empty(market_ticker)
+        return cls(
+            market_ticker,
+            *(np.concatenate([getattr(batch, name) for batch in batches]) for name in cls.__slots__[1:])
+        )
+
+    def take(self, indices: np.ndarray) -> "TradeColumns":
+        return TradeColumns(
+            self.market_ticker,
+            *(getattr(self, name)[indices] for name in self.__slots__[1:])
+        )
+
+    def sorted(self) -> "TradeColumns":
+        """Oldest first; the API pages newest first"""
+        order = np.argsort(self.timestamps, kind="stable")
+        return self.take(order)
+
+    def to_models(self, limit: Optional[int] = None) -> List[KalshiTrade]:
+        """Pydantic trades for the API boundary, in column order"""
+        start = max(len(self) - limit, 0) if limit is not None else 0
+        return [
+            KalshiTrade(
+                market_ticker=self.market_ticker,
+                trade_id=trade_id or "",
+                price=price,
+                size=size,
+                side=SIDE_VALUES[side],
+                timestamp=_to_datetime(timestamp),
+                yes_no=YES_NO_VALUES[yes_no]
+            )
+            for trade_id, price, size, side, timestamp, yes_no in zip(
+                self.trade_ids[start:].tolist(), self.prices[start:].tolist(),
+                self.sizes[start:].tolist(), self.sides[start:].tolist(),
+                self.timestamps[start:].tolist(), self.yes_no[start:].tolist()
+            )
+        ]
+
+class TradeBuffer:
+    """Fixed-capacity ring of one market's trades stored as parallel arrays.
+
+    The ticker is held once per buffer, sides are int8 codes and timestamps
+    are epoch milliseconds, so a trade costs a few dozen bytes instead of a
+    full model instance.
+    """
+
+    __slots__ = (
+        "market_ticker", "capacity", "count", "head",
+        "timestamps", "prices", "sizes", "sides", "yes_no", "trade_ids"
+    )
+
+    COLUMNS = ("timestamps", "prices", "sizes", "sides", "yes_no", "trade_ids")
+
+    def __init__(self, market_ticker: str, capacity: int = 1000, initial_size: int = 64):
+        self.market_ticker = sys.intern(market_ticker)
+        self.capacity = capacity
+        self.count = 0
+        # Next slot to write
+        self.head = 0
+        # Arrays start small and grow until they reach capacity
+        size = min(initial_size, capacity)
+        self.timestamps = np.zeros(size, dtype=np.int64)
+        self.prices = np.zeros(size, dtype=np.float64)
+        self.sizes = np.zeros(size, dtype=np.int32)
+        self.sides = np.zeros(size, dtype=np.int8)
+        self.yes_no = np.zeros(size, dtype=np.int8)
+        self.trade_ids = np.empty(size, dtype=object)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def extend(self, trades: List[KalshiTrade]) -> int:
+        """Append trades newer than the buffer's last one; returns how many were added"""
+        return self.extend_columns(TradeColumns.from_models(self.market_ticker, trades))
+
+    def extend_columns(self, columns: TradeColumns) -> int:
+        """Vectorized append of a batch; returns how many trades were added"""
+        return len(self.merge(columns))
+
+    def merge(self, columns: TradeColumns) -> TradeColumns:
+        """Append the batch's trades not already buffered and return them, oldest first"""
+        if len(columns) == 0:
+            return columns
+
+        columns = columns.sorted()
+        if self.count:
+            # Pages overlap; keep only trades past the newest buffered one
+            newest = self._newest_slot()
+            newest_time = self.timestamps[newest]
+            keep = columns.timestamps > newest_time
+            ties = np.flatnonzero(columns.timestamps == newest_time)
+            if len(ties):
+                seen = self._ids_at(newest_time)
+                keep[ties] = [trade_id not in seen for trade_id in columns.trade_ids[ties]]
+            columns = columns.take(np.flatnonzero(keep))
+
+        added = columns
+        if len(added) == 0:
+            return added
+        if len(added) > self.capacity:
+            columns = columns.take(np.arange(len(added) - self.capacity, len(added)))
+
+        incoming = len(columns)
+        if self.count + incoming > len(self.prices) and len(self.prices) < self.capacity:
+            self._grow(min(self.capacity, max(self.count + incoming, len(self.prices) * 2)))
+
+        slots = (self.head + np.arange(incoming)) % len(self.prices)
+        for name in self.COLUMNS:
+            getattr(self, name)[slots] = getattr(columns, name)
+
+        self.head = int((self.head + incoming) % len(self.prices))
+        self.count = min(self.count + incoming, self.capacity)
+        return added
+
+    def _newest_slot(self) -> int:
+        return (self.head - 1) % len(self.prices)
+
+    def _ids_at(self, timestamp: int) -> set:
+        """Ids of the buffered trades sharing the newest timestamp"""
+        ids = set()
+        slot = self._newest_slot()
+        for _ in range(self.count):
+            if self.timestamps[slot] != timestamp:
+                break
+            ids.add(self.trade_ids[slot])
+            slot = (slot - 1) % len(self.prices)
+        return ids
+
+    def _grow(self, size: int):
+        """Resize the arrays; only called before the ring first wraps"""
+        for name in self.COLUMNS:
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype) if array.dtype != object else np.empty(size, dtype=object)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+        self.head = self.count
+
+    def _order(self) -> np.ndarray:
+        """Slot indices from oldest to newest"""
+        if self.count < len(self.prices):
+            return np.arange(self.count)
+        return (np.arange(self.count) + self.head) % len(self.prices)
+
+    def columns(self) -> TradeColumns:
+        """Buffered trades as arrays, oldest first"""
+        order = self._order()
+        return TradeColumns(self.market_ticker, *(getattr(self, name)[order] for name in self.COLUMNS))
+
+    def to_models(self, limit: Optional[int] = None) -> List[KalshiTrade]:
+        """Pydantic trades for the API boundary, oldest first"""
+        return self.columns().to_models(limit)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = sum(getattr(self, name).nbytes for name in self.COLUMNS)
+        ids = sum(sys.getsizeof(trade_id) for trade_id in self.trade_ids if trade_id)
+        return arrays + ids
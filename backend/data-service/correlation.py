@@ -0,0 +1,176 @@
+import math
+from typing import Optional, List, Dict, Tuple
+
+import numpy as np
+
+# Samples between full rebuilds of the running sums, bounding float drift
+REBUILD_EVERY = 1000
+
+class RollingCorrelation:
+    """Pairwise return correlation across markets over a sliding window.
+
+    Prices are resampled onto fixed intervals (last observation in an
+    interval wins, missing markets are forward-filled) and each closed
+    interval adds one row of returns. Returns are price differences rather
+    than log returns, since prices in 0-1 make ratios explode near zero.
+
+    For every pair the window keeps running sums over the rows where both
+    markets have a return, so a new row (and the evicted oldest one) costs
+    O(markets^2) rather than a recomputation over the whole window, and
+    markets joining late still get pairwise-complete statistics.
+
+    Prices from different feeds (a book mid against a last trade) differ by
+    the spread, so when a market's source changes its next return is
+    skipped rather than recorded as a move.
+    """
+
+    def __init__(self, window: int = 120, interval_seconds: float = 60.0, capacity: int = 64):
+        self.window = window
+        self.interval_seconds = interval_seconds
+        self.slots: Dict[str, int] = {}
+        self.sources: Dict[str, str] = {}
+        self._free: List[int] = []
+        self._capacity = 0
+
+        self._returns = np.zeros((window, 0))
+        self._head = 0
+        self.filled = 0
+        self.samples = 0
+
+        # Close of the last finished interval and the interval being built
+        self._bucket: Optional[int] = None
+        self._previous = np.zeros(0)
+        self._current = np.zeros(0)
+
+        # Pairwise sums over jointly observed rows: [i, j] covers rows where i and j both have returns
+        self._count = np.zeros((0, 0))
+        self._sum = np.zeros((0, 0))      # sum of x_i
+        self._sum_sq = np.zeros((0, 0))   # sum of x_i^2
+        self._sum_xy = np.zeros((0, 0))   # sum of x_i * x_j
+
+        self._grow(capacity)
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self.slots)
+
+    def track(self, tickers: List[str]):
+        """Set the markets to follow; dropped markets lose their history"""
+        wanted = set(tickers)
+        for ticker in [ticker for ticker in self.slots if ticker not in wanted]:
+            slot = self.slots.pop(ticker)
+            self.sources.pop(ticker, None)
+            self._drop(slot)
+            self._free.append(slot)
+
+        for ticker in tickers:
+            if ticker in self.slots:
+                continue
+            if not self._free:
+                self._grow(max(self._capacity * 2, 1))
+            self.slots[ticker] = self._free.pop()
+
+    def observe(self, prices: Dict[str, float], at: float, sources: Optional[Dict[str, str]] = None):
+        """Record prices seen at epoch time `at` for tracked markets, optionally naming each price's source"""
+        bucket = int(at // self.interval_seconds)
+        if self._bucket is not None and bucket > self._bucket:
+            # Close the previous interval; a skipped stretch counts as one step
+            self._push(self._current - self._previous)
+            self._previous = self._current.copy()
+        if self._bucket is None or bucket > self._bucket:
+            self._bucket = bucket
+
+        for ticker, price in prices.items():
+            slot = self.slots.get(ticker)
+            if slot is None or price is None:
+                continue
+            source = sources.get(ticker) if sources is not None else None
+            if source is not None:
+                if self.sources.get(ticker, source) != source:
+                    self._previous[slot] = np.nan
+                self.sources[ticker] = source
+            self._current[slot] = price
+
+    def matrix(self, tickers: List[str], min_periods: int = 10) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Correlation, covariance and joint observation counts for `tickers`.
+
+        Pairs with fewer than `min_periods` joint returns, or with a flat
+        series, are NaN.
+        """
+        index = np.array([self.slots[ticker] for ticker in tickers], dtype=np.int64)
+        grid = np.ix_(index, index)
+        count = self._count[grid]
+        sum_x = self._sum[grid]
+        sum_sq_x = self._sum_sq[grid]
+        sum_xy = self._sum_xy[grid]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = (sum_xy - sum_x * sum_x.T / count) / (count - 1)
+            variance = (sum_sq_x - sum_x * sum_x / count) / (count - 1)
+            correlation = covariance / np.sqrt(variance * variance.T)
+
+        enough = count >= max(min_periods, 2)
+        covariance = np.where(enough, covariance, np.nan)
+        correlation = np.where(enough & (variance > 1e-12) & (variance.T > 1e-12), correlation, np.nan)
+        return np.clip(correlation, -1.0, 1.0), covariance, count
+
+    def _push(self, row: np.ndarray):
+        if self.filled == self.window:
+            self._accumulate(self._returns[self._head], -1.0)
+        self._returns[self._head] = row
+        self._accumulate(row, 1.0)
+        self._head = (self._head + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+        self.samples += 1
+        if self.samples % REBUILD_EVERY == 0:
+            self._rebuild()
+
+    def _accumulate(self, row: np.ndarray, sign: float):
+        present = ~np.isnan(row)
+        mask = present.astype(np.float64)
+        values = np.where(present, row, 0.0)
+        self._count += sign * np.outer(mask, mask)
+        self._sum += sign * np.outer(values, mask)
+        self._sum_sq += sign * np.outer(values * values, mask)
+        self._sum_xy += sign * np.outer(values, values)
+
+    def _rebuild(self):
+        """Recompute the running sums from the window itself"""
+        rows = self._returns if self.filled == self.window else self._returns[:self.filled]
+        present = ~np.isnan(rows)
+        mask = present.astype(np.float64)
+        values = np.where(present, rows, 0.0)
+        self._count = mask.T @ mask
+        self._sum = values.T @ mask
+        self._sum_sq = (values * values).T @ mask
+        self._sum_xy = values.T @ values
+
+    def _drop(self, slot: int):
+        self._returns[:, slot] = np.nan
+        self._previous[slot] = np.nan
+        self._current[slot] = np.nan
+        for sums in (self._count, self._sum, self._sum_sq, self._sum_xy):
+            sums[slot, :] = 0.0
+            sums[:, slot] = 0.0
+
+    def _grow(self, capacity: int):
+        added = capacity - self._capacity
+        if added <= 0:
+            return
+        self._returns = np.hstack((self._returns, np.full((self.window, added), np.nan)))
+        self._previous = np.concatenate((self._previous, np.full(added, np.nan)))
+        self._current = np.concatenate((self._current, np.full(added, np.nan)))
+        self._count = np.pad(self._count, ((0, added), (0, added)))
+        self._sum = np.pad(self._sum, ((0, added), (0, added)))
+        self._sum_sq = np.pad(self._sum_sq, ((0, added), (0, added)))
+        self._sum_xy = np.pad(self._sum_xy, ((0, added), (0, added)))
+        # Hand out low slots first
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+def to_rows(matrix: np.ndarray, digits: int = 6) -> List[List[Optional[float]]]:
+    """Matrix as nested lists for JSON, with NaN as None"""
+    return [
+        [None if math.isnan(value) else round(value, digits) for value in row]
+        for row in matrix.tolist()
+    ]
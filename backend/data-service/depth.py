@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from models import DepthLadder, DepthLevel, PriceGap
+from compact import CompactOrderBook, _to_datetime
+
+# Price distance between adjacent levels that counts as a gap
+MIN_GAP = 0.01
+
+# Tolerance when snapping float prices to tick boundaries
+_SNAP = 1e-9
+
+def price_gaps(prices: np.ndarray, min_gap: float = MIN_GAP) -> List[Tuple[float, float]]:
+    """(low, high) ranges between adjacent distinct prices wider than min_gap"""
+    levels = np.unique(prices)
+    if len(levels) < 2:
+        return []
+    widths = np.diff(levels)
+    wide = np.flatnonzero(widths > min_gap + _SNAP)
+    return list(zip(levels[wide].tolist(), levels[wide + 1].tolist()))
+
+def bin_side(prices: np.ndarray, sizes: np.ndarray, tick: float, bids: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Aggregate one side (stored best price first) into tick-wide bins.
+
+    Bids round down and asks round up to the tick, so a bin never shows a
+    better price than is actually available. Bins keep best-first order.
+    """
+    if len(prices) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+
+    scaled = prices / tick
+    index = (np.floor(scaled + _SNAP) if bids else np.ceil(scaled - _SNAP)).astype(np.int64)
+    # Levels are already sorted, so equal bins are contiguous runs
+    starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+    return np.round(index[starts] * tick, 10), np.add.reduceat(sizes, starts)
+
+def depth_ladder(book: CompactOrderBook, tick: float, side: str = "yes",
+                 min_gap: float = MIN_GAP) -> DepthLadder:
+    """Cumulative binned depth for the yes or no book"""
+    bid_prices, bid_sizes = book.side(f"{side}_bids")
+    ask_prices, ask_sizes = book.side(f"{side}_asks")
+
+    bid_bins, bid_totals = bin_side(bid_prices, bid_sizes, tick, bids=True)
+    ask_bins, ask_totals = bin_side(ask_prices, ask_sizes, tick, bids=False)
+
+    best_bid = float(bid_prices[0]) if len(bid_prices) else None
+    best_ask = float(ask_prices[0]) if len(ask_prices) else None
+
+    return DepthLadder(
+        market_ticker=book.market_ticker,
+        side=side,
+        tick=tick,
+        version=book.version,
+        timestamp=_to_datetime(book.timestamp),
+        best_bid=best_bid,
+        best_ask=best_ask,
+        mid_price=(best_bid + best_ask) / 2 if best_bid is not None and best_ask is not None else None,
+        total_bid_volume=int(bid_sizes.sum()),
+        total_ask_volume=int(ask_sizes.sum()),
+        bids=_levels(bid_bins, bid_totals),
+        asks=_levels(ask_bins, ask_totals),
+        gaps=[
+            PriceGap(low=low, high=high, width=round(high - low, 10))
+            for low, high in price_gaps(np.concatenate((bid_prices, ask_prices)), min_gap)
+        ]
+    )
+
+def _levels(prices: np.ndarray, sizes: np.ndarray) -> List[DepthLevel]:
+    cumulative = np.cumsum(sizes)
+    return [
+        DepthLevel(price=price, size=size, cumulative=total)
+        for price, size, total in zip(prices.tolist(), sizes.tolist(), cumulative.tolist())
+    ]
+
+class DepthCache:
+    """Ladders keyed by market, side and tick, valid for one book version"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, str, float], DepthLadder]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, book: CompactOrderBook, tick: float, side: str = "yes") -> DepthLadder:
+        key = (book.market_ticker, side, tick)
+        ladder = self.entries.get(key)
+        if ladder is not None and ladder.version == book.version:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return ladder
+
+        self.misses += 1
+        ladder = depth_ladder(book, tick, side)
+        self.entries[key] = ladder
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return ladder
@@ -0,0 +1,202 @@
+import asyncio
+import io
+from typing import List, AsyncIterator, Iterable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from models import KalshiMarket, KalshiCandlestick, ExportFormat, MarketStatus
+from compact import TradeColumns, SIDE_VALUES, YES_NO_VALUES
+
+MEDIA_TYPES = {
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet"
+}
+
+FILE_EXTENSIONS = {
+    ExportFormat.ARROW: "arrows",
+    ExportFormat.PARQUET: "parquet"
+}
+
+# Rows buffered per Parquet row group; IPC batches are flushed as they arrive
+PARQUET_ROW_GROUP_ROWS = 65536
+
+# Markets per record batch in a snapshot export
+MARKET_BATCH_ROWS = 5000
+
+TIMESTAMP = pa.timestamp("ms", tz="UTC")
+CODED_STRING = pa.dictionary(pa.int8(), pa.string())
+
+TRADE_SCHEMA = pa.schema([
+    ("market_ticker", CODED_STRING),
+    ("trade_id", pa.string()),
+    ("timestamp", TIMESTAMP),
+    ("price", pa.float64()),
+    ("size", pa.int32()),
+    ("side", CODED_STRING),
+    ("yes_no", CODED_STRING)
+])
+
+CANDLE_SCHEMA = pa.schema([
+    ("market_ticker", pa.string()),
+    ("timestamp", TIMESTAMP),
+    ("open_price", pa.float64()),
+    ("high_price", pa.float64()),
+    ("low_price", pa.float64()),
+    ("close_price", pa.float64()),
+    ("volume", pa.int64())
+])
+
+MARKET_SCHEMA = pa.schema([
+    ("ticker", pa.string()),
+    ("title", pa.string()),
+    ("subtitle", pa.string()),
+    ("yes_sub_title", pa.string()),
+    ("event_ticker", pa.string()),
+    ("series_ticker", pa.string()),
+    ("status", pa.string()),
+    ("yes_price", pa.float64()),
+    ("no_price", pa.float64()),
+    ("yes_bid", pa.float64()),
+    ("no_bid", pa.float64()),
+    ("last_price", pa.float64()),
+    ("volume", pa.int64()),
+    ("open_interest", pa.int64()),
+    ("expiry_date", TIMESTAMP),
+    ("close_date", TIMESTAMP),
+    ("strike_price", pa.float64()),
+    ("category", pa.string()),
+    ("can_close_early", pa.bool_()),
+    ("floor_price", pa.float64()),
+    ("cap_price", pa.float64())
+])
+
+_SIDE_DICTIONARY = pa.array([side.value for side in SIDE_VALUES])
+_YES_NO_DICTIONARY = pa.array(list(YES_NO_VALUES))
+
+def trade_batch(columns: TradeColumns) -> pa.RecordBatch:
+    """Record batch over trade columns; numeric arrays are shared, not copied"""
+    return pa.RecordBatch.from_arrays([
+        pa.DictionaryArray.from_arrays(
+            pa.array(np.zeros(len(columns), dtype=np.int8)), pa.array([columns.market_ticker])
+        ),
+        pa.array(columns.trade_ids, pa.string()),
+        pa.array(columns.timestamps, TIMESTAMP),
+        pa.array(columns.prices, pa.float64()),
+        pa.array(columns.sizes, pa.int32()),
+        pa.DictionaryArray.from_arrays(pa.array(columns.sides, pa.int8()), _SIDE_DICTIONARY),
+        pa.DictionaryArray.from_arrays(pa.array(columns.yes_no, pa.int8()), _YES_NO_DICTIONARY)
+    ], schema=TRADE_SCHEMA)
+
+def candle_batch(candles: List[KalshiCandlestick]) -> pa.RecordBatch:
+    return pa.RecordBatch.from_pydict({
+        "market_ticker": [candle.market_ticker for candle in candles],
+        "timestamp": [candle.timestamp for candle in candles],
+        "open_price": [candle.open_price for candle in candles],
+        "high_price": [candle.high_price for candle in candles],
+        "low_price": [candle.low_price for candle in candles],
+        "close_price": [candle.close_price for candle in candles],
+        "volume": [candle.volume for candle in candles]
+    }, schema=CANDLE_SCHEMA)
+
+def market_batch(markets: List[KalshiMarket]) -> pa.RecordBatch:
+    columns = {}
+    for field in MARKET_SCHEMA:
+        values = [getattr(market, field.name) for market in markets]
+        if field.name == "status":
+            values = [value.value if isinstance(value, MarketStatus) else value for value in values]
+        columns[field.name] = values
+    return pa.RecordBatch.from_pydict(columns, schema=MARKET_SCHEMA)
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def encode_stream(batches: AsyncIterator[pa.RecordBatch], schema: pa.Schema,
+                        export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Encode record batches incrementally as an Arrow IPC stream or a Parquet file.
+
+    Only one batch (or one Parquet row group) is held at a time, so exports
+    of any size run in bounded memory.
+    """
+    sink = _ChunkSink()
+
+    if export_format == ExportFormat.ARROW:
+        writer = pa.ipc.new_stream(sink, schema)
+        try:
+            async for batch in batches:
+                writer.write_batch(batch)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+        return
+
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    try:
+        async for batch in batches:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                table = pa.Table.from_batches(pending, schema)
+                pending, pending_rows = [], 0
+                # Compression is CPU bound; keep it off the event loop
+                await asyncio.to_thread(writer.write_table, table)
+                yield sink.drain()
+
+        if pending:
+            await asyncio.to_thread(writer.write_table, pa.Table.from_batches(pending, schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+async def trade_batches(pages: AsyncIterator[TradeColumns]) -> AsyncIterator[pa.RecordBatch]:
+    async for page in pages:
+        yield trade_batch(page)
+
+async def candle_batches(windows: AsyncIterator[List[KalshiCandlestick]]) -> AsyncIterator[pa.RecordBatch]:
+    async for candles in windows:
+        if candles:
+            yield candle_batch(candles)
+
+async def market_batches(markets: Iterable[KalshiMarket]) -> AsyncIterator[pa.RecordBatch]:
+    markets = list(markets)
+    for start in range(0, len(markets), MARKET_BATCH_ROWS):
+        yield market_batch(markets[start:start + MARKET_BATCH_ROWS])
+        # Let other requests run between batches of a large snapshot
+        await asyncio.sleep(0)
+
+async def guarded(chunks: AsyncIterator[bytes], name: str) -> AsyncIterator[bytes]:
+    """Log failures once the response has started; the truncated body fails to decode"""
+    try:
+        async for chunk in chunks:
+            if chunk:
+                yield chunk
+    except Exception as e:
+        logger.error(f"Export {name} failed mid-stream: {e}")
+        raise
@@ -0,0 +1,343 @@
+import math
+from datetime import datetime, timezone
+from typing import Optional, Callable, Awaitable
+
+import grpc
+from loguru import logger
+from pydantic import ValidationError
+
+from models import (
+    KalshiMarket, MarketStatus, MarketAnalytics, AnalyticsRequest, AnalyticsResponse,
+    ArbitrageResponse, OrderBookResponse
+)
+from kalshi_client import KalshiClient
+from analytics import AnalyticsEngine
+from market_store import MarketStore
+from streaming import StreamHub
+from compact import CompactOrderBook, BOOK_SIDES
+from budget import BudgetExhausted
+
+# Messages and service stubs are built from the .proto at import, so there
+# is no generated code to keep in step with it
+pb, services = grpc.protos_and_services("proto/kalshi_data.proto")
+
+# Seconds a stream waits for an update before checking the client is still there
+STREAM_POLL_SECONDS = 15.0
+
+def _epoch_ms(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def _present(**fields):
+    """Drop None values so optional proto fields stay unset"""
+    return {name: value for name, value in fields.items() if value is not None}
+
+def market_message(market: KalshiMarket):
+    return pb.Market(**_present(
+        ticker=market.ticker,
+        title=market.title,
+        subtitle=market.subtitle,
+        yes_sub_title=market.yes_sub_title,
+        event_ticker=market.event_ticker,
+        series_ticker=market.series_ticker,
+        status=market.status.value,
+        yes_price=market.yes_price,
+        no_price=market.no_price,
+        yes_bid=market.yes_bid,
+        no_bid=market.no_bid,
+        last_price=market.last_price,
+        volume=market.volume or 0,
+        open_interest=market.open_interest or 0,
+        expiry_ms=_epoch_ms(market.expiry_date),
+        close_ms=_epoch_ms(market.close_date),
+        strike_price=market.strike_price,
+        category=market.category,
+        can_close_early=bool(market.can_close_early),
+        floor_price=market.floor_price,
+        cap_price=market.cap_price
+    ))
+
+def book_message(book: CompactOrderBook):
+    sides = {}
+    for name in BOOK_SIDES:
+        prices, sizes = book.side(name)
+        sides[name] = pb.BookSide(prices=prices.tolist(), sizes=sizes.tolist())
+    return pb.OrderBook(
+        market_ticker=book.market_ticker,
+        timestamp_ms=book.timestamp,
+        version=book.version,
+        fingerprint=book.fingerprint,
+        **sides
+    )
+
+def analytics_message(analytics: MarketAnalytics):
+    message = pb.MarketAnalytics(**_present(
+        market_ticker=analytics.market_ticker,
+        volatility=analytics.volatility,
+        momentum=analytics.momentum,
+        volume_trend=analytics.volume_trend,
+        price_efficiency=analytics.price_efficiency,
+        liquidity_score=analytics.liquidity_score,
+        risk_score=analytics.risk_score
+    ))
+    if analytics.orderbook_analytics is not None:
+        book = analytics.orderbook_analytics
+        message.orderbook_analytics.CopyFrom(pb.OrderBookAnalytics(
+            sweep_price_100=book.sweep_price_100,
+            sweep_price_1000=book.sweep_price_1000,
+            bid_price_100=book.bid_price_100,
+            ask_price_100=book.ask_price_100,
+            bid_price_1000=book.bid_price_1000,
+            ask_price_1000=book.ask_price_1000,
+            total_bid_volume=book.total_bid_volume,
+            total_ask_volume=book.total_ask_volume,
+            spread_percentage=book.spread_percentage,
+            mid_price=book.mid_price,
+            gaps=[pb.PriceGap(low=gap["low"], high=gap["high"], width=gap["width"]) for gap in book.gaps]
+        ))
+    if analytics.liquidity_metrics is not None:
+        message.liquidity_metrics.CopyFrom(pb.LiquidityMetrics(**analytics.liquidity_metrics.model_dump()))
+    if analytics.trade_flow is not None:
+        flow = analytics.trade_flow
+        message.trade_flow.CopyFrom(pb.TradeFlow(**_present(
+            trades=flow.trades,
+            windows=[pb.TradeFlowWindow(**_present(**window.model_dump())) for window in flow.windows],
+            order_flow_imbalance=flow.order_flow_imbalance,
+            size_distribution=pb.TradeSizeDistribution(**_present(**flow.size_distribution.model_dump()))
+            if flow.size_distribution is not None else None,
+            kyle_lambda=flow.kyle_lambda,
+            effective_spread=flow.effective_spread,
+            mean_effective_spread=flow.mean_effective_spread,
+            realized_spread=flow.realized_spread,
+            price_impact=flow.price_impact
+        )))
+    for trade in analytics.recent_trades or []:
+        message.recent_trades.add(
+            trade_id=trade.trade_id,
+            price=trade.price,
+            size=trade.size,
+            side=trade.side.value,
+            yes_no=trade.yes_no,
+            timestamp_ms=_epoch_ms(trade.timestamp)
+        )
+    return message
+
+def arbitrage_message(response: ArbitrageResponse):
+    return pb.Arbitrage(
+        opportunities=[
+            pb.PairOpportunity(**_present(
+                market_ticker_1=item.market_ticker_1,
+                market_ticker_2=item.market_ticker_2,
+                price_1=item.price_1,
+                price_2=item.price_2,
+                spread=item.spread,
+                spread_percentage=item.spread_percentage,
+                confidence=item.confidence.value,
+                potential_profit=item.potential_profit,
+                market_1_title=item.market_1_title,
+                market_2_title=item.market_2_title,
+                expiry_ms=_epoch_ms(item.expiry_date)
+            ))
+            for item in response.opportunities
+        ],
+        event_opportunities=[
+            pb.EventOpportunity(**_present(
+                event_ticker=item.event_ticker,
+                strategy=item.strategy,
+                market_tickers=item.market_tickers,
+                prices=item.prices,
+                basket_price=item.basket_price,
+                edge=item.edge,
+                edge_percentage=item.edge_percentage,
+                executable_size=item.executable_size,
+                potential_profit=item.potential_profit,
+                confidence=item.confidence.value,
+                event_title=item.event_title,
+                expiry_ms=_epoch_ms(item.expiry_date)
+            ))
+            for item in response.event_opportunities
+        ],
+        complement_opportunities=[
+            pb.ComplementOpportunity(**_present(
+                market_ticker=item.market_ticker,
+                strategy=item.strategy,
+                yes_price=item.yes_price,
+                no_price=item.no_price,
+                combined_price=item.combined_price,
+                edge=item.edge,
+                edge_percentage=item.edge_percentage,
+                executable_size=item.executable_size,
+                potential_profit=item.potential_profit,
+                confidence=item.confidence.value,
+                market_title=item.market_title,
+                expiry_ms=_epoch_ms(item.expiry_date)
+            ))
+            for item in response.complement_opportunities
+        ],
+        count=response.count
+    )
+
+def analytics_request(request) -> AnalyticsRequest:
+    return AnalyticsRequest(
+        market_ticker=request.market_ticker,
+        fields=list(request.fields) or None,
+        include_orderbook=not request.exclude_orderbook,
+        include_trades=not request.exclude_trades
+    )
+
+class DataServicer(services.DataServiceServicer):
+    """gRPC face of the data service, sharing the REST app's client, engine and caches.
+
+    Unary calls are admitted against the same upstream budget as their REST
+    routes. Streams join the shared StreamHub topics, so a book or analytics
+    topic is computed once however many REST, WebSocket and gRPC
+    subscribers it has.
+    """
+
+    def __init__(self, client: KalshiClient, analytics: AnalyticsEngine, store: MarketStore,
+                 hub: StreamHub,
+                 build_analytics: Callable[..., Awaitable[AnalyticsResponse]],
+                 build_arbitrage: Callable[..., Awaitable[ArbitrageResponse]],
+                 stream_producer: Callable[[str], Callable[[], Awaitable]]):
+        self.client = client
+        self.analytics = analytics
+        self.store = store
+        self.hub = hub
+        self.build_analytics = build_analytics
+        self.build_arbitrage = build_arbitrage
+        self.stream_producer = stream_producer
+
+    async def _admit(self, context, route: str, default_cost: float):
+        try:
+            return self.client.budget.admit(route, default_cost)
+        except BudgetExhausted as e:
+            await context.abort(
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+                str(e),
+                trailing_metadata=(("retry-after", str(max(1, math.ceil(e.retry_after)))),)
+            )
+
+    async def _fail(self, context, e: Exception):
+        """Map errors the way the REST routes do: bad upstream data, bad input, everything else"""
+        if isinstance(e, ValidationError):
+            # A ValueError too, but from parsing upstream data rather than the request
+            await context.abort(grpc.StatusCode.UNAVAILABLE, f"Upstream returned invalid data: {e}")
+        if isinstance(e, ValueError):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+    async def ListMarkets(self, request, context):
+        limit = request.limit or 100
+        admission = await self._admit(context, "grpc:ListMarkets", 1)
+        try:
+            status = MarketStatus(request.status) if request.status else None
+            if self.store.ready and (not request.cursor or request.cursor.isdigit()):
+                offset = int(request.cursor) if request.cursor else 0
+                markets, total = self.store.query(
+                    status=status,
+                    event_ticker=request.event_ticker or None,
+                    series_ticker=request.series_ticker or None,
+                    category=request.category or None,
+                    sort_by=request.sort_by or None,
+                    descending=request.descending,
+                    offset=offset,
+                    limit=limit
+                )
+                cursor = str(offset + limit) if offset + limit < total else ""
+            else:
+                markets = await self.client.get_markets(
+                    limit=limit,
+                    cursor=request.cursor or None,
+                    event_ticker=request.event_ticker or None,
+                    series_ticker=request.series_ticker or None,
+                    status=status
+                )
+                cursor, total = "", len(markets)
+            return pb.ListMarketsResponse(
+                markets=[market_message(market) for market in markets], cursor=cursor, count=total
+            )
+        except Exception as e:
+            await self._fail(context, e)
+        finally:
+            self.client.budget.release(admission)
+
+    async def GetMarket(self, request, context):
+        admission = await self._admit(context, "grpc:GetMarket", 1)
+        try:
+            market = self.store.get(request.market_ticker) or await self.client.get_market(request.market_ticker)
+            return market_message(market)
+        except Exception as e:
+            await self._fail(context, e)
+        finally:
+            self.client.budget.release(admission)
+
+    async def GetOrderBook(self, request, context):
+        admission = await self._admit(context, "grpc:GetOrderBook", 1)
+        try:
+            await self.client.get_market_orderbook(request.market_ticker)
+            return book_message(self.client.orderbooks[request.market_ticker])
+        except Exception as e:
+            await self._fail(context, e)
+        finally:
+            self.client.budget.release(admission)
+
+    async def GetAnalytics(self, request, context):
+        admission = await self._admit(context, "grpc:GetAnalytics", 3)
+        try:
+            response = await self.build_analytics(self.client, self.analytics, analytics_request(request), self.store)
+            return analytics_message(response.analytics)
+        except Exception as e:
+            await self._fail(context, e)
+        finally:
+            self.client.budget.release(admission)
+
+    async def GetArbitrage(self, request, context):
+        admission = await self._admit(context, "grpc:GetArbitrage", 1)
+        try:
+            return arbitrage_message(await self.build_arbitrage(self.client, self.analytics, self.store))
+        except Exception as e:
+            await self._fail(context, e)
+        finally:
+            self.client.budget.release(admission)
+
+    async def StreamOrderBook(self, request, context):
+        topic = f"orderbook:{request.market_ticker}"
+        subscription = self.hub.subscribe(topic, self.stream_producer(topic))
+        last_fingerprint = None
+        try:
+            while not context.done():
+                result: Optional[OrderBookResponse] = None
+                if await subscription.next(timeout=STREAM_POLL_SECONDS) is not None:
+                    result = subscription.result
+                if result is None or result.orderbook.fingerprint == last_fingerprint:
+                    continue
+                last_fingerprint = result.orderbook.fingerprint
+                yield book_message(CompactOrderBook.from_model(result.orderbook))
+        finally:
+            self.hub.unsubscribe(subscription)
+
+    async def StreamAnalytics(self, request, context):
+        topic = f"analytics:{request.market_ticker}"
+        subscription = self.hub.subscribe(topic, self.stream_producer(topic))
+        try:
+            while not context.done():
+                if await subscription.next(timeout=STREAM_POLL_SECONDS) is None:
+                    continue
+                yield analytics_message(subscription.result.analytics)
+        finally:
+            self.hub.unsubscribe(subscription)
+
+async def start_server(servicer: DataServicer, port: int) -> grpc.aio.Server:
+    server = grpc.aio.server(options=[
+        ("grpc.keepalive_time_ms", 30000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.max_send_message_length", 64 * 1024 * 1024)
+    ])
+    services.add_DataServiceServicer_to_server(servicer, server)
+    server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+    logger.info(f"gRPC server listening on port {port}")
+    return server
@@ -0,0 +1,253 @@
+from typing import Optional, List, Dict, Any, Set, Tuple
+from datetime import datetime
+from loguru import logger
+
+from models import KalshiMarket, EventNode, SeriesNode
+
+class MarketHierarchy:
+    """Series → event → market graph held locally, with lookups in both directions.
+
+    Markets link to their event through `event_ticker`; an event links to
+    its series through the event record's `series_ticker`, or failing that
+    through any of its markets that names one. Lookups are dict reads.
+    Upstream is only called to sync the records or to fill in events and
+    series that markets reference but the last sync did not return.
+    """
+
+    def __init__(self):
+        # Upstream records, keyed by event ticker and series ticker
+        self.events: Dict[str, Dict[str, Any]] = {}
+        self.series: Dict[str, Dict[str, Any]] = {}
+        self.last_sync: Optional[datetime] = None
+
+        self._market_event: Dict[str, str] = {}
+        self._event_markets: Dict[str, Set[str]] = {}
+        self._event_series: Dict[str, str] = {}
+        self._series_events: Dict[str, Set[str]] = {}
+        # Series named on the markets themselves, used when the event record has none
+        self._market_series: Dict[str, str] = {}
+        # Tickers upstream returned nothing for; retried after the next full sync
+        self._unresolvable: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._market_event)
+
+    def event_of(self, market_ticker: str) -> Optional[str]:
+        return self._market_event.get(market_ticker)
+
+    def series_of(self, market_ticker: str) -> Optional[str]:
+        event_ticker = self._market_event.get(market_ticker)
+        series_ticker = self._event_series.get(event_ticker) if event_ticker is not None else None
+        return series_ticker or self._market_series.get(market_ticker)
+
+    def series_of_event(self, event_ticker: str) -> Optional[str]:
+        return self._event_series.get(event_ticker)
+
+    def markets_of_event(self, event_ticker: str) -> Set[str]:
+        """Tickers of the event's markets; the set is shared, so callers must not modify it"""
+        return self._event_markets.get(event_ticker, set())
+
+    def events_of_series(self, series_ticker: str) -> Set[str]:
+        """Tickers of the series' events; the set is shared, so callers must not modify it"""
+        return self._series_events.get(series_ticker, set())
+
+    def markets_of_series(self, series_ticker: str) -> Set[str]:
+        markets = set()
+        for event_ticker in self._series_events.get(series_ticker, ()):
+            markets |= self._event_markets.get(event_ticker, set())
+        return markets
+
+    def exclusive_events(self) -> Set[str]:
+        """Event tickers whose markets are flagged as mutually exclusive"""
+        return {ticker for ticker, event in self.events.items() if event.get("mutually_exclusive")}
+
+    def event_titles(self) -> Dict[str, str]:
+        return {ticker: event.get("title") for ticker, event in self.events.items()}
+
+    def event_node(self, event_ticker: str) -> Optional[EventNode]:
+        record = self.events.get(event_ticker)
+        markets = self._event_markets.get(event_ticker)
+        if record is None and markets is None:
+            return None
+        record = record or {}
+        return EventNode(
+            event_ticker=event_ticker,
+            series_ticker=self._event_series.get(event_ticker),
+            title=record.get("title"),
+            category=record.get("category"),
+            mutually_exclusive=record.get("mutually_exclusive"),
+            market_tickers=sorted(markets or ())
+        )
+
+    def series_node(self, series_ticker: str) -> Optional[SeriesNode]:
+        record = self.series.get(series_ticker)
+        if record is None and series_ticker not in self._series_events:
+            return None
+        record = record or {}
+        return SeriesNode(
+            series_ticker=series_ticker,
+            title=record.get("title"),
+            category=record.get("category"),
+            frequency=record.get("frequency")
+        )
+
+    def update_markets(self, upserted: List[KalshiMarket], removed: List[str]):
+        """Market store listener: relink changed markets and the events they touch"""
+        touched = set()
+        for market in upserted:
+            previous = self._market_event.get(market.ticker)
+            if previous != market.event_ticker:
+                if previous is not None:
+                    self._unlink_market(market.ticker, previous)
+                    touched.add(previous)
+                if market.event_ticker:
+                    self._market_event[market.ticker] = market.event_ticker
+                    self._event_markets.setdefault(market.event_ticker, set()).add(market.ticker)
+            if market.series_ticker:
+                self._market_series[market.ticker] = market.series_ticker
+            else:
+                self._market_series.pop(market.ticker, None)
+            if market.event_ticker:
+                touched.add(market.event_ticker)
+
+        for ticker in removed:
+            self._market_series.pop(ticker, None)
+            event_ticker = self._market_event.pop(ticker, None)
+            if event_ticker is not None:
+                self._unlink_market(ticker, event_ticker)
+                touched.add(event_ticker)
+
+        for event_ticker in touched:
+            self._link_event(event_ticker)
+
+    def apply_events(self, records: List[Dict[str, Any]], complete: bool = False):
+        """Merge event records; a complete batch also drops events missing from it"""
+        fresh = {record["event_ticker"]: record for record in records if record.get("event_ticker")}
+        touched = set(fresh)
+        if complete:
+            touched |= set(self.events) - touched
+            self.events = fresh
+        else:
+            self.events.update(fresh)
+        self._unresolvable -= set(fresh)
+        for event_ticker in touched:
+            self._link_event(event_ticker)
+
+    def apply_series(self, records: List[Dict[str, Any]], complete: bool = False):
+        """Merge series records; a complete batch replaces them all"""
+        fresh = {record["ticker"]: record for record in records if record.get("ticker")}
+        if complete:
+            self.series = fresh
+        else:
+            self.series.update(fresh)
+        self._unresolvable -= set(fresh)
+
+    async def sync(self, client) -> None:
+        """Pull every event and series record and relink the graph"""
+        events = await client.get_all_events()
+        self.apply_events(events, complete=True)
+        try:
+            self.apply_series(await client.get_all_series(), complete=True)
+        except Exception as e:
+            logger.warning(f"Failed to sync series: {e}")
+        self._unresolvable.clear()
+        self.last_sync = datetime.utcnow()
+        logger.info(f"Hierarchy synced: {len(self.series)} series, {len(self.events)} events")
+
+    def missing(self) -> Tuple[List[str], List[str]]:
+        """Event and series tickers the graph links to but holds no record for"""
+        events = [
+            ticker for ticker in self._event_markets
+            if ticker not in self.events and ticker not in self._unresolvable
+        ]
+        series = [
+            ticker for ticker in self._series_events
+            if ticker not in self.series and ticker not in self._unresolvable
+        ]
+        return events, series
+
+    async def refresh_missing(self, client, limit: int = 20) -> int:
+        """Fetch up to `limit` missing event and series records; returns how many were fetched.
+
+        Markets that appear between full syncs bring new events with them,
+        so this keeps the graph complete without re-listing everything.
+        """
+        fetched = 0
+        events, _ = self.missing()
+        for event_ticker in events[:limit]:
+            fetched += 1
+            try:
+                record = await client.get_event(event_ticker)
+            except Exception as e:
+                logger.debug(f"Failed to fetch event {event_ticker}: {e}")
+                record = None
+            if record and record.get("event_ticker"):
+                self.apply_events([record])
+            else:
+                self._unresolvable.add(event_ticker)
+
+        # Events just fetched may have linked new series
+        _, series = self.missing()
+        for series_ticker in series[:max(limit - fetched, 0)]:
+            fetched += 1
+            try:
+                record = await client.get_series_by_ticker(series_ticker)
+            except Exception as e:
+                logger.debug(f"Failed to fetch series {series_ticker}: {e}")
+                record = None
+            if record and record.get("ticker"):
+                self.apply_series([record])
+            else:
+                self._unresolvable.add(series_ticker)
+        return fetched
+
+    def _unlink_market(self, market_ticker: str, event_ticker: str):
+        markets = self._event_markets.get(event_ticker)
+        if markets is not None:
+            markets.discard(market_ticker)
+            if not markets:
+                del self._event_markets[event_ticker]
+
+    def _link_event(self, event_ticker: str):
+        """Point the event at its series: the record's, else one named by its markets"""
+        markets = self._event_markets.get(event_ticker, ())
+        record = self.events.get(event_ticker)
+        series_ticker = record.get("series_ticker") if record else None
+        if not series_ticker:
+            series_ticker = next(
+                (self._market_series[ticker] for ticker in markets if ticker in self._market_series), None
+            )
+        if not record and not markets:
+            # Nothing refers to the event any more
+            series_ticker = None
+
+        current = self._event_series.get(event_ticker)
+        if series_ticker == current:
+            return
+        if current is not None:
+            events = self._series_events[current]
+            events.discard(event_ticker)
+            if not events:
+                del self._series_events[current]
+            del self._event_series[event_ticker]
+        if series_ticker:
+            self._event_series[event_ticker] = series_ticker
+            self._series_events.setdefault(series_ticker, set()).add(event_ticker)
+
+    def stats(self) -> Dict[str, Any]:
+        events, series = self.missing()
+        return {
+            "markets": len(self._market_event),
+            "events": len(self._event_markets.keys() | self.events.keys()),
+            "series": len(self._series_events.keys() | self.series.keys()),
+            "event_records": len(self.events),
+            "series_records": len(self.series),
+            "events_without_series": sum(1 for ticker in self._event_markets if ticker not in self._event_series),
+            "markets_without_series": sum(
+                1 for ticker in self._market_event if self.series_of(ticker) is None
+            ),
+            "missing_events": len(events),
+            "missing_series": len(series),
+            "unresolvable": len(self._unresolvable),
+            "last_sync": self.last_sync.isoformat() if self.last_sync else None
+        }
@@ -1,15 +1,24 @@
 import httpx
 import asyncio
 import time
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator, Union
+from datetime import datetime, timedelta, timezone
 from loguru import logger
 import json
 
 from models import (
     KalshiMarket, KalshiOrderBook, KalshiTrade, KalshiCandlestick,
-    KalshiOrderBookLevel, MarketStatus, OrderSide
+    MarketStatus
 )
+from compact import CompactOrderBook, TradeBuffer, TradeColumns
+import profiling
+from budget import UpstreamBudget
+import scheduler
+from scheduler import RequestScheduler, Priority, current_priority
+
+# Upstream cap on candlesticks returned by a single request
+MAX_CANDLES_PER_REQUEST = 5000
+CANDLE_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400}
 
 class RateLimiter:
     def __init__(self, requests_per_minute: int = 45): # Lowered from 60 to 45
@@ -31,15 +40,52 @@ class RateLimiter:
         
         # It's now safe to add the new request time
         self.requests.append(time.time())
+    
+    def try_acquire(self) -> bool:
+        """Take a slot in the current window without waiting; False when the window is full"""
+        now = time.time()
+        self.requests = [req_time for req_time in self.requests if now - req_time < 60]
+        if len(self.requests) >= self.requests_per_minute:
+            return False
+        self.requests.append(now)
+        return True
+    
+    def remaining(self) -> int:
+        """Requests still available in the current one-minute window"""
+        now = time.time()
+        return max(0, self.requests_per_minute - sum(1 for req_time in self.requests if now - req_time < 60))
+    
+    def seconds_until_available(self) -> float:
+        """Time until the oldest request in the window expires"""
+        now = time.time()
+        recent = [req_time for req_time in self.requests if now - req_time < 60]
+        if len(recent) < self.requests_per_minute:
+            return 0.0
+        return 60 - (now - recent[0])
 
 class KalshiClient:
     def __init__(self, base_url: str, api_key: str, 
-                 rate_limit_requests_per_minute: int = 60):
+                 rate_limit_requests_per_minute: int = 60,
+                 budget_degrade_fraction: float = 0.5,
+                 budget_reject_fraction: float = 0.2,
+                 budget_background_fraction: float = 0.0,
+                 max_in_flight: int = 8):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.rate_limiter = RateLimiter(rate_limit_requests_per_minute)
+        # Per-route share of the rate limit, used for admission control
+        self.budget = UpstreamBudget(
+            self.rate_limiter, budget_degrade_fraction, budget_reject_fraction, budget_background_fraction
+        )
+        # Orders queued calls by priority class ahead of the rate limiter
+        self.scheduler = RequestScheduler(self.rate_limiter, max_in_flight)
         self.session: Optional[httpx.AsyncClient] = None
         self.authenticated = False
+        # Latest order book and rolling trades seen for each market, in compact form
+        self.orderbooks: Dict[str, CompactOrderBook] = {}
+        self.trade_buffers: Dict[str, TradeBuffer] = {}
+        # Captures every new book and trade when set; see recorder.MarketRecorder
+        self.recorder = None
         
     async def authenticate(self):
         """Authenticate with Kalshi API"""
@@ -63,10 +109,24 @@ class KalshiClient:
     
     async def _make_request(self, method: str, endpoint: str, 
                            params: Optional[Dict] = None, 
-                           json_data: Optional[Dict] = None) -> Dict[str, Any]:
-        """Make HTTP request with rate limiting and error handling"""
-        await self.rate_limiter.wait_if_needed()
-        
+                           json_data: Optional[Dict] = None,
+                           priority: Optional[Priority] = None) -> Dict[str, Any]:
+        """Make HTTP request with rate limiting and error handling.
+
+        Calls wait for a scheduler slot at `priority`, defaulting to the
+        caller's scheduler.priority() context (interactive if unset).
+        """
+        level = current_priority() if priority is None else priority
+        self.budget.charge(background=level >= Priority.BACKGROUND)
+        with profiling.phase("rate_limit_wait"):
+            await self.scheduler.acquire(priority)
+        try:
+            return await self._send(method, endpoint, params, json_data)
+        finally:
+            self.scheduler.release()
+    
+    async def _send(self, method: str, endpoint: str,
+                    params: Optional[Dict], json_data: Optional[Dict]) -> Dict[str, Any]:
         session = await self._get_session()
         url = f"{self.base_url}{endpoint}"
         
@@ -74,19 +134,21 @@ class KalshiClient:
         
         try:
             logger.debug(f"Making {method} request to {url}")
-            response = await session.request(
-                method=method,
-                url=url,
-                params=params,
-                json=json_data,
-                headers=headers
-            )
+            with profiling.phase("upstream_io"):
+                response = await session.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    json=json_data,
+                    headers=headers
+                )
             response.raise_for_status()
             
             # Log raw response
-            raw_data = response.json()
-            logger.info(f"Received data from {url}:")
-            logger.info(json.dumps(raw_data, indent=2))
+            with profiling.phase("upstream_decode"):
+                raw_data = response.json()
+                logger.info(f"Received data from {url}:")
+                logger.info(json.dumps(raw_data, indent=2))
             
             return raw_data
         
@@ -102,7 +164,8 @@ class KalshiClient:
     
     async def get_markets(self, limit: int = 100, cursor: Optional[str] = None,
                          event_ticker: Optional[str] = None,
-                         series_ticker: Optional[str] = None) -> List[KalshiMarket]:
+                         series_ticker: Optional[str] = None,
+                         status: Optional[MarketStatus] = None) -> List[KalshiMarket]:
         """Get markets from Kalshi API"""
         params = {"limit": limit}
         
@@ -112,6 +175,8 @@ class KalshiClient:
             params["event_ticker"] = event_ticker
         if series_ticker:
             params["series_ticker"] = series_ticker
+        if status:
+            params["status"] = status.value
         
         response = await self._make_request("GET", "/markets", params=params)
         
@@ -125,7 +190,41 @@ class KalshiClient:
                 continue
         
         return markets
-    
+
+    async def get_all_markets(self, page_size: int = 1000, max_pages: int = 100) -> List[KalshiMarket]:
+        """Get the full market universe by following the response cursor"""
+        markets = []
+        for market_data in await self._get_all_pages("/markets", "markets", page_size, max_pages):
+            try:
+                markets.append(self._parse_market(market_data))
+            except Exception as e:
+                logger.warning(f"Failed to parse market {market_data.get('ticker', 'unknown')}: {e}")
+                continue
+
+        return markets
+
+    async def _get_all_pages(self, endpoint: str, key: str, page_size: int,
+                             max_pages: int, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Collect `key` records from every page of a cursor-paginated endpoint"""
+        records = []
+        cursor = None
+
+        for _ in range(max_pages):
+            page_params = dict(params or {}, limit=page_size)
+            if cursor:
+                page_params["cursor"] = cursor
+
+            response = await self._make_request("GET", endpoint, params=page_params)
+            records.extend(response.get(key, []))
+
+            cursor = response.get("cursor")
+            if not cursor:
+                break
+        else:
+            logger.warning(f"Stopped {endpoint} pagination after {max_pages} pages")
+
+        return records
+
     async def get_market(self, market_ticker: str) -> KalshiMarket:
         """Get a specific market"""
         response = await self._make_request("GET", f"/markets/{market_ticker}")
@@ -134,27 +233,86 @@ class KalshiClient:
     async def get_market_orderbook(self, market_ticker: str) -> KalshiOrderBook:
         """Get order book for a market"""
         response = await self._make_request("GET", f"/markets/{market_ticker}/orderbook")
-        return self._parse_orderbook(market_ticker, response.get("orderbook", {}))
+        with profiling.phase("parse"):
+            orderbook = self._parse_orderbook(market_ticker, response.get("orderbook", {}))
+            orderbook.follow(self.orderbooks.get(orderbook.market_ticker))
+            self.orderbooks[orderbook.market_ticker] = orderbook
+            if self.recorder is not None and (orderbook.changes is None or not orderbook.changes.empty):
+                self.recorder.record_book(orderbook)
+            return orderbook.to_model()
     
     async def get_market_trades(self, market_ticker: str, limit: int = 100) -> List[KalshiTrade]:
         """Get recent trades for a market"""
+        columns = await self.get_market_trade_columns(market_ticker, limit=limit)
+        return columns.to_models()
+
+    async def get_market_trade_columns(self, market_ticker: str, limit: int = 100) -> TradeColumns:
+        """Get recent trades for a market as columns, oldest first"""
         params = {"limit": limit}
         # This endpoint gets all trades, so we will filter by market_ticker.
         # This can be inefficient if there are many trades.
         logger.info("Fetching all trades and filtering by market_ticker. This may be slow.")
         response = await self._make_request("GET", f"/markets/trades", params=params)
         
-        trades = []
-        for trade_data in response.get("trades", []):
-            if trade_data.get("market_ticker") == market_ticker:
-                try:
-                    trade = self._parse_trade(market_ticker, trade_data)
-                    trades.append(trade)
-                except Exception as e:
-                    logger.warning(f"Failed to parse trade: {e}")
-                    continue
-        
-        return trades
+        with profiling.phase("parse"):
+            records = [
+                trade_data for trade_data in response.get("trades", [])
+                if trade_data.get("market_ticker") == market_ticker
+            ]
+            columns = TradeColumns.from_records(market_ticker, records).sorted()
+            self._buffer_trades(columns)
+        return columns
+
+    async def iter_trade_pages(self, market_ticker: str,
+                               min_ts: Optional[int] = None,
+                               max_ts: Optional[int] = None,
+                               page_size: int = 1000,
+                               max_pages: int = 1000) -> AsyncIterator[TradeColumns]:
+        """Yield a market's trade history one columnar page at a time"""
+        params = {"ticker": market_ticker, "limit": page_size}
+        if min_ts:
+            params["min_ts"] = min_ts
+        if max_ts:
+            params["max_ts"] = max_ts
+
+        for _ in range(max_pages):
+            response = await self._make_request("GET", "/markets/trades", params=params, priority=Priority.BULK)
+            records = [
+                trade_data for trade_data in response.get("trades", [])
+                if trade_data.get("market_ticker", market_ticker) == market_ticker
+            ]
+            if records:
+                yield TradeColumns.from_records(market_ticker, records)
+
+            cursor = response.get("cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+    async def get_trade_history(self, market_ticker: str,
+                                min_ts: Optional[int] = None,
+                                max_ts: Optional[int] = None,
+                                max_pages: int = 1000) -> TradeColumns:
+        """Load a market's trade history in bulk as columns, oldest first"""
+        pages = [page async for page in self.iter_trade_pages(market_ticker, min_ts, max_ts, max_pages=max_pages)]
+        columns = TradeColumns.concat(market_ticker, pages).sorted()
+        self._buffer_trades(columns)
+        return columns
+
+    def _buffer_trades(self, columns: TradeColumns):
+        if len(columns) == 0:
+            return
+        buffer = self.trade_buffers.get(columns.market_ticker)
+        if buffer is None:
+            buffer = self.trade_buffers[columns.market_ticker] = TradeBuffer(columns.market_ticker)
+        added = buffer.merge(columns)
+        if self.recorder is not None and len(added):
+            self.recorder.record_trades(added)
+
+    def drop_orderbooks(self, upserted: List[KalshiMarket], removed: List[str]):
+        """Market store listener: forget books of markets that left the universe"""
+        for ticker in removed:
+            self.orderbooks.pop(ticker, None)
     
     async def get_market_candlesticks(self, series_ticker: str, market_ticker: str, 
                                     start_ts: Optional[int] = None,
@@ -189,6 +347,28 @@ class KalshiClient:
         
         return candlesticks
     
+    async def iter_candlestick_windows(self, series_ticker: str, market_ticker: str,
+                                       start_ts: int, end_ts: int,
+                                       period_interval: int = 1,
+                                       period_unit: str = "h") -> AsyncIterator[List[KalshiCandlestick]]:
+        """Yield candlesticks for a long range one request-sized window at a time"""
+        period_seconds = period_interval * CANDLE_UNIT_SECONDS.get(period_unit, 3600)
+        window = period_seconds * MAX_CANDLES_PER_REQUEST
+
+        window_start = start_ts
+        while window_start < end_ts:
+            window_end = min(window_start + window, end_ts)
+            with scheduler.priority(Priority.BULK):
+                candlesticks = await self.get_market_candlesticks(
+                    series_ticker, market_ticker,
+                    start_ts=window_start,
+                    end_ts=window_end,
+                    period_interval=period_interval,
+                    period_unit=period_unit
+                )
+            yield candlesticks
+            window_start = window_end
+    
     async def get_events(self, limit: int = 100, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get events from Kalshi API"""
         params = {"limit": limit}
@@ -198,6 +378,10 @@ class KalshiClient:
         response = await self._make_request("GET", "/events", params=params)
         return response.get("events", [])
     
+    async def get_all_events(self, page_size: int = 200, max_pages: int = 100) -> List[Dict[str, Any]]:
+        """Get every event by following the response cursor"""
+        return await self._get_all_pages("/events", "events", page_size, max_pages)
+
     async def get_event(self, event_ticker: str) -> Dict[str, Any]:
         """Get a specific event by its ticker"""
         response = await self._make_request("GET", f"/events/{event_ticker}")
@@ -212,6 +396,10 @@ class KalshiClient:
         response = await self._make_request("GET", "/series", params=params)
         return response.get("series", [])
 
+    async def get_all_series(self, page_size: int = 200, max_pages: int = 100) -> List[Dict[str, Any]]:
+        """Get every series by following the response cursor"""
+        return await self._get_all_pages("/series", "series", page_size, max_pages)
+
     async def get_series_by_ticker(self, series_ticker: str) -> Dict[str, Any]:
         """Get a specific series by its ticker"""
         response = await self._make_request("GET", f"/series/{series_ticker}")
@@ -220,9 +408,10 @@ class KalshiClient:
     def _parse_market(self, market_data: Dict[str, Any]) -> KalshiMarket:
         """Parse market data from API response"""
         # Pydantic will automatically map fields and handle aliases
-        return KalshiMarket.parse_obj(market_data)
+        with profiling.phase("parse"):
+            return KalshiMarket.parse_obj(market_data)
     
-    def _parse_orderbook(self, market_ticker: str, orderbook_data: Dict[str, Any]) -> KalshiOrderBook:
+    def _parse_orderbook(self, market_ticker: str, orderbook_data: Dict[str, Any]) -> CompactOrderBook:
         """Parse order book data from API response, handling potential None values."""
         yes_data = orderbook_data.get("yes")
         no_data = orderbook_data.get("no")
@@ -236,11 +425,11 @@ class KalshiClient:
             
             # Check if data is a dict containing the side
             if isinstance(data, dict) and side in data:
-                return [KalshiOrderBookLevel(price=level[0], size=level[1]) for level in data[side]]
+                return [(level[0], level[1]) for level in data[side]]
             
             # Check if data is a direct list of levels (assuming it's for bids if not specified)
             if isinstance(data, list):
-                 return [KalshiOrderBookLevel(price=level[0], size=level[1]) for level in data]
+                 return [(level[0], level[1]) for level in data]
 
             return []
 
@@ -252,25 +441,10 @@ class KalshiClient:
         no_bids = get_levels(no_data, 'bids') if isinstance(no_data, dict) else get_levels(no_data, None)
         no_asks = get_levels(no_data, 'asks') if isinstance(no_data, dict) else []
 
-        return KalshiOrderBook(
-            market_ticker=market_ticker,
-            yes_bids=yes_bids,
-            yes_asks=yes_asks,
-            no_bids=no_bids,
-            no_asks=no_asks,
-            timestamp=datetime.utcnow()
-        )
-    
-    def _parse_trade(self, market_ticker: str, trade_data: Dict[str, Any]) -> KalshiTrade:
-        """Parse trade data from API response"""
-        return KalshiTrade(
-            market_ticker=market_ticker,
-            trade_id=trade_data.get("trade_id", ""),
-            price=trade_data.get("price", 0.0),
-            size=trade_data.get("size", 0),
-            side=OrderSide(trade_data.get("side", "bid")),
-            timestamp=self._parse_datetime(trade_data.get("timestamp")) or datetime.utcnow(),
-            yes_no=trade_data.get("yes_no", "yes")
+        return CompactOrderBook(
+            market_ticker,
+            {"yes_bids": yes_bids, "yes_asks": yes_asks, "no_bids": no_bids, "no_asks": no_asks},
+            datetime.utcnow()
         )
     
     def _parse_candlestick(self, market_ticker: str, candle_data: Dict[str, Any]) -> KalshiCandlestick:
@@ -285,12 +459,16 @@ class KalshiClient:
             timestamp=self._parse_datetime(candle_data.get("timestamp")) or datetime.utcnow()
         )
     
-    def _parse_datetime(self, date_str: Optional[str]) -> Optional[datetime]:
-        """Parse datetime string from API response"""
+    def _parse_datetime(self, date_str: Optional[Union[str, int, float]]) -> Optional[datetime]:
+        """Parse datetime string or epoch seconds from API response"""
         if not date_str:
             return None
         
         try:
+            # Numeric timestamps would make strptime raise, so handle them first
+            if isinstance(date_str, (int, float)):
+                return datetime.fromtimestamp(date_str, tz=timezone.utc).replace(tzinfo=None)
+            
             # Try different datetime formats
             for fmt in [
                 "%Y-%m-%dT%H:%M:%S.%fZ",
@@ -303,10 +481,6 @@ class KalshiClient:
                 except ValueError:
                     continue
             
-            # If no format works, try parsing as timestamp
-            if isinstance(date_str, (int, float)):
-                return datetime.fromtimestamp(date_str)
-            
             logger.warning(f"Could not parse datetime: {date_str}")
             return None
             
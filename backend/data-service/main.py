@@ -1,10 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+import math
+import time
 import uvicorn
 import os
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from pydantic import ValidationError
 from loguru import logger
+import numpy as np
 
 from kalshi_client import KalshiClient
 from models import (
@@ -12,9 +22,42 @@ from models import (
     OrderBookResponse, 
     AnalyticsResponse, 
     ArbitrageResponse,
-    DashboardStatsResponse
+    DashboardStatsResponse,
+    MarketChangesResponse,
+    MarketSearchResponse,
+    MarketSearchResult,
+    MarketStatus,
+    ExportFormat,
+    AnalyticsRequest,
+    DepthResponse,
+    CorrelationMatrix,
+    CorrelationResponse,
+    SimulationRequest,
+    SimulationResult,
+    SimulationResponse,
+    ScreenerResponse,
+    MarketAnalytics,
+    MarketHierarchyResponse,
+    SeriesEventsResponse
 )
-from analytics import AnalyticsEngine
+from analytics import AnalyticsEngine, LIQUIDITY_SAMPLE, DEGRADED_LIQUIDITY_SAMPLE
+from market_store import MarketStore
+from market_search import MarketSearchIndex
+from streaming import StreamHub, Subscription
+import export
+import snapshot
+from compact import CompactOrderBook
+from depth import DepthCache
+from correlation import RollingCorrelation, to_rows
+from refresh import RefreshScheduler
+from screener import MetricsTable
+from swr import StaleWhileRevalidate
+from recorder import MarketRecorder
+import simulation
+import profiling
+from budget import Admission, BudgetExhausted
+import scheduler
+from scheduler import Priority
 
 # Load environment variables
 load_dotenv()
@@ -22,20 +65,359 @@ load_dotenv()
 # Global client instance
 kalshi_client = None
 analytics_engine = None
+market_store = None
+search_index = None
+stream_hub = None
+correlation_tracker = None
+simulation_pool = None
+refresh_scheduler = None
+metrics_table = None
+response_cache = None
+market_recorder = None
+sampling_profiler = profiling.SamplingProfiler()
+depth_cache = DepthCache()
+
+MARKET_SYNC_INTERVAL_SECONDS = float(os.getenv("MARKET_SYNC_INTERVAL_SECONDS", "300"))
+STREAM_REFRESH_SECONDS = float(os.getenv("STREAM_REFRESH_SECONDS", "5"))
+STREAM_KEEPALIVE_SECONDS = 15.0
+# Warm-start snapshot; set SNAPSHOT_PATH to an empty string to disable
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "snapshot.bin")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "60"))
+# Older snapshots are ignored and the service cold-starts from upstream
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "900"))
+# Fractions of the per-minute upstream budget below which expensive routes degrade / get 429
+UPSTREAM_BUDGET_DEGRADE_FRACTION = float(os.getenv("UPSTREAM_BUDGET_DEGRADE_FRACTION", "0.5"))
+UPSTREAM_BUDGET_REJECT_FRACTION = float(os.getenv("UPSTREAM_BUDGET_REJECT_FRACTION", "0.2"))
+# Rolling cross-market correlation: sample interval, window length in intervals, and universe.
+# Markets without a fresh book fall back to the synced last price, so sample at the sync cadence
+CORRELATION_INTERVAL_SECONDS = float(os.getenv("CORRELATION_INTERVAL_SECONDS", str(MARKET_SYNC_INTERVAL_SECONDS)))
+CORRELATION_WINDOW = int(os.getenv("CORRELATION_WINDOW", "120"))
+CORRELATION_MAX_MARKETS = int(os.getenv("CORRELATION_MAX_MARKETS", "200"))
+# Comma-separated tickers to correlate; when empty, the most traded open markets are used
+CORRELATION_MARKETS = [ticker for ticker in os.getenv("CORRELATION_MARKETS", "").split(",") if ticker]
+# Portfolio simulation: worker processes (0 runs in a thread), scenario cap, and book age for prices
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "0"))
+MAX_SIMULATION_SCENARIOS = int(os.getenv("MAX_SIMULATION_SCENARIOS", "5000000"))
+SIMULATION_BOOK_MAX_AGE_SECONDS = float(os.getenv("SIMULATION_BOOK_MAX_AGE_SECONDS", "300"))
+# Oldest cached book the arbitrage scans treat as executable
+ARBITRAGE_BOOK_MAX_AGE_SECONDS = float(os.getenv("ARBITRAGE_BOOK_MAX_AGE_SECONDS", "60"))
+# Adaptive order book refresh: markets followed (0 disables), share of the rate limit, and rebalance period
+REFRESH_MAX_MARKETS = int(os.getenv("REFRESH_MAX_MARKETS", "100"))
+REFRESH_BUDGET_FRACTION = float(os.getenv("REFRESH_BUDGET_FRACTION", "0.3"))
+REFRESH_REBALANCE_SECONDS = float(os.getenv("REFRESH_REBALANCE_SECONDS", "30"))
+# gRPC interface for the API gateway (0 disables)
+GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+# Stale-while-revalidate serving: fresh window, extra window served while refreshing,
+# oldest result served when upstream fails, and longest wait for upstream once past the stale window
+SWR_FRESH_SECONDS = float(os.getenv("SWR_FRESH_SECONDS", "5"))
+SWR_STALE_SECONDS = float(os.getenv("SWR_STALE_SECONDS", "60"))
+SWR_MAX_STALE_SECONDS = float(os.getenv("SWR_MAX_STALE_SECONDS", "900"))
+SWR_WAIT_SECONDS = float(os.getenv("SWR_WAIT_SECONDS", "2"))
+# Market data recorder: log directory (empty disables), flush period, queue bound, and retention (0 keeps all)
+RECORDER_PATH = os.getenv("RECORDER_PATH", "")
+RECORDER_FLUSH_SECONDS = float(os.getenv("RECORDER_FLUSH_SECONDS", "1"))
+RECORDER_MAX_PENDING = int(os.getenv("RECORDER_MAX_PENDING", "100000"))
+RECORDER_RETENTION_HOURS = float(os.getenv("RECORDER_RETENTION_HOURS", "0"))
+# Series/event hierarchy: how often events new markets reference are looked up, and lookups per pass
+HIERARCHY_REFRESH_SECONDS = float(os.getenv("HIERARCHY_REFRESH_SECONDS", "30"))
+HIERARCHY_MAX_LOOKUPS = int(os.getenv("HIERARCHY_MAX_LOOKUPS", "20"))
+
+async def market_sync_loop():
+    """Keep the in-memory market universe in step with Kalshi"""
+    while True:
+        try:
+            with scheduler.priority(Priority.BACKGROUND):
+                await market_store.sync(kalshi_client)
+        except Exception as e:
+            logger.warning(f"Market universe sync failed: {e}")
+        await asyncio.sleep(MARKET_SYNC_INTERVAL_SECONDS)
+
+async def hierarchy_loop():
+    """Fill in events and series that markets seen since the last full sync refer to"""
+    while True:
+        await asyncio.sleep(HIERARCHY_REFRESH_SECONDS)
+        try:
+            with scheduler.priority(Priority.BACKGROUND):
+                fetched = await market_store.hierarchy.refresh_missing(kalshi_client, HIERARCHY_MAX_LOOKUPS)
+            if fetched:
+                logger.debug(f"Hierarchy looked up {fetched} missing events and series")
+        except Exception as e:
+            logger.warning(f"Hierarchy refresh failed: {e}")
+
+async def resolve_hierarchy(client: KalshiClient, store: MarketStore, market_ticker: str,
+                            route: Optional[str] = None):
+    """Make sure the hierarchy knows a market's event and series, going upstream only for what is missing.
+
+    With `route`, the upstream lookups are admitted against the budget and
+    charged to it; without, the caller's own admission covers them.
+    """
+    hierarchy = store.hierarchy
+    event_ticker = hierarchy.event_of(market_ticker)
+    if event_ticker is not None and event_ticker in hierarchy.events:
+        return
+    admission = client.budget.admit(route, 2) if route is not None else None
+    try:
+        if event_ticker is None:
+            store.apply([await client.get_market(market_ticker)])
+            event_ticker = hierarchy.event_of(market_ticker)
+        if event_ticker is not None and event_ticker not in hierarchy.events:
+            hierarchy.apply_events([await client.get_event(event_ticker)])
+    finally:
+        if admission is not None:
+            client.budget.release(admission)
+
+def correlation_universe(current: List[str]) -> List[str]:
+    """The most traded open markets; tracked ones keep their slot while they rank within twice the limit"""
+    if CORRELATION_MARKETS:
+        return CORRELATION_MARKETS
+    markets, _ = market_store.query(
+        status=MarketStatus.OPEN, sort_by="volume", descending=True, limit=CORRELATION_MAX_MARKETS * 2
+    )
+    ranked = [market.ticker for market in markets]
+    tracked = set(current)
+    # Dropping a market throws away its window, so incumbents go first
+    kept = [ticker for ticker in ranked if ticker in tracked]
+    added = [ticker for ticker in ranked[:CORRELATION_MAX_MARKETS] if ticker not in tracked]
+    return (kept + added)[:CORRELATION_MAX_MARKETS]
+
+def price_sample(market_ticker: str, max_age_seconds: float) -> Tuple[Optional[float], str]:
+    """Mid of a recently fetched book, else the synced last price, with which one it was"""
+    book = kalshi_client.orderbooks.get(market_ticker) if kalshi_client is not None else None
+    if book is not None and time.time() * 1000 - book.timestamp < max_age_seconds * 1000:
+        best_bid, best_ask = book.best("yes_bids"), book.best("yes_asks")
+        if not math.isnan(best_bid) and not math.isnan(best_ask):
+            return (best_bid + best_ask) / 2, "book"
+    market = market_store.markets.get(market_ticker) if market_store is not None else None
+    return (market.last_price if market is not None else None), "last"
+
+def latest_price(market_ticker: str, max_age_seconds: float = CORRELATION_INTERVAL_SECONDS) -> Optional[float]:
+    """Mid of a recently fetched book, else the synced last price; never calls upstream"""
+    return price_sample(market_ticker, max_age_seconds)[0]
+
+async def correlation_loop():
+    """Sample tracked market prices into the rolling correlation once per interval"""
+    ranked_at = None
+    while True:
+        try:
+            # Re-rank only when the universe has been synced, so tracked markets keep their history
+            if ranked_at is None or market_store.last_sync != ranked_at:
+                correlation_tracker.track(correlation_universe(correlation_tracker.tickers))
+                ranked_at = market_store.last_sync
+            samples = {ticker: price_sample(ticker, CORRELATION_INTERVAL_SECONDS) for ticker in correlation_tracker.slots}
+            correlation_tracker.observe(
+                {ticker: price for ticker, (price, _) in samples.items()},
+                time.time(),
+                sources={ticker: source for ticker, (_, source) in samples.items()}
+            )
+        except Exception as e:
+            logger.warning(f"Correlation sample failed: {e}")
+        await asyncio.sleep(CORRELATION_INTERVAL_SECONDS)
+
+def refresh_calls_per_minute() -> float:
+    """Calls per minute the refresher may spend, shrinking as interactive traffic eats the budget"""
+    budget = kalshi_client.budget
+    limit = budget.rate_limiter.requests_per_minute
+    calls = limit * REFRESH_BUDGET_FRACTION
+    headroom = budget.remaining() / limit if limit else 0.0
+    if headroom < budget.degrade_fraction:
+        calls *= headroom / budget.degrade_fraction
+    return calls
+
+def refresh_universe() -> List[str]:
+    """The most traded open markets plus everything the correlation tracker follows"""
+    markets, _ = market_store.query(
+        status=MarketStatus.OPEN, sort_by="volume", descending=True, limit=REFRESH_MAX_MARKETS
+    )
+    tickers = [market.ticker for market in markets]
+    seen = set(tickers)
+    tickers.extend(ticker for ticker in correlation_tracker.tickers if ticker not in seen)
+    return tickers
+
+def record_metrics(analytics_data: MarketAnalytics, book: Optional[CompactOrderBook] = None):
+    """Copy freshly computed analytics into the screener's metrics table"""
+    if metrics_table is None:
+        return
+    if book is not None:
+        metrics_table.update_book(book, analytics_data.liquidity_score)
+    metrics_table.update(
+        analytics_data.market_ticker,
+        liquidity_score=analytics_data.liquidity_score,
+        volatility=analytics_data.volatility,
+        momentum=analytics_data.momentum,
+        risk_score=analytics_data.risk_score
+    )
+
+async def refresh_market(market_ticker: str):
+    """Refetch one order book and feed what changed back into its schedule and the screener"""
+    try:
+        with scheduler.priority(Priority.BACKGROUND):
+            orderbook = await kalshi_client.get_market_orderbook(market_ticker)
+        book = kalshi_client.orderbooks[market_ticker]
+        buffer = kalshi_client.trade_buffers.get(market_ticker)
+        market = market_store.markets.get(market_ticker)
+
+        # Only the metrics whose inputs are already cached; trades are not fetched here
+        fields = {"liquidity_score"}
+        if buffer is not None:
+            fields |= {"volatility", "momentum"} | ({"risk_score"} if market is not None else set())
+        analytics_data = await analytics_engine.calculate_market_analytics(
+            market, orderbook, buffer.columns() if buffer is not None else None,
+            market_ticker=market_ticker, fields=fields, changes=book.changes
+        )
+        refresh_scheduler.record(
+            market_ticker,
+            changed=book.changes is None or not book.changes.empty,
+            liquidity=analytics_data.liquidity_score,
+            volatility=analytics_data.volatility
+        )
+        record_metrics(analytics_data, book)
+    except Exception as e:
+        logger.debug(f"Refresh of {market_ticker} failed: {e}")
+        refresh_scheduler.record_failure(market_ticker)
+
+def time_risks(tickers: List[str]) -> Dict[str, float]:
+    """Expiry risk per tracked market; a market whose risk cannot be computed is left at the default"""
+    risks = {}
+    for ticker in tickers:
+        market = market_store.markets.get(ticker)
+        if market is None:
+            continue
+        try:
+            risks[ticker] = analytics_engine._calculate_time_risk(market)
+        except Exception as e:
+            logger.debug(f"Time risk failed for {ticker}: {e}")
+    return risks
+
+async def refresh_loop():
+    """Poll tracked markets' order books, each on its own adaptive interval"""
+    rebalanced = 0.0
+    while True:
+        delay = REFRESH_REBALANCE_SECONDS
+        try:
+            now = time.time()
+            if now - rebalanced >= REFRESH_REBALANCE_SECONDS:
+                tickers = refresh_universe()
+                refresh_scheduler.track(tickers, time_risks(tickers))
+                refresh_scheduler.rebalance(refresh_calls_per_minute())
+                rebalanced = now
+
+            due = refresh_scheduler.due(now, limit=kalshi_client.scheduler.max_in_flight)
+            if due:
+                await asyncio.gather(*(refresh_market(ticker) for ticker in due))
+                delay = 0.0
+            else:
+                next_due = refresh_scheduler.next_due()
+                if next_due is not None:
+                    delay = min(delay, next_due - now)
+        except Exception as e:
+            logger.warning(f"Order book refresh failed: {e}")
+        await asyncio.sleep(max(delay, 0.05))
+
+async def save_snapshot():
+    """Capture the caches on the loop, then encode and write them off it"""
+    data = snapshot.capture(market_store, kalshi_client, analytics_engine)
+    size = await asyncio.to_thread(snapshot.write, SNAPSHOT_PATH, data)
+    logger.info(f"Saved snapshot to {SNAPSHOT_PATH}: {len(data.market_records)} markets, {size / 1024:.0f} KB")
+
+async def snapshot_loop():
+    """Persist the caches periodically so a crash still leaves a recent snapshot"""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            await save_snapshot()
+        except Exception as e:
+            logger.warning(f"Snapshot save failed: {e}")
+
+async def load_snapshot() -> bool:
+    """Warm the caches from the last snapshot; returns whether anything was restored"""
+    try:
+        data = await asyncio.to_thread(snapshot.read, SNAPSHOT_PATH)
+        if data is None:
+            return False
+        if data.age_seconds > SNAPSHOT_MAX_AGE_SECONDS:
+            logger.info(
+                f"Ignoring snapshot {SNAPSHOT_PATH}: {data.age_seconds:.0f}s old, "
+                f"limit {SNAPSHOT_MAX_AGE_SECONDS:.0f}s"
+            )
+            return False
+        snapshot.restore(data, market_store, kalshi_client, analytics_engine)
+        logger.info(
+            f"Warm start from {SNAPSHOT_PATH}: {len(market_store)} markets, "
+            f"{len(data.orderbooks)} order books, {len(data.trades)} trade buffers, "
+            f"{data.age_seconds:.0f}s old"
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to load snapshot {SNAPSHOT_PATH}: {e}")
+        return False
+
+async def revalidate_snapshot():
+    """Refresh state restored from a snapshot without holding up startup"""
+    try:
+        with scheduler.priority(Priority.BACKGROUND):
+            await analytics_engine.refresh_dashboard_stats(kalshi_client)
+    except Exception as e:
+        logger.warning(f"Snapshot revalidation failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global kalshi_client, analytics_engine
+    global kalshi_client, analytics_engine, market_store, search_index, stream_hub, correlation_tracker
+    global simulation_pool, refresh_scheduler, metrics_table, response_cache, market_recorder
     
     # Initialize Kalshi client
     kalshi_client = KalshiClient(
         base_url=os.getenv("KALSHI_BASE_URL"),
-        api_key=os.getenv("KALSHI_API_KEY")
+        api_key=os.getenv("KALSHI_API_KEY"),
+        budget_degrade_fraction=UPSTREAM_BUDGET_DEGRADE_FRACTION,
+        budget_reject_fraction=UPSTREAM_BUDGET_REJECT_FRACTION,
+        # The book poller's share is set aside so it does not push requests into degraded modes
+        budget_background_fraction=REFRESH_BUDGET_FRACTION if REFRESH_MAX_MARKETS > 0 else 0.0
     )
     
     # Initialize analytics engine
     analytics_engine = AnalyticsEngine()
     
+    # Initialize the local market universe
+    market_store = MarketStore()
+    search_index = MarketSearchIndex()
+    market_store.add_listener(search_index.update)
+    metrics_table = MetricsTable()
+    market_store.add_listener(metrics_table.update_markets)
+    market_store.add_listener(kalshi_client.drop_orderbooks)
+    analytics_engine.hierarchy = market_store.hierarchy
+    
+    # Initialize push streaming
+    stream_hub = StreamHub(refresh_interval=STREAM_REFRESH_SECONDS)
+    
+    # Initialize cross-market correlation
+    correlation_tracker = RollingCorrelation(
+        window=CORRELATION_WINDOW, interval_seconds=CORRELATION_INTERVAL_SECONDS
+    )
+    if SIMULATION_WORKERS > 1:
+        simulation_pool = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS)
+    
+    # Initialize stale-while-revalidate serving
+    response_cache = StaleWhileRevalidate(
+        fresh_seconds=SWR_FRESH_SECONDS,
+        stale_seconds=SWR_STALE_SECONDS,
+        max_stale_seconds=SWR_MAX_STALE_SECONDS,
+        wait_seconds=SWR_WAIT_SECONDS,
+        background=background_refresh
+    )
+    
+    # Initialize adaptive order book refresh
+    refresh_scheduler = RefreshScheduler()
+    
+    # Record every new book and trade the client parses
+    if RECORDER_PATH:
+        market_recorder = MarketRecorder(
+            RECORDER_PATH,
+            flush_seconds=RECORDER_FLUSH_SECONDS,
+            max_pending=RECORDER_MAX_PENDING,
+            retention_hours=RECORDER_RETENTION_HOURS
+        )
+        kalshi_client.recorder = market_recorder
+    
     # Try to authenticate with Kalshi (make it optional for development)
     try:
         await kalshi_client.authenticate()
@@ -44,10 +426,57 @@ async def lifespan(app: FastAPI):
         logger.warning(f"Failed to authenticate with Kalshi API: {e}")
         logger.info("Continuing without authentication for development")
     
+    # Serve from the last snapshot straight away; the sync loop revalidates the universe
+    background_tasks = []
+    if SNAPSHOT_PATH:
+        if await load_snapshot():
+            background_tasks.append(asyncio.create_task(revalidate_snapshot()))
+        background_tasks.append(asyncio.create_task(snapshot_loop()))
+    
+    sync_task = asyncio.create_task(market_sync_loop())
+    background_tasks.append(asyncio.create_task(correlation_loop()))
+    background_tasks.append(asyncio.create_task(hierarchy_loop()))
+    if REFRESH_MAX_MARKETS > 0:
+        background_tasks.append(asyncio.create_task(refresh_loop()))
+    # The recorder stops through close() so an in-flight write is never abandoned
+    recorder_task = asyncio.create_task(market_recorder.run()) if market_recorder is not None else None
+    
+    # Serve the same data over gRPC when grpcio is installed
+    grpc_server = None
+    if GRPC_PORT > 0:
+        try:
+            from grpc_server import DataServicer, start_server
+            grpc_server = await start_server(
+                DataServicer(kalshi_client, analytics_engine, market_store, stream_hub,
+                             build_market_analytics, build_arbitrage, stream_producer),
+                GRPC_PORT
+            )
+        except ImportError as e:
+            logger.warning(f"gRPC server disabled: {e}")
+    
     yield
     
     # Cleanup
+    if grpc_server is not None:
+        await grpc_server.stop(5)
+    sync_task.cancel()
+    for task in background_tasks:
+        task.cancel()
+    if SNAPSHOT_PATH:
+        try:
+            await save_snapshot()
+        except Exception as e:
+            logger.warning(f"Snapshot save on shutdown failed: {e}")
+    if market_recorder is not None:
+        try:
+            await market_recorder.close()
+            await recorder_task
+        except Exception as e:
+            logger.warning(f"Recorder flush on shutdown failed: {e}")
+    await stream_hub.close()
     await kalshi_client.close()
+    if simulation_pool is not None:
+        simulation_pool.shutdown(cancel_futures=True)
 
 app = FastAPI(
     title="Kalshi Analytics API",
@@ -65,6 +494,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Opt-in per-request profiling via ?profile=1 or an X-Profile: 1 header.
+
+    Adds a Server-Timing header with the phase breakdown and, for JSON
+    responses, a "_profile" key with phases and the top Python hotspots.
+    """
+    flag = request.query_params.get(profiling.PROFILE_QUERY_PARAM) or request.headers.get(profiling.PROFILE_HEADER)
+    if flag not in ("1", "true"):
+        return await call_next(request)
+
+    profile, token = profiling.start_request_profile()
+    try:
+        response = await call_next(request)
+        if response.headers.get("content-type", "").startswith("application/json"):
+            with profiling.phase("response_body"):
+                body = b"".join([chunk async for chunk in response.body_iterator])
+        else:
+            body = None
+    finally:
+        report = profile.finish()
+        profiling.end_request_profile(token)
+
+    headers = {
+        key: value for key, value in response.headers.items()
+        if key not in ("content-length", "content-type")
+    }
+    headers["Server-Timing"] = profile.server_timing()
+    if body is None:
+        response.headers["Server-Timing"] = headers["Server-Timing"]
+        return response
+
+    payload = json.loads(body) if body else None
+    payload = {**payload, "_profile": report} if isinstance(payload, dict) else {"data": payload, "_profile": report}
+    return Response(
+        content=json.dumps(payload, default=str),
+        status_code=response.status_code,
+        headers=headers,
+        media_type="application/json"
+    )
+
 def get_kalshi_client():
     if kalshi_client is None:
         raise HTTPException(status_code=500, detail="Kalshi client not initialized")
@@ -75,6 +545,95 @@ def get_analytics_engine():
         raise HTTPException(status_code=500, detail="Analytics engine not initialized")
     return analytics_engine
 
+def get_market_store():
+    if market_store is None:
+        raise HTTPException(status_code=500, detail="Market store not initialized")
+    return market_store
+
+def get_stream_hub():
+    if stream_hub is None:
+        raise HTTPException(status_code=500, detail="Stream hub not initialized")
+    return stream_hub
+
+def get_search_index():
+    if search_index is None:
+        raise HTTPException(status_code=500, detail="Search index not initialized")
+    return search_index
+
+def get_correlation_tracker():
+    if correlation_tracker is None:
+        raise HTTPException(status_code=500, detail="Correlation tracker not initialized")
+    return correlation_tracker
+
+def get_refresh_scheduler():
+    if refresh_scheduler is None:
+        raise HTTPException(status_code=500, detail="Refresh scheduler not initialized")
+    return refresh_scheduler
+
+def get_metrics_table():
+    if metrics_table is None:
+        raise HTTPException(status_code=500, detail="Metrics table not initialized")
+    return metrics_table
+
+def get_response_cache():
+    if response_cache is None:
+        raise HTTPException(status_code=500, detail="Response cache not initialized")
+    return response_cache
+
+def get_market_recorder():
+    if market_recorder is None:
+        raise HTTPException(status_code=500, detail="Market recorder not enabled")
+    return market_recorder
+
+def budget_exhausted(e: BudgetExhausted) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
+def value_error(e: ValueError) -> HTTPException:
+    """400 for bad request input; pydantic's ValidationError is a ValueError too, but means upstream sent bad data"""
+    if isinstance(e, ValidationError):
+        return HTTPException(status_code=502, detail=f"Upstream returned invalid data: {e}")
+    return HTTPException(status_code=400, detail=str(e))
+
+def upstream_admission(route: str, default_cost: float, degraded_cost: Optional[float] = None):
+    """Dependency that admits a request against the upstream budget and charges its calls to `route`"""
+    async def admit(client: KalshiClient = Depends(get_kalshi_client)):
+        try:
+            admission = client.budget.admit(route, default_cost, degraded_cost)
+        except BudgetExhausted as e:
+            raise budget_exhausted(e)
+        try:
+            yield admission
+        finally:
+            client.budget.release(admission)
+    return admit
+
+async def serve_cached(response: Response, cache: StaleWhileRevalidate, client: KalshiClient,
+                       route: str, key: tuple, default_cost: float, produce,
+                       degraded_cost: Optional[float] = None):
+    """Answer from the stale-while-revalidate cache, admitting only refreshes that go upstream.
+
+    `produce(admission)` builds a new result; its calls are charged to `route`
+    whether a request waits on it or it runs in the background. Age and
+    cache status go out as response headers.
+    """
+    async def fetch():
+        admission = client.budget.admit(route, default_cost, degraded_cost)
+        try:
+            return await produce(admission)
+        finally:
+            client.budget.release(admission)
+
+    try:
+        served = await cache.get((route,) + key, fetch)
+    except BudgetExhausted as e:
+        raise budget_exhausted(e)
+    response.headers.update(served.headers())
+    return served.value
+
 @app.get("/")
 async def root():
     return {"message": "Kalshi Analytics API", "status": "running"}
@@ -89,75 +648,716 @@ async def get_markets(
     cursor: str = None,
     event_ticker: str = None,
     series_ticker: str = None,
-    client: KalshiClient = Depends(get_kalshi_client)
+    status: MarketStatus = None,
+    category: str = None,
+    expires_after: datetime = None,
+    expires_before: datetime = None,
+    sort_by: str = None,
+    descending: bool = False,
+    client: KalshiClient = Depends(get_kalshi_client),
+    store: MarketStore = Depends(get_market_store),
+    admission: Admission = Depends(upstream_admission("/markets", 1))
 ):
-    """Get markets from Kalshi API"""
+    """Get markets, answered from the local universe once it has been synced"""
     try:
+        # Local cursors are plain offsets; anything else is an upstream cursor
+        if store.ready and (cursor is None or cursor.isdigit()):
+            offset = int(cursor) if cursor else 0
+            markets, total = store.query(
+                status=status,
+                event_ticker=event_ticker,
+                series_ticker=series_ticker,
+                category=category,
+                expires_after=expires_after,
+                expires_before=expires_before,
+                sort_by=sort_by,
+                descending=descending,
+                offset=offset,
+                limit=limit
+            )
+            next_cursor = str(offset + limit) if offset + limit < total else None
+            return MarketResponse(markets=markets, cursor=next_cursor, count=total)
+
         markets = await client.get_markets(
             limit=limit,
             cursor=cursor,
             event_ticker=event_ticker,
-            series_ticker=series_ticker
+            series_ticker=series_ticker,
+            status=status
+        )
+        store.apply(markets)
+        return MarketResponse(markets=markets, count=len(markets))
+    except ValueError as e:
+        raise value_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/markets/changes", response_model=MarketChangesResponse)
+async def get_market_changes(
+    since: int = 0,
+    store: MarketStore = Depends(get_market_store)
+):
+    """Get markets added, modified or removed after the given store version"""
+    try:
+        return MarketChangesResponse(**store.changes_since(since))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/markets/search", response_model=MarketSearchResponse)
+async def search_markets(
+    q: str,
+    limit: int = 20,
+    status: MarketStatus = None,
+    store: MarketStore = Depends(get_market_store),
+    index: MarketSearchIndex = Depends(get_search_index)
+):
+    """Full-text search over market titles and subtitles in the local universe"""
+    try:
+        results = [
+            MarketSearchResult(market=store.markets[ticker], score=score)
+            for ticker, score in index.search(q, limit=limit, status=status)
+            if ticker in store.markets
+        ]
+        return MarketSearchResponse(query=q, results=results, count=len(results))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def export_response(batches, schema, export_format: ExportFormat, name: str) -> StreamingResponse:
+    """Stream record batches in the requested columnar format"""
+    chunks = export.encode_stream(batches, schema, export_format)
+    return StreamingResponse(
+        export.guarded(chunks, name),
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{export.FILE_EXTENSIONS[export_format]}"'
+        }
+    )
+
+@app.get("/export/markets")
+async def export_markets(
+    format: ExportFormat = ExportFormat.ARROW,
+    status: MarketStatus = None,
+    client: KalshiClient = Depends(get_kalshi_client),
+    store: MarketStore = Depends(get_market_store),
+    admission: Admission = Depends(upstream_admission("/export/markets", 1))
+):
+    """Export a snapshot of the market universe as Arrow IPC or Parquet"""
+    try:
+        if store.ready:
+            markets, _ = store.query(status=status, limit=len(store.markets))
+        else:
+            with scheduler.priority(Priority.BULK):
+                markets = await client.get_all_markets()
+            store.apply(markets, complete=True)
+            if status is not None:
+                markets = [market for market in markets if market.status == status]
+        return export_response(export.market_batches(markets), export.MARKET_SCHEMA, format, "markets")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/export/markets/{market_ticker}/trades")
+async def export_market_trades(
+    market_ticker: str,
+    format: ExportFormat = ExportFormat.ARROW,
+    min_ts: int = None,
+    max_ts: int = None,
+    client: KalshiClient = Depends(get_kalshi_client),
+    admission: Admission = Depends(upstream_admission("/export/markets/{market_ticker}/trades", 10))
+):
+    """Stream a market's trade history page by page as Arrow IPC or Parquet"""
+    try:
+        pages = client.iter_trade_pages(market_ticker, min_ts=min_ts, max_ts=max_ts)
+        return export_response(
+            export.trade_batches(pages), export.TRADE_SCHEMA, format, f"{market_ticker}-trades"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/export/markets/{market_ticker}/candles")
+async def export_market_candles(
+    market_ticker: str,
+    start_ts: int,
+    series_ticker: str = None,
+    end_ts: int = None,
+    period_interval: int = 1,
+    period_unit: str = "h",
+    format: ExportFormat = ExportFormat.ARROW,
+    client: KalshiClient = Depends(get_kalshi_client),
+    store: MarketStore = Depends(get_market_store),
+    admission: Admission = Depends(upstream_admission("/export/markets/{market_ticker}/candles", 5))
+):
+    """Stream candlesticks over a long range window by window as Arrow IPC or Parquet.
+
+    `series_ticker` defaults to the market's series from the local hierarchy.
+    """
+    try:
+        if not series_ticker:
+            await resolve_hierarchy(client, store, market_ticker)
+            series_ticker = store.hierarchy.series_of(market_ticker)
+            if not series_ticker:
+                raise ValueError(f"Series of {market_ticker} is unknown; pass series_ticker")
+        windows = client.iter_candlestick_windows(
+            series_ticker, market_ticker,
+            start_ts=start_ts,
+            end_ts=end_ts or int(time.time()),
+            period_interval=period_interval,
+            period_unit=period_unit
+        )
+        return export_response(
+            export.candle_batches(windows), export.CANDLE_SCHEMA, format, f"{market_ticker}-candles"
+        )
+    except ValueError as e:
+        raise value_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/screener", response_model=ScreenerResponse)
+async def screen_markets(
+    where: str = None,
+    sort: str = None,
+    columns: str = None,
+    limit: int = 50,
+    table: MetricsTable = Depends(get_metrics_table)
+):
+    """Filter and rank markets on their latest computed metrics, without upstream calls.
+
+    e.g. `where=status = open and spread < 2c and liquidity_score > 0.6 and risk_score < 0.3`
+    with `sort=-liquidity_score,spread`.
+    """
+    try:
+        with profiling.phase("compute"):
+            rows, count = table.screen(
+                where=where,
+                sort=sort,
+                columns=[column.strip() for column in columns.split(",") if column.strip()] if columns else None,
+                limit=limit
+            )
+        return ScreenerResponse(rows=rows, count=count, total=len(table))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/markets/{market_ticker}/hierarchy", response_model=MarketHierarchyResponse)
+async def get_market_hierarchy(
+    market_ticker: str,
+    client: KalshiClient = Depends(get_kalshi_client),
+    store: MarketStore = Depends(get_market_store)
+):
+    """A market's event, with its sibling markets, and series; local unless the market is new"""
+    try:
+        await resolve_hierarchy(client, store, market_ticker, "/markets/{market_ticker}/hierarchy")
+        hierarchy = store.hierarchy
+        event_ticker = hierarchy.event_of(market_ticker)
+        series_ticker = hierarchy.series_of(market_ticker)
+        return MarketHierarchyResponse(
+            market_ticker=market_ticker,
+            event=hierarchy.event_node(event_ticker) if event_ticker else None,
+            series=hierarchy.series_node(series_ticker) if series_ticker else None
         )
-        return MarketResponse(markets=markets)
+    except BudgetExhausted as e:
+        raise budget_exhausted(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/series/{series_ticker}/events", response_model=SeriesEventsResponse)
+async def get_series_events(
+    series_ticker: str,
+    store: MarketStore = Depends(get_market_store)
+):
+    """A series' events and their markets, from the local hierarchy"""
+    try:
+        hierarchy = store.hierarchy
+        series = hierarchy.series_node(series_ticker)
+        if series is None:
+            raise HTTPException(status_code=404, detail=f"Series {series_ticker} not found")
+        events = [hierarchy.event_node(ticker) for ticker in sorted(hierarchy.events_of_series(series_ticker))]
+        return SeriesEventsResponse(series=series, events=events, count=len(events))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/markets/{market_ticker}/orderbook", response_model=OrderBookResponse)
 async def get_market_orderbook(
     market_ticker: str,
-    client: KalshiClient = Depends(get_kalshi_client)
+    response: Response,
+    client: KalshiClient = Depends(get_kalshi_client),
+    cache: StaleWhileRevalidate = Depends(get_response_cache)
 ):
     """Get order book for a specific market"""
+    async def produce(admission: Admission) -> OrderBookResponse:
+        return OrderBookResponse(orderbook=await client.get_market_orderbook(market_ticker))
+
+    try:
+        return await serve_cached(
+            response, cache, client, "/markets/{market_ticker}/orderbook", (market_ticker,), 1, produce
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/markets/{market_ticker}/depth", response_model=DepthResponse)
+async def get_market_depth(
+    market_ticker: str,
+    tick: float = 0.01,
+    side: str = "yes",
+    max_age_seconds: float = 2.0,
+    client: KalshiClient = Depends(get_kalshi_client),
+    admission: Admission = Depends(upstream_admission("/markets/{market_ticker}/depth", 1))
+):
+    """Cumulative bid/ask depth binned to `tick`, reusing a book fetched within `max_age_seconds`"""
+    if not 0 < tick <= 1:
+        raise HTTPException(status_code=400, detail="tick must be in (0, 1]")
+    if side not in ("yes", "no"):
+        raise HTTPException(status_code=400, detail="side must be 'yes' or 'no'")
+
     try:
-        orderbook = await client.get_market_orderbook(market_ticker)
-        return OrderBookResponse(orderbook=orderbook)
+        book = client.orderbooks.get(market_ticker)
+        if book is None or time.time() * 1000 - book.timestamp > max_age_seconds * 1000:
+            await client.get_market_orderbook(market_ticker)
+            book = client.orderbooks[market_ticker]
+        with profiling.phase("compute"):
+            return DepthResponse(depth=depth_cache.get(book, tick, side))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/markets/{market_ticker}/analytics", response_model=AnalyticsResponse)
+async def build_orderbook(client: KalshiClient, market_ticker: str, max_age_seconds: float) -> OrderBookResponse:
+    """Order book, reusing the client's copy when another path fetched it recently"""
+    book = client.orderbooks.get(market_ticker)
+    if book is not None and time.time() * 1000 - book.timestamp <= max_age_seconds * 1000:
+        return OrderBookResponse(orderbook=book.to_model())
+    return OrderBookResponse(orderbook=await client.get_market_orderbook(market_ticker))
+
+async def build_market_analytics(client: KalshiClient, analytics: AnalyticsEngine,
+                                 request: AnalyticsRequest,
+                                 store: MarketStore = None) -> AnalyticsResponse:
+    """Fetch only the inputs the requested fields need, concurrently, and compute them"""
+    market_ticker = request.market_ticker
+    fields, inputs = analytics.plan(request)
+
+    # The synced universe already holds the listing, saving an upstream call
+    market = store.markets.get(market_ticker) if store is not None and "market" in inputs else None
+
+    fetches = {}
+    if "market" in inputs and market is None:
+        fetches["market"] = client.get_market(market_ticker)
+    if "orderbook" in inputs:
+        fetches["orderbook"] = client.get_market_orderbook(market_ticker)
+    if "trades" in inputs:
+        fetches["trades"] = client.get_market_trade_columns(market_ticker)
+
+    results = dict(zip(fetches, await asyncio.gather(*fetches.values())))
+
+    # The client's compact copy of the book carries its diff against the last poll
+    orderbook = results.get("orderbook")
+    book = client.orderbooks.get(market_ticker)
+    if orderbook is None or book is None or book.fingerprint != orderbook.fingerprint:
+        book = None
+    changes = book.changes if book is not None else None
+
+    # Calculate analytics
+    analytics_data = await analytics.calculate_market_analytics(
+        results.get("market", market),
+        orderbook,
+        results.get("trades"),
+        market_ticker=market_ticker,
+        fields=fields,
+        changes=changes
+    )
+    record_metrics(analytics_data, book)
+    
+    return AnalyticsResponse(analytics=analytics_data)
+
+async def build_arbitrage(client: KalshiClient, analytics: AnalyticsEngine,
+                          store: MarketStore) -> ArbitrageResponse:
+    """Collect pairwise, event basket and complement arbitrage opportunities"""
+    opportunities = await analytics.find_arbitrage_opportunities(client)
+    # A crossed book is only an edge while it is current
+    cutoff = time.time() * 1000 - ARBITRAGE_BOOK_MAX_AGE_SECONDS * 1000
+    orderbooks = {ticker: book for ticker, book in client.orderbooks.items() if book.timestamp >= cutoff}
+    event_opportunities = analytics.find_event_arbitrage(
+        list(store.markets.values()),
+        orderbooks,
+        store.hierarchy.exclusive_events(),
+        store.hierarchy.event_titles()
+    )
+    complement_opportunities = analytics.find_complement_arbitrage(orderbooks, store.markets)
+    return ArbitrageResponse(
+        opportunities=opportunities,
+        event_opportunities=event_opportunities,
+        complement_opportunities=complement_opportunities,
+        count=len(opportunities) + len(event_opportunities) + len(complement_opportunities)
+    )
+
+@app.get(
+    "/markets/{market_ticker}/analytics",
+    response_model=AnalyticsResponse,
+    response_model_exclude_none=True
+)
 async def get_market_analytics(
     market_ticker: str,
+    response: Response,
+    fields: str = None,
+    include_orderbook: bool = True,
+    include_trades: bool = True,
     client: KalshiClient = Depends(get_kalshi_client),
-    analytics: AnalyticsEngine = Depends(get_analytics_engine)
+    analytics: AnalyticsEngine = Depends(get_analytics_engine),
+    store: MarketStore = Depends(get_market_store),
+    cache: StaleWhileRevalidate = Depends(get_response_cache)
+):
+    """Get analytics for a specific market; `fields` is a comma-separated subset"""
+    try:
+        request = AnalyticsRequest(
+            market_ticker=market_ticker,
+            include_orderbook=include_orderbook,
+            include_trades=include_trades,
+            fields=sorted({field.strip() for field in fields.split(",") if field.strip()}) if fields else None
+        )
+        # Reject unknown fields before they reach (and occupy) the cache
+        analytics.plan(request)
+        return await serve_cached(
+            response, cache, client, "/markets/{market_ticker}/analytics",
+            (market_ticker, tuple(request.fields or ()), include_orderbook, include_trades), 3,
+            lambda admission: build_market_analytics(client, analytics, request, store)
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise value_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/correlation", response_model=CorrelationResponse)
+async def get_correlation(
+    series_ticker: str = None,
+    event_ticker: str = None,
+    tickers: str = None,
+    min_periods: int = 10,
+    include_covariance: bool = False,
+    tracker: RollingCorrelation = Depends(get_correlation_tracker),
+    store: MarketStore = Depends(get_market_store)
 ):
-    """Get analytics for a specific market"""
+    """Rolling return correlation across tracked markets, narrowed by series, event or a ticker list"""
     try:
-        # Get market data
-        market = await client.get_market(market_ticker)
-        orderbook = await client.get_market_orderbook(market_ticker)
-        trades = await client.get_market_trades(market_ticker)
-        
-        # Calculate analytics
-        analytics_data = await analytics.calculate_market_analytics(
-            market, orderbook, trades
+        selected = tracker.tickers
+        if tickers:
+            wanted = set(tickers.split(","))
+            selected = [ticker for ticker in selected if ticker in wanted]
+        if series_ticker or event_ticker:
+            markets = [store.markets.get(ticker) for ticker in selected]
+            selected = [
+                market.ticker for market in markets
+                if market is not None
+                and (not series_ticker or store.hierarchy.series_of(market.ticker) == series_ticker)
+                and (not event_ticker or market.event_ticker == event_ticker)
+            ]
+
+        with profiling.phase("compute"):
+            correlation, covariance, _ = tracker.matrix(selected, min_periods)
+            return CorrelationResponse(correlation=CorrelationMatrix(
+                tickers=selected,
+                window=tracker.window,
+                interval_seconds=tracker.interval_seconds,
+                observations=tracker.filled,
+                min_periods=min_periods,
+                correlation=to_rows(correlation),
+                covariance=to_rows(covariance, digits=10) if include_covariance else None
+            ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def run_simulation(request: SimulationRequest, tracker: RollingCorrelation) -> SimulationResult:
+    """Price the positions, fit correlation factors and draw settlement scenarios"""
+    if not request.positions:
+        raise ValueError("positions must not be empty")
+    if not 1 <= request.scenarios <= MAX_SIMULATION_SCENARIOS:
+        raise ValueError(f"scenarios must be between 1 and {MAX_SIMULATION_SCENARIOS}")
+    if not 1 <= request.bins <= 1000:
+        raise ValueError("bins must be between 1 and 1000")
+    if not all(0 < level < 1 for level in request.confidence_levels):
+        raise ValueError("confidence_levels must be in (0, 1)")
+
+    probabilities = {}
+    for position in request.positions:
+        if position.side not in ("yes", "no"):
+            raise ValueError(f"side must be 'yes' or 'no' for {position.market_ticker}")
+        price = position.probability
+        if price is None:
+            price = probabilities.get(position.market_ticker)
+        if price is None:
+            price = latest_price(position.market_ticker, SIMULATION_BOOK_MAX_AGE_SECONDS)
+        if price is None or not 0 <= price <= 1:
+            raise ValueError(f"No usable price for {position.market_ticker}; pass a probability")
+        probabilities[position.market_ticker] = price
+
+    portfolio = simulation.Portfolio.from_positions(
+        [
+            (
+                position.market_ticker,
+                position.side,
+                position.quantity,
+                position.entry_price if position.entry_price is not None else (
+                    probabilities[position.market_ticker] if position.side == "yes"
+                    else 1 - probabilities[position.market_ticker]
+                )
+            )
+            for position in request.positions
+        ],
+        probabilities
+    )
+
+    # Markets the correlation tracker follows share latent factors; the rest settle independently
+    tracked = [ticker for ticker in portfolio.tickers if ticker in tracker.slots] if request.correlated else []
+    correlation = tracker.matrix(tracked)[0] if len(tracked) > 1 else None
+    factors = simulation.factor_loadings(correlation)
+    loadings = np.zeros((len(portfolio.tickers), factors.shape[1]))
+    if factors.shape[1]:
+        rows = {ticker: row for row, ticker in enumerate(portfolio.tickers)}
+        loadings[[rows[ticker] for ticker in tracked]] = factors
+
+    started = time.perf_counter()
+    with profiling.phase("simulation"):
+        pnl = await simulation.simulate(
+            portfolio, request.scenarios, loadings, request.seed,
+            executor=simulation_pool, workers=max(SIMULATION_WORKERS, 1)
         )
-        
-        return AnalyticsResponse(analytics=analytics_data)
+        summary = await asyncio.to_thread(
+            simulation.summarize, pnl, portfolio, request.confidence_levels, request.bins
+        )
+
+    return SimulationResult(
+        scenarios=request.scenarios,
+        markets=len(portfolio.tickers),
+        correlated_markets=int(np.any(loadings != 0, axis=1).sum()),
+        factors=loadings.shape[1],
+        probabilities=probabilities,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+        **summary
+    )
+
+@app.post("/portfolio/simulate", response_model=SimulationResponse)
+async def simulate_portfolio(
+    request: SimulationRequest,
+    tracker: RollingCorrelation = Depends(get_correlation_tracker)
+):
+    """Monte Carlo settlement P&L for a set of positions: VaR, expected shortfall and a histogram"""
+    try:
+        return SimulationResponse(simulation=await run_simulation(request, tracker))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/arbitrage", response_model=ArbitrageResponse)
 async def get_arbitrage_opportunities(
+    response: Response,
     client: KalshiClient = Depends(get_kalshi_client),
-    analytics: AnalyticsEngine = Depends(get_analytics_engine)
+    analytics: AnalyticsEngine = Depends(get_analytics_engine),
+    store: MarketStore = Depends(get_market_store),
+    cache: StaleWhileRevalidate = Depends(get_response_cache)
 ):
     """Find arbitrage opportunities"""
     try:
-        opportunities = await analytics.find_arbitrage_opportunities(client)
-        return ArbitrageResponse(opportunities=opportunities)
+        return await serve_cached(
+            response, cache, client, "/arbitrage", (), 1,
+            lambda admission: build_arbitrage(client, analytics, store)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def background_refresh(produce):
+    """Run a stream refresh with its upstream calls at background priority"""
+    async def refresh():
+        with scheduler.priority(Priority.BACKGROUND):
+            return await produce()
+    return refresh
+
+def stream_producer(topic: str):
+    """Map a stream topic name to the computation that feeds it"""
+    if topic == "arbitrage":
+        return background_refresh(lambda: build_arbitrage(kalshi_client, analytics_engine, market_store))
+    if topic.startswith("analytics:") and len(topic) > len("analytics:"):
+        market_ticker = topic[len("analytics:"):]
+        request = AnalyticsRequest(market_ticker=market_ticker)
+        return background_refresh(
+            lambda: build_market_analytics(kalshi_client, analytics_engine, request, market_store)
+        )
+    if topic.startswith("orderbook:") and len(topic) > len("orderbook:"):
+        market_ticker = topic[len("orderbook:"):]
+        return background_refresh(lambda: build_orderbook(kalshi_client, market_ticker, STREAM_REFRESH_SECONDS))
+    raise ValueError(f"Unknown stream topic: {topic}")
+
+async def sse_events(hub: StreamHub, topic: str):
+    """Server-Sent Events for one subscriber; coalesces while the client is slow"""
+    subscription = hub.subscribe(topic, stream_producer(topic))
+    try:
+        while True:
+            payload = await subscription.next(timeout=STREAM_KEEPALIVE_SECONDS)
+            if payload is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {subscription.sequence}\nevent: update\ndata: {payload}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
+
+@app.get("/stream/markets/{market_ticker}/analytics")
+async def stream_market_analytics(
+    market_ticker: str,
+    hub: StreamHub = Depends(get_stream_hub)
+):
+    """Push analytics for a market as Server-Sent Events"""
+    return StreamingResponse(
+        sse_events(hub, f"analytics:{market_ticker}"),
+        media_type="text/event-stream"
+    )
+
+@app.get("/stream/arbitrage")
+async def stream_arbitrage(hub: StreamHub = Depends(get_stream_hub)):
+    """Push arbitrage opportunities as Server-Sent Events"""
+    return StreamingResponse(sse_events(hub, "arbitrage"), media_type="text/event-stream")
+
+@app.get("/stream/stats")
+async def get_stream_stats(hub: StreamHub = Depends(get_stream_hub)):
+    """Subscribers, refresh counts and coalesced updates per topic"""
+    return hub.stats()
+
+@app.websocket("/ws")
+async def websocket_stream(websocket: WebSocket):
+    """Multiplexed push over one socket.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "topic": "arbitrage" | "analytics:<ticker>"}
+    and receive {"topic", "sequence", "data"} messages.
+    """
+    await websocket.accept()
+    hub = get_stream_hub()
+    subscriptions = {}
+    pumps = {}
+    send_lock = asyncio.Lock()
+
+    async def pump(subscription: Subscription):
+        while True:
+            payload = await subscription.next()
+            # One send at a time; a slow socket just lets values coalesce
+            async with send_lock:
+                # The payload is already JSON, so splice it in rather than re-encoding
+                await websocket.send_text(
+                    f'{{"topic": {json.dumps(subscription.topic)}, '
+                    f'"sequence": {subscription.sequence}, "data": {payload}}}'
+                )
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            # A malformed frame gets an error reply; it must not close the other subscriptions
+            try:
+                message = json.loads(frame.get("text") or frame.get("bytes") or "")
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                async with send_lock:
+                    await websocket.send_json({"error": f"Invalid JSON: {e}"})
+                continue
+            if not isinstance(message, dict) or not isinstance(message.get("topic", ""), str):
+                async with send_lock:
+                    await websocket.send_json({"error": "Expected a JSON object with a string topic"})
+                continue
+            action = message.get("action")
+            topic = message.get("topic", "")
+
+            if action == "subscribe" and topic not in subscriptions:
+                try:
+                    subscription = hub.subscribe(topic, stream_producer(topic))
+                except ValueError as e:
+                    async with send_lock:
+                        await websocket.send_json({"topic": topic, "error": str(e)})
+                    continue
+                subscriptions[topic] = subscription
+                pumps[topic] = asyncio.create_task(pump(subscription))
+            elif action == "unsubscribe" and topic in subscriptions:
+                pumps.pop(topic).cancel()
+                hub.unsubscribe(subscriptions.pop(topic))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pumps.values():
+            task.cancel()
+        for subscription in subscriptions.values():
+            hub.unsubscribe(subscription)
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+async def sample_profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """Sample every thread's stack for N seconds and return collapsed stacks for a flame graph"""
+    if not 0 < seconds <= 120:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 120")
+    if sampling_profiler.running:
+        raise HTTPException(status_code=409, detail="A sampling profile is already running")
+    try:
+        result = await asyncio.to_thread(sampling_profiler.sample, seconds, max(interval_ms, 1.0) / 1000)
+        return PlainTextResponse(
+            result["collapsed"],
+            headers={"X-Profile-Samples": str(result["samples"]), "X-Profile-Interval-Ms": str(result["interval_ms"])}
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/budget")
+async def get_upstream_budget(client: KalshiClient = Depends(get_kalshi_client)):
+    """Upstream budget remaining this minute and per-route call accounting"""
+    return client.budget.stats()
+
+@app.get("/admin/scheduler")
+async def get_scheduler_stats(client: KalshiClient = Depends(get_kalshi_client)):
+    """Upstream queue depth, in-flight calls and wait times per priority class"""
+    return client.scheduler.stats()
+
+@app.get("/admin/cache")
+async def get_cache_stats(cache: StaleWhileRevalidate = Depends(get_response_cache)):
+    """Stale-while-revalidate cache: entries, how responses were served, refresh failures"""
+    return cache.stats()
+
+@app.get("/admin/recorder")
+async def get_recorder_stats(recorder: MarketRecorder = Depends(get_market_recorder)):
+    """Market data recorder: records queued, written and dropped, compression, and time spent recording"""
+    return recorder.stats()
+
+@app.get("/admin/hierarchy")
+async def get_hierarchy_stats(store: MarketStore = Depends(get_market_store)):
+    """Series/event hierarchy: node counts, markets without a known series, records still missing"""
+    return store.hierarchy.stats()
+
+@app.get("/admin/refresh")
+async def get_refresh_schedule(limit: int = 100, refresh: RefreshScheduler = Depends(get_refresh_scheduler)):
+    """Adaptive order book refresh: budget, and per-market intervals and signals, most frequent first"""
+    return refresh.stats(limit)
+
 @app.get("/dashboard/stats", response_model=DashboardStatsResponse)
 async def get_dashboard_stats(
+    response: Response,
     client: KalshiClient = Depends(get_kalshi_client),
-    analytics: AnalyticsEngine = Depends(get_analytics_engine)
+    analytics: AnalyticsEngine = Depends(get_analytics_engine),
+    cache: StaleWhileRevalidate = Depends(get_response_cache)
 ):
     """Get dashboard statistics"""
-    try:
-        stats = await analytics.get_dashboard_stats(client)
+    async def produce(admission: Admission) -> DashboardStatsResponse:
+        stats = await analytics.get_cached_dashboard_stats(client, admission.mode)
+        if stats is None:
+            raise HTTPException(status_code=429, detail="Upstream budget exhausted and no cached dashboard stats")
         return DashboardStatsResponse(stats=stats)
+
+    try:
+        # A degraded run samples DEGRADED_LIQUIDITY_SAMPLE order books instead of LIQUIDITY_SAMPLE
+        return await serve_cached(
+            response, cache, client, "/dashboard/stats", (), 53, produce,
+            degraded_cost=53 - LIQUIDITY_SAMPLE + DEGRADED_LIQUIDITY_SAMPLE
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
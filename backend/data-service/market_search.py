@@ -0,0 +1,169 @@
+import bisect
+import heapq
+import math
+import re
+from typing import Optional, List, Dict, Tuple
+
+from models import KalshiMarket, MarketStatus
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "at", "be", "by", "for", "in", "is",
+    "of", "on", "or", "the", "to", "will", "with"
+})
+
+# Relative weight of a token match in each indexed field
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "subtitle": 1.5,
+    "yes_sub_title": 1.0
+}
+
+# Score multiplier for a prefix (rather than exact) token match
+PREFIX_DISCOUNT = 0.6
+
+# Cap on vocabulary terms a single prefix may expand to
+MAX_PREFIX_EXPANSIONS = 200
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase alphanumeric tokens without stop words"""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+class MarketSearchIndex:
+    """In-memory inverted index over market titles and subtitles"""
+
+    def __init__(self):
+        # token -> ticker -> summed field weight
+        self.postings: Dict[str, Dict[str, float]] = {}
+        # Sorted vocabulary for prefix lookups
+        self.vocabulary: List[str] = []
+        # ticker -> (indexed text, weighted tokens) so unchanged markets are skipped
+        self.documents: Dict[str, Tuple[Tuple[Optional[str], ...], Dict[str, float]]] = {}
+        # Non-text attributes used for filtering and tie-breaks
+        self.status: Dict[str, MarketStatus] = {}
+        self.volume: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def update(self, markets: List[KalshiMarket], removed: List[str] = ()):
+        """Incrementally index changed markets and drop removed ones"""
+        for market in markets:
+            self.status[market.ticker] = market.status
+            self.volume[market.ticker] = market.volume or 0
+
+            text = tuple(getattr(market, field) for field in FIELD_WEIGHTS)
+            existing = self.documents.get(market.ticker)
+            if existing is not None and existing[0] == text:
+                continue
+
+            if existing is not None:
+                self._remove_postings(market.ticker, existing[1])
+
+            weights: Dict[str, float] = {}
+            for field, value in zip(FIELD_WEIGHTS, text):
+                for token in tokenize(value):
+                    weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+
+            for token, weight in weights.items():
+                postings = self.postings.get(token)
+                if postings is None:
+                    postings = self.postings[token] = {}
+                    bisect.insort(self.vocabulary, token)
+                postings[market.ticker] = weight
+
+            self.documents[market.ticker] = (text, weights)
+
+        for ticker in removed:
+            existing = self.documents.pop(ticker, None)
+            if existing is not None:
+                self._remove_postings(ticker, existing[1])
+            self.status.pop(ticker, None)
+            self.volume.pop(ticker, None)
+
+    def search(self, query: str, limit: int = 20,
+               status: Optional[MarketStatus] = None,
+               prefix: bool = True) -> List[Tuple[str, float]]:
+        """Rank markets matching every query token.
+
+        The last token also matches as a prefix so results update while the
+        user is typing. Returns (ticker, score) pairs, best first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        document_count = max(len(self.documents), 1)
+
+        # (postings, idf-weighted multiplier) choices per query token
+        expansions = []
+        for position, token in enumerate(tokens):
+            terms = [
+                (self.postings[term], discount * math.log(1 + document_count / len(self.postings[term])))
+                for term, discount in self._expand(token, prefix and position == len(tokens) - 1)
+            ]
+            if not terms:
+                return []
+            expansions.append(terms)
+
+        # Start from the rarest token and only probe surviving candidates for the rest
+        expansions.sort(key=lambda terms: sum(len(postings) for postings, _ in terms))
+
+        scores: Dict[str, float] = {}
+        for postings, multiplier in expansions[0]:
+            for ticker, weight in postings.items():
+                score = weight * multiplier
+                if score > scores.get(ticker, 0.0):
+                    scores[ticker] = score
+
+        for terms in expansions[1:]:
+            narrowed = {}
+            for ticker, score in scores.items():
+                best = 0.0
+                for postings, multiplier in terms:
+                    weight = postings.get(ticker)
+                    if weight is not None and weight * multiplier > best:
+                        best = weight * multiplier
+                if best > 0.0:
+                    narrowed[ticker] = score + best
+            scores = narrowed
+            if not scores:
+                return []
+
+        if status is not None:
+            scores = {ticker: score for ticker, score in scores.items() if self.status.get(ticker) == status}
+
+        return heapq.nsmallest(
+            limit,
+            scores.items(),
+            key=lambda item: (-item[1], -self.volume.get(item[0], 0), item[0])
+        )
+
+    def _expand(self, token: str, as_prefix: bool) -> List[Tuple[str, float]]:
+        """Vocabulary terms a query token matches, with their score multiplier"""
+        matches = []
+        if token in self.postings:
+            matches.append((token, 1.0))
+
+        if as_prefix:
+            start = bisect.bisect_left(self.vocabulary, token)
+            for term in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    matches.append((term, PREFIX_DISCOUNT))
+
+        return matches
+
+    def _remove_postings(self, ticker: str, weights: Dict[str, float]):
+        for token in weights:
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(ticker, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
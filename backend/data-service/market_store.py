@@ -0,0 +1,386 @@
+import bisect
+import heapq
+from typing import Optional, List, Dict, Any, Tuple, Set, Callable
+from datetime import datetime
+from loguru import logger
+
+from models import KalshiMarket, MarketStatus
+from kalshi_client import KalshiClient
+from hierarchy import MarketHierarchy
+from compact import to_epoch
+
+# Change kinds recorded in the change log
+ADDED = "added"
+MODIFIED = "modified"
+REMOVED = "removed"
+
+# Fields with an equality index; series membership comes from the hierarchy
+INDEXED_FIELDS = ("event_ticker", "status", "category")
+
+# Fields markets can be sorted by in local queries
+SORTABLE_FIELDS = (
+    "ticker", "volume", "open_interest", "last_price",
+    "yes_price", "no_price", "expiry_date", "close_date"
+)
+
+SECONDS_PER_DAY = 86400
+
+# Result sets up to this size are sorted directly; larger ones walk a cached ordering
+DIRECT_SORT_LIMIT = 1000
+
+class MarketStore:
+    """Versioned in-memory copy of the Kalshi market universe"""
+
+    def __init__(self, max_history: int = 50000):
+        self.version = 0
+        self.max_history = max_history
+        self.markets: Dict[str, KalshiMarket] = {}
+        # Series and event records, linked to the markets as they change
+        self.hierarchy = MarketHierarchy()
+        self.last_sync: Optional[datetime] = None
+        self.ready = False
+
+        # Wire-format (aliased, JSON-mode) copy of each market used for field diffs
+        self._records: Dict[str, Dict[str, Any]] = {}
+
+        # Change log entries are (version, ticker, kind, changed_fields), ordered by version.
+        # Diffs are available for any `since` >= self._floor.
+        self._log: List[Tuple[int, str, str, Tuple[str, ...]]] = []
+        self._log_versions: List[int] = []
+        self._floor = 0
+
+        # Secondary indexes: field -> value -> tickers, plus expiry day buckets
+        self._indexes: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in INDEXED_FIELDS}
+        self._expiry_buckets: Dict[int, Set[str]] = {}
+        self._expiry_days: List[int] = []
+        self._expiry_epochs: Dict[str, float] = {}
+
+        # Full-universe orderings per (field, descending), rebuilt lazily after changes
+        self._sort_orders: Dict[Tuple[str, bool], List[str]] = {}
+        self._sort_orders_version = 0
+
+        # Callbacks run with (upserted markets, removed tickers) after each change
+        self._listeners: List[Callable[[List[KalshiMarket], List[str]], None]] = [self.hierarchy.update_markets]
+
+    def __len__(self) -> int:
+        return len(self.markets)
+
+    def get(self, market_ticker: str) -> Optional[KalshiMarket]:
+        return self.markets.get(market_ticker)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Wire-format copies of every market, as served by the API"""
+        return list(self._records.values())
+
+    def add_listener(self, callback: Callable[[List[KalshiMarket], List[str]], None]):
+        """Register a callback for incremental updates of derived structures"""
+        self._listeners.append(callback)
+        if self.markets:
+            callback(list(self.markets.values()), [])
+
+    def apply(self, markets: List[KalshiMarket], complete: bool = False) -> int:
+        """Merge a batch of markets into the store.
+
+        When `complete` is True the batch is the full universe and any market
+        missing from it is recorded as removed. Returns the store version after
+        the merge; the version only advances when something changed.
+        """
+        pending = []
+        seen = set()
+
+        for market in markets:
+            seen.add(market.ticker)
+            record = market.model_dump(by_alias=True, mode="json")
+            previous = self._records.get(market.ticker)
+
+            if previous is None:
+                pending.append((market, record, ADDED, ()))
+                continue
+
+            changed = tuple(key for key, value in record.items() if previous.get(key) != value)
+            if changed:
+                pending.append((market, record, MODIFIED, changed))
+
+        removed = []
+        if complete:
+            removed = [ticker for ticker in self._records if ticker not in seen]
+
+        if pending or removed:
+            self.version += 1
+            for market, record, kind, changed in pending:
+                previous_market = self.markets.get(market.ticker)
+                if previous_market is not None:
+                    self._unindex(previous_market)
+                self._index(market)
+                self.markets[market.ticker] = market
+                self._records[market.ticker] = record
+                self._append_log(market.ticker, kind, changed)
+            for ticker in removed:
+                self._unindex(self.markets[ticker])
+                del self.markets[ticker]
+                del self._records[ticker]
+                self._append_log(ticker, REMOVED, ())
+            self._trim_log()
+
+            upserted = [market for market, _, _, _ in pending]
+            for callback in self._listeners:
+                try:
+                    callback(upserted, removed)
+                except Exception as e:
+                    logger.error(f"Market store listener failed: {e}")
+
+        if complete:
+            self.ready = True
+            self.last_sync = datetime.utcnow()
+
+        return self.version
+
+    def changes_since(self, since: int) -> Dict[str, Any]:
+        """Collapse the change log after `since` into added/modified/removed sets.
+
+        If `since` is older than the retained history the caller gets the full
+        universe back as `added` with `reset` set, and should replace its copy.
+        """
+        if since < self._floor:
+            return {
+                "version": self.version,
+                "since": since,
+                "reset": True,
+                "added": list(self.markets.values()),
+                "modified": [],
+                "removed": []
+            }
+
+        start = bisect.bisect_right(self._log_versions, since)
+
+        # Net effect per ticker over the window
+        added = set()
+        modified: Dict[str, set] = {}
+        removed = set()
+
+        for _, ticker, kind, changed in self._log[start:]:
+            if kind == ADDED:
+                if ticker in removed:
+                    # Client still holds an older copy; resend the whole record
+                    removed.discard(ticker)
+                added.add(ticker)
+                modified.pop(ticker, None)
+            elif kind == MODIFIED:
+                if ticker not in added:
+                    modified.setdefault(ticker, set()).update(changed)
+            else:
+                if ticker in added:
+                    added.discard(ticker)
+                    if self._existed_at(ticker, since):
+                        removed.add(ticker)
+                else:
+                    removed.add(ticker)
+                modified.pop(ticker, None)
+
+        return {
+            "version": self.version,
+            "since": since,
+            "reset": False,
+            "added": [self.markets[ticker] for ticker in added if ticker in self.markets],
+            "modified": [
+                {
+                    "ticker": ticker,
+                    "changes": {field: self._records[ticker].get(field) for field in sorted(fields)}
+                }
+                for ticker, fields in modified.items()
+                if ticker in self._records
+            ],
+            "removed": sorted(removed)
+        }
+
+    def query(self, status: Optional[MarketStatus] = None,
+              event_ticker: Optional[str] = None,
+              series_ticker: Optional[str] = None,
+              category: Optional[str] = None,
+              expires_after: Optional[datetime] = None,
+              expires_before: Optional[datetime] = None,
+              sort_by: Optional[str] = None,
+              descending: bool = False,
+              offset: int = 0,
+              limit: int = 100) -> Tuple[List[KalshiMarket], int]:
+        """Filter, sort and paginate the local universe using the secondary indexes.
+
+        Returns the requested page and the total number of matching markets.
+        """
+        if sort_by is not None and sort_by not in SORTABLE_FIELDS:
+            raise ValueError(f"Cannot sort by {sort_by}; expected one of {', '.join(SORTABLE_FIELDS)}")
+
+        candidates = []
+        for field, value in (("status", status), ("event_ticker", event_ticker), ("category", category)):
+            if value is not None:
+                candidates.append(self._indexes[field].get(value, set()))
+        if series_ticker is not None:
+            candidates.append(self.hierarchy.markets_of_series(series_ticker))
+
+        if expires_after is not None or expires_before is not None:
+            candidates.append(self._expiring_between(expires_after, expires_before))
+
+        if candidates:
+            # Intersect starting from the most selective index
+            candidates.sort(key=len)
+            matches = set(candidates[0])
+            for other in candidates[1:]:
+                matches &= other
+                if not matches:
+                    break
+        else:
+            matches = None
+
+        total = len(matches) if matches is not None else len(self.markets)
+        sort_key = self._sort_key(sort_by or "ticker", descending)
+        end = offset + limit
+
+        if total <= DIRECT_SORT_LIMIT:
+            markets = (self.markets[ticker] for ticker in (matches if matches is not None else self.markets))
+            if end < total:
+                select = heapq.nlargest if descending else heapq.nsmallest
+                page = select(end, markets, key=sort_key)[offset:]
+            else:
+                page = sorted(markets, key=sort_key, reverse=descending)[offset:end]
+        else:
+            # Walk the cached universe ordering and keep the matching markets
+            order = self._sort_order(sort_by or "ticker", descending)
+            if matches is None:
+                tickers = order[offset:end]
+            else:
+                tickers = []
+                skipped = 0
+                for ticker in order:
+                    if ticker in matches:
+                        if skipped < offset:
+                            skipped += 1
+                            continue
+                        tickers.append(ticker)
+                        if len(tickers) >= limit:
+                            break
+            page = [self.markets[ticker] for ticker in tickers]
+
+        return page, total
+
+    async def sync(self, client: KalshiClient) -> int:
+        """Pull the full market universe from Kalshi and merge it in"""
+        markets = await client.get_all_markets()
+        version = self.apply(markets, complete=True)
+        logger.info(f"Market universe synced: {len(self.markets)} markets at version {version}")
+
+        try:
+            await self.hierarchy.sync(client)
+        except Exception as e:
+            logger.warning(f"Failed to sync events: {e}")
+
+        return version
+
+    def _index(self, market: KalshiMarket):
+        for field in INDEXED_FIELDS:
+            value = getattr(market, field)
+            if value is not None:
+                self._indexes[field].setdefault(value, set()).add(market.ticker)
+
+        if market.expiry_date is not None:
+            expiry = to_epoch(market.expiry_date)
+            self._expiry_epochs[market.ticker] = expiry
+            day = int(expiry // SECONDS_PER_DAY)
+            bucket = self._expiry_buckets.get(day)
+            if bucket is None:
+                bucket = self._expiry_buckets[day] = set()
+                bisect.insort(self._expiry_days, day)
+            bucket.add(market.ticker)
+
+    def _unindex(self, market: KalshiMarket):
+        for field in INDEXED_FIELDS:
+            value = getattr(market, field)
+            tickers = self._indexes[field].get(value)
+            if tickers is not None:
+                tickers.discard(market.ticker)
+                if not tickers:
+                    del self._indexes[field][value]
+
+        expiry = self._expiry_epochs.pop(market.ticker, None)
+        if expiry is not None:
+            day = int(expiry // SECONDS_PER_DAY)
+            bucket = self._expiry_buckets.get(day)
+            if bucket is not None:
+                bucket.discard(market.ticker)
+                if not bucket:
+                    del self._expiry_buckets[day]
+                    del self._expiry_days[bisect.bisect_left(self._expiry_days, day)]
+
+    def _expiring_between(self, after: Optional[datetime], before: Optional[datetime]) -> Set[str]:
+        """Tickers whose expiry falls in [after, before], via the day buckets"""
+        low = to_epoch(after) if after is not None else float("-inf")
+        high = to_epoch(before) if before is not None else float("inf")
+        if low > high:
+            return set()
+
+        start = 0 if after is None else bisect.bisect_left(self._expiry_days, int(low // SECONDS_PER_DAY))
+        stop = len(self._expiry_days) if before is None else bisect.bisect_right(self._expiry_days, int(high // SECONDS_PER_DAY))
+
+        matches = set()
+        for position in range(start, stop):
+            day = self._expiry_days[position]
+            bucket = self._expiry_buckets[day]
+            if low <= day * SECONDS_PER_DAY and (day + 1) * SECONDS_PER_DAY <= high:
+                # Whole day inside the range
+                matches |= bucket
+            else:
+                # Edge day: check the exact expiry
+                epochs = self._expiry_epochs
+                matches.update(ticker for ticker in bucket if low <= epochs[ticker] <= high)
+        return matches
+
+    def _sort_order(self, field: str, descending: bool) -> List[str]:
+        if self._sort_orders_version != self.version:
+            self._sort_orders = {}
+            self._sort_orders_version = self.version
+
+        order = self._sort_orders.get((field, descending))
+        if order is None:
+            sort_key = self._sort_key(field, descending)
+            order = [
+                market.ticker
+                for market in sorted(self.markets.values(), key=sort_key, reverse=descending)
+            ]
+            self._sort_orders[(field, descending)] = order
+        return order
+
+    @staticmethod
+    def _sort_key(field: str, descending: bool):
+        """Sort key that keeps markets missing the field at the end in either direction"""
+        def key(market: KalshiMarket):
+            value = getattr(market, field)
+            if value is None:
+                return (not descending, 0, market.ticker)
+            if isinstance(value, datetime):
+                value = to_epoch(value)
+            return (descending, value, market.ticker)
+        return key
+
+    def _existed_at(self, ticker: str, since: int) -> bool:
+        """Whether the ticker was present at version `since` (first log event was not an add)"""
+        start = bisect.bisect_right(self._log_versions, since)
+        for _, logged_ticker, kind, _ in self._log[start:]:
+            if logged_ticker == ticker:
+                return kind != ADDED
+        return ticker in self._records
+
+    def _append_log(self, ticker: str, kind: str, changed: Tuple[str, ...]):
+        self._log.append((self.version, ticker, kind, changed))
+        self._log_versions.append(self.version)
+
+    def _trim_log(self):
+        """Drop the oldest whole versions once the log exceeds max_history entries"""
+        excess = len(self._log) - self.max_history
+        if excess <= 0:
+            return
+
+        # Never split a version: cut after the last entry of the version at the cut point
+        cutoff = self._log_versions[excess - 1]
+        cut = bisect.bisect_right(self._log_versions, cutoff)
+        del self._log[:cut]
+        del self._log_versions[:cut]
+        self._floor = cutoff
@@ -14,6 +14,10 @@ class MarketStatus(str, Enum):
     SETTLED = "settled"
     INITIALIZED = "initialized"
 
+class ExportFormat(str, Enum):
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
 class ConfidenceLevel(str, Enum):
     HIGH = "high"
     MEDIUM = "medium"
@@ -30,6 +34,8 @@ class KalshiMarket(BaseModel):
     status: MarketStatus
     yes_price: Optional[float] = Field(None, alias="yes_ask") # Using yes_ask as price
     no_price: Optional[float] = Field(None, alias="no_ask") # Using no_ask as price
+    yes_bid: Optional[float] = None
+    no_bid: Optional[float] = None
     last_price: Optional[float] = None
     volume: Optional[int] = 0
     open_interest: Optional[int] = 0
@@ -55,6 +61,7 @@ class KalshiOrderBook(BaseModel):
     no_bids: List[KalshiOrderBookLevel] = []
     no_asks: List[KalshiOrderBookLevel] = []
     timestamp: datetime
+    fingerprint: Optional[str] = None  # Digest of the levels; equal across unchanged polls
 
 class KalshiTrade(BaseModel):
     market_ticker: str
@@ -83,6 +90,31 @@ class LiquidityMetrics(BaseModel):
     price_impact_100: float
     price_impact_1000: float
 
+class TradeFlowWindow(BaseModel):
+    window: str  # Trailing span ending at the latest trade, or "all"
+    trades: int
+    volume: int
+    vwap: Optional[float] = None
+    order_flow_imbalance: Optional[float] = None  # (buy - sell volume) / volume, in [-1, 1]
+
+class TradeSizeDistribution(BaseModel):
+    mean: float
+    median: float
+    p90: float
+    max: int
+    large_trade_share: Optional[float] = None  # Share of volume in trades at or above p90
+
+class TradeFlowMetrics(BaseModel):
+    trades: int
+    windows: List[TradeFlowWindow]
+    order_flow_imbalance: Optional[float] = None
+    size_distribution: Optional[TradeSizeDistribution] = None
+    kyle_lambda: Optional[float] = None  # Midpoint move per signed contract
+    effective_spread: Optional[float] = None  # Volume-weighted
+    mean_effective_spread: Optional[float] = None  # Per trade, unweighted
+    realized_spread: Optional[float] = None
+    price_impact: Optional[float] = None
+
 class OrderBookAnalytics(BaseModel):
     market_ticker: str
     sweep_price_100: float
@@ -97,6 +129,61 @@ class OrderBookAnalytics(BaseModel):
     mid_price: float
     gaps: List[Dict[str, Union[str, float]]] = []
 
+class DepthLevel(BaseModel):
+    price: float
+    size: int
+    cumulative: int
+
+class PriceGap(BaseModel):
+    low: float
+    high: float
+    width: float
+
+class DepthLadder(BaseModel):
+    market_ticker: str
+    side: str  # "yes" or "no" book
+    tick: float
+    version: int
+    timestamp: datetime
+    best_bid: Optional[float] = None
+    best_ask: Optional[float] = None
+    mid_price: Optional[float] = None
+    total_bid_volume: int = 0
+    total_ask_volume: int = 0
+    bids: List[DepthLevel] = []  # Best price first, cumulative outward
+    asks: List[DepthLevel] = []
+    gaps: List[PriceGap] = []
+
+class CorrelationMatrix(BaseModel):
+    tickers: List[str]
+    window: int  # Return intervals in the rolling window
+    interval_seconds: float
+    observations: int  # Intervals currently in the window
+    min_periods: int
+    correlation: List[List[Optional[float]]]  # Row/column order follows tickers; None when undefined
+    covariance: Optional[List[List[Optional[float]]]] = None
+
+class PnlBin(BaseModel):
+    low: float
+    high: float
+    count: int
+
+class SimulationResult(BaseModel):
+    scenarios: int
+    markets: int
+    correlated_markets: int  # Markets drawn through the correlation factors
+    factors: int
+    probabilities: Dict[str, float]  # Yes probability used per market
+    expected_pnl: float
+    std_pnl: float
+    min_pnl: float
+    max_pnl: float
+    probability_of_loss: float
+    var: Dict[str, float]  # Confidence level -> loss, as a positive number
+    expected_shortfall: Dict[str, float]
+    histogram: List[PnlBin]
+    elapsed_ms: float
+
 class ArbitrageOpportunity(BaseModel):
     market_ticker_1: str
     market_ticker_2: str
@@ -114,6 +201,34 @@ class ArbitrageOpportunity(BaseModel):
     volume_1: Optional[int] = 0
     volume_2: Optional[int] = 0
 
+class EventArbitrageOpportunity(BaseModel):
+    event_ticker: str
+    strategy: str  # "buy_all_yes" or "sell_all_yes"
+    market_tickers: List[str]
+    prices: List[float]
+    basket_price: float
+    edge: float
+    edge_percentage: float
+    executable_size: int = 0
+    potential_profit: float = 0.0
+    confidence: ConfidenceLevel
+    event_title: Optional[str] = None
+    expiry_date: Optional[datetime] = None
+
+class ComplementArbitrageOpportunity(BaseModel):
+    market_ticker: str
+    strategy: str  # "buy_yes_and_no" or "sell_yes_and_no"
+    yes_price: float
+    no_price: float
+    combined_price: float
+    edge: float
+    edge_percentage: float
+    executable_size: int = 0
+    potential_profit: float = 0.0
+    confidence: ConfidenceLevel
+    market_title: Optional[str] = None
+    expiry_date: Optional[datetime] = None
+
 class DashboardStats(BaseModel):
     total_volume: str
     active_contracts: int
@@ -124,17 +239,33 @@ class DashboardStats(BaseModel):
     avg_spread: float
     top_volume_markets: List[Dict[str, Any]] = []
 
+class SeriesNode(BaseModel):
+    series_ticker: str
+    title: Optional[str] = None
+    category: Optional[str] = None
+    frequency: Optional[str] = None
+
+class EventNode(BaseModel):
+    event_ticker: str
+    series_ticker: Optional[str] = None
+    title: Optional[str] = None
+    category: Optional[str] = None
+    mutually_exclusive: Optional[bool] = None
+    market_tickers: List[str] = []
+
 class MarketAnalytics(BaseModel):
+    # Metrics are optional so a request can ask for a subset of them
     market_ticker: str
-    volatility: float
-    momentum: float
-    volume_trend: float
-    price_efficiency: float
-    liquidity_score: float
-    risk_score: float
-    orderbook_analytics: OrderBookAnalytics
-    liquidity_metrics: LiquidityMetrics
-    recent_trades: List[KalshiTrade] = []
+    volatility: Optional[float] = None
+    momentum: Optional[float] = None
+    volume_trend: Optional[float] = None
+    price_efficiency: Optional[float] = None
+    liquidity_score: Optional[float] = None
+    risk_score: Optional[float] = None
+    orderbook_analytics: Optional[OrderBookAnalytics] = None
+    liquidity_metrics: Optional[LiquidityMetrics] = None
+    trade_flow: Optional[TradeFlowMetrics] = None
+    recent_trades: Optional[List[KalshiTrade]] = None
     price_history: List[KalshiCandlestick] = []
 
 class ChartDataPoint(BaseModel):
@@ -152,14 +283,61 @@ class MarketResponse(BaseModel):
     cursor: Optional[str] = None
     count: int = 0
 
+class MarketFieldChange(BaseModel):
+    ticker: str
+    changes: Dict[str, Any]
+
+class MarketChangesResponse(BaseModel):
+    version: int
+    since: int
+    reset: bool = False
+    added: List[KalshiMarket] = []
+    modified: List[MarketFieldChange] = []
+    removed: List[str] = []
+
+class MarketSearchResult(BaseModel):
+    market: KalshiMarket
+    score: float
+
+class MarketSearchResponse(BaseModel):
+    query: str
+    results: List[MarketSearchResult]
+    count: int = 0
+
 class OrderBookResponse(BaseModel):
     orderbook: KalshiOrderBook
 
+class DepthResponse(BaseModel):
+    depth: DepthLadder
+
+class CorrelationResponse(BaseModel):
+    correlation: CorrelationMatrix
+
+class ScreenerResponse(BaseModel):
+    rows: List[Dict[str, Any]]  # Requested columns per matching market; None where not yet computed
+    count: int = 0  # Markets matching the predicate, before the limit
+    total: int = 0  # Markets in the metrics table
+
+class MarketHierarchyResponse(BaseModel):
+    market_ticker: str
+    event: Optional[EventNode] = None  # Includes the market's siblings
+    series: Optional[SeriesNode] = None
+
+class SeriesEventsResponse(BaseModel):
+    series: SeriesNode
+    events: List[EventNode]
+    count: int = 0
+
+class SimulationResponse(BaseModel):
+    simulation: SimulationResult
+
 class AnalyticsResponse(BaseModel):
     analytics: MarketAnalytics
 
 class ArbitrageResponse(BaseModel):
     opportunities: List[ArbitrageOpportunity]
+    event_opportunities: List[EventArbitrageOpportunity] = []
+    complement_opportunities: List[ComplementArbitrageOpportunity] = []
     count: int = 0
 
 class DashboardStatsResponse(BaseModel):
@@ -187,6 +365,22 @@ class AnalyticsRequest(BaseModel):
     timeframe: Optional[str] = "1d"
     include_orderbook: Optional[bool] = True
     include_trades: Optional[bool] = True
+    fields: Optional[List[str]] = None
+
+class SimulationPosition(BaseModel):
+    market_ticker: str
+    side: str = "yes"  # "yes" or "no"
+    quantity: float
+    entry_price: Optional[float] = None  # Defaults to the current price, so P&L is against the mark
+    probability: Optional[float] = None  # Yes probability override; defaults to the book mid
+
+class SimulationRequest(BaseModel):
+    positions: List[SimulationPosition]
+    scenarios: int = 100000
+    confidence_levels: List[float] = [0.95, 0.99]
+    bins: int = 50
+    correlated: bool = True
+    seed: Optional[int] = None
 
 # Error Models
 class ErrorResponse(BaseModel):
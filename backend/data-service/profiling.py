@@ -0,0 +1,182 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+
+# Header and query flag that turn on profiling for one request
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "profile"
+
+# Hotspots reported per profiled request
+TOP_HOTSPOTS = 15
+
+# Phases that never await. cProfile traces the whole event-loop thread, so
+# hotspots are only collected inside these; around an await it would also
+# pick up every other coroutine the loop ran meanwhile
+TRACED_PHASES = frozenset({"parse", "upstream_decode", "compute"})
+
+class RequestProfile:
+    """Wall time per phase for one request, plus optional cProfile hotspots.
+
+    Phases can overlap when work runs concurrently (e.g. parallel upstream
+    fetches), so their sum may exceed the request's total time. Hotspots
+    cover only the request's own TRACED_PHASES sections.
+    """
+
+    def __init__(self, with_hotspots: bool = True):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.profiler: Optional[cProfile.Profile] = None
+        self._traced_depth = 0
+        if with_hotspots and _hotspot_lock.acquire(blocking=False):
+            # cProfile hooks the whole thread, so only one request is traced at a time
+            self.profiler = cProfile.Profile()
+
+    def trace(self, enable: bool):
+        """Switch the profiler on entering the outermost traced phase and off leaving it"""
+        if self.profiler is None:
+            return
+        if enable:
+            self._traced_depth += 1
+            if self._traced_depth == 1:
+                self.profiler.enable()
+        else:
+            self._traced_depth -= 1
+            if self._traced_depth == 0:
+                self.profiler.disable()
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def finish(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started
+        hotspots = []
+        if self.profiler is not None:
+            if self._traced_depth:
+                self.profiler.disable()
+            _hotspot_lock.release()
+            hotspots = _hotspots(self.profiler)
+            self.profiler = None
+
+        return {
+            "total_ms": round(total * 1000, 3),
+            "phases": {
+                name: {"ms": round(seconds * 1000, 3), "count": self.counts[name]}
+                for name, seconds in sorted(self.phases.items(), key=lambda item: -item[1])
+            },
+            "hotspots": hotspots
+        }
+
+    def server_timing(self) -> str:
+        """Phase durations in Server-Timing header syntax"""
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(entries)
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+_hotspot_lock = threading.Lock()
+
+def start_request_profile(with_hotspots: bool = True):
+    """Begin profiling the current request; returns the profile and a reset token"""
+    profile = RequestProfile(with_hotspots)
+    return profile, _current.set(profile)
+
+def end_request_profile(token):
+    _current.reset(token)
+
+@contextmanager
+def phase(name: str):
+    """Attribute the wall time of a block to a named phase of the current request.
+
+    A no-op unless the request opted into profiling, so it can stay in hot paths.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    traced = name in TRACED_PHASES
+    if traced:
+        profile.trace(True)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.record(name, time.perf_counter() - started)
+        if traced:
+            profile.trace(False)
+
+def _hotspots(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({function})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda row: row["own_ms"], reverse=True)
+    return rows[:TOP_HOTSPOTS]
+
+class SamplingProfiler:
+    """Periodically samples every thread's Python stack into collapsed-stack counts.
+
+    Output is the "frame;frame;frame count" format read by flamegraph.pl,
+    speedscope and similar tools. Sampling walks frames from a side thread,
+    so the cost to the event loop is a brief GIL hand-off per sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval: float = 0.005) -> Dict[str, Any]:
+        """Blocking; run it in a worker thread. Raises RuntimeError if already sampling."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A sampling profile is already running")
+
+        try:
+            stacks: Counter = Counter()
+            own_thread = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples = 0
+            deadline = time.perf_counter() + seconds
+
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+                samples += 1
+                time.sleep(interval)
+
+            return {
+                "samples": samples,
+                "interval_ms": interval * 1000,
+                "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+            }
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Union, Iterable
+
+import numpy as np
+from loguru import logger
+
+from compact import CompactOrderBook, TradeColumns, BOOK_SIDES
+
+# Log layout: each partition covers one UTC hour of capture time as a pair of
+# files. The .klog file is a sequence of blocks, each a BLOCK_HEADER followed
+# by a zlib-compressed payload of column sections; the .kidx file holds one
+# fixed-width INDEX_ENTRY per block so time-range reads seek straight to the
+# blocks they need. The log is only ever appended to; the index can be
+# rebuilt from it (see recover).
+BLOCK_MAGIC = b"KRB1"
+# magic, compressed length, raw length, first/last capture ms, records, crc32 of the compressed payload
+BLOCK_HEADER = struct.Struct("<4sIIqqII")
+# block offset, block length including header, first/last capture ms, records
+INDEX_ENTRY = np.dtype([
+    ("offset", "<u8"), ("length", "<u4"), ("first_ms", "<i8"), ("last_ms", "<i8"), ("records", "<u4")
+])
+SECTION_HEADER = struct.Struct("<I")
+PARTITION_MS = 3600 * 1000
+PARTITION_FORMAT = "%Y%m%dT%H"
+LOG_SUFFIX = ".klog"
+INDEX_SUFFIX = ".kidx"
+
+BOOK = 0
+TRADES = 1
+
+# Trade columns stored as raw arrays; trade ids go into a JSON section
+TRADE_ARRAYS = ("timestamps", "prices", "sizes", "sides", "yes_no")
+
+Record = Union[CompactOrderBook, TradeColumns]
+
+def partition_name(captured_ms: int) -> str:
+    return datetime.fromtimestamp(captured_ms / 1000, tz=timezone.utc).strftime(PARTITION_FORMAT)
+
+def partition_start(name: str) -> int:
+    start = datetime.strptime(name, PARTITION_FORMAT).replace(tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000)
+
+def encode_block(records: List[Tuple[int, int, Record]]) -> bytes:
+    """Column sections for a batch of (kind, captured ms, record); books and trades are grouped"""
+    books = [(captured, record) for kind, captured, record in records if kind == BOOK]
+    trades = [(captured, record) for kind, captured, record in records if kind == TRADES]
+    sections: Dict[str, np.ndarray] = {}
+
+    sections["book_captured"] = np.array([captured for captured, _ in books], dtype=np.int64)
+    sections["book_timestamps"] = np.array([book.timestamp for _, book in books], dtype=np.int64)
+    sections["book_bounds"] = np.array([book.bounds for _, book in books], dtype=np.int32).reshape(-1)
+    sections["book_prices"] = np.concatenate([book.prices for _, book in books]) if books else np.zeros(0)
+    sections["book_sizes"] = (
+        np.concatenate([book.sizes for _, book in books]) if books else np.zeros(0, dtype=np.int64)
+    )
+
+    sections["trade_captured"] = np.array([captured for captured, _ in trades], dtype=np.int64)
+    sections["trade_counts"] = np.array([len(batch) for _, batch in trades], dtype=np.int32)
+    for name in TRADE_ARRAYS:
+        sections[f"trade_{name}"] = np.concatenate([getattr(batch, name) for _, batch in trades]) if trades else (
+            getattr(TradeColumns.empty(""), name)
+        )
+
+    header = {
+        "book_tickers": [book.market_ticker for _, book in books],
+        "trade_tickers": [batch.market_ticker for _, batch in trades],
+        "trade_ids": [trade_id or "" for _, batch in trades for trade_id in batch.trade_ids.tolist()],
+        "sections": [[name, array.dtype.str, len(array)] for name, array in sections.items()]
+    }
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    return b"".join([SECTION_HEADER.pack(len(encoded)), encoded] + [array.tobytes() for array in sections.values()])
+
+def decode_block(payload: bytes) -> List[Tuple[int, Record]]:
+    """(captured ms, record) pairs from a decompressed block, books before trades"""
+    (header_length,) = SECTION_HEADER.unpack_from(payload)
+    offset = SECTION_HEADER.size + header_length
+    header = json.loads(payload[SECTION_HEADER.size:offset])
+    sections = {}
+    for name, dtype, length in header["sections"]:
+        array = np.frombuffer(payload, dtype=dtype, count=length, offset=offset)
+        sections[name] = array
+        offset += array.nbytes
+
+    records: List[Tuple[int, Record]] = []
+    bounds = sections["book_bounds"].reshape(-1, len(BOOK_SIDES) + 1)
+    start = 0
+    for i, ticker in enumerate(header["book_tickers"]):
+        stop = start + int(bounds[i, -1])
+        records.append((int(sections["book_captured"][i]), CompactOrderBook.from_arrays(
+            ticker, sections["book_prices"][start:stop], sections["book_sizes"][start:stop],
+            bounds[i], sections["book_timestamps"][i]
+        )))
+        start = stop
+
+    trade_ids = np.array(header["trade_ids"], dtype=object)
+    start = 0
+    for i, ticker in enumerate(header["trade_tickers"]):
+        stop = start + int(sections["trade_counts"][i])
+        records.append((int(sections["trade_captured"][i]), TradeColumns(
+            ticker, *(sections[f"trade_{name}"][start:stop] for name in TRADE_ARRAYS), trade_ids[start:stop]
+        )))
+        start = stop
+    return records
+
+def _scan_blocks(log, offset: int) -> Iterator[Tuple[int, int, int, int, int]]:
+    """Index entries for the intact blocks from `offset`; stops at the first torn or corrupt one"""
+    log.seek(offset)
+    while True:
+        head = log.read(BLOCK_HEADER.size)
+        if len(head) < BLOCK_HEADER.size:
+            return
+        magic, compressed, _, first_ms, last_ms, count, crc = BLOCK_HEADER.unpack(head)
+        payload = log.read(compressed)
+        if magic != BLOCK_MAGIC or len(payload) < compressed or zlib.crc32(payload) != crc:
+            return
+        length = BLOCK_HEADER.size + compressed
+        yield offset, length, first_ms, last_ms, count
+        offset += length
+
+def recover(log_path: str, index_path: str) -> int:
+    """Make a partition's log and index agree after a crash; returns the log's valid length.
+
+    Index entries past the end of the log are dropped, intact blocks the
+    index missed are re-indexed from the log, and a torn final block is cut.
+    """
+    index = load_index(index_path)
+    size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    index = index[index["offset"] + index["length"] <= size]
+    end = int(index["offset"][-1] + index["length"][-1]) if len(index) else 0
+    if end < size:
+        with open(log_path, "rb") as log:
+            found = list(_scan_blocks(log, end))
+        if found:
+            index = np.concatenate([index, np.array(found, dtype=INDEX_ENTRY)])
+            end = int(index["offset"][-1] + index["length"][-1])
+        if end < size:
+            logger.warning(f"Recorder cut {size - end} bytes of torn data from {log_path}")
+            with open(log_path, "r+b") as log:
+                log.truncate(end)
+    index.tofile(index_path)
+    return end
+
+def load_index(index_path: str) -> np.ndarray:
+    if not os.path.exists(index_path):
+        return np.zeros(0, dtype=INDEX_ENTRY)
+    index = np.fromfile(index_path, dtype=np.uint8)
+    # A torn final entry is ignored; recover() rewrites the file
+    usable = len(index) - len(index) % INDEX_ENTRY.itemsize
+    return index[:usable].view(INDEX_ENTRY)
+
+def partitions(directory: str) -> List[str]:
+    """Partition names in the directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(LOG_SUFFIX)] for name in os.listdir(directory) if name.endswith(LOG_SUFFIX))
+
+def read_range(directory: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+               tickers: Optional[Iterable[str]] = None) -> Iterator[Tuple[int, Record]]:
+    """Recorded (captured ms, book or trade batch) pairs captured in [start_ms, end_ms].
+
+    Partitions outside the range are skipped by name and blocks by their
+    index entries, so only overlapping blocks are read and decompressed.
+    Records come out in capture order within a block.
+    """
+    start_ms = start_ms if start_ms is not None else -2 ** 63
+    end_ms = end_ms if end_ms is not None else 2 ** 63 - 1
+    wanted = set(tickers) if tickers is not None else None
+    for name in partitions(directory):
+        begin = partition_start(name)
+        if begin > end_ms or begin + PARTITION_MS <= start_ms:
+            continue
+        index = load_index(os.path.join(directory, name + INDEX_SUFFIX))
+        index = index[(index["last_ms"] >= start_ms) & (index["first_ms"] <= end_ms)]
+        if not len(index):
+            continue
+        with open(os.path.join(directory, name + LOG_SUFFIX), "rb") as log:
+            for offset, length in zip(index["offset"].tolist(), index["length"].tolist()):
+                log.seek(offset)
+                block = log.read(length)
+                payload = zlib.decompress(block[BLOCK_HEADER.size:])
+                records = decode_block(payload)
+                records.sort(key=lambda record: record[0])
+                for captured, record in records:
+                    if start_ms <= captured <= end_ms and (wanted is None or record.market_ticker in wanted):
+                        yield captured, record
+
+class MarketRecorder:
+    """Captures every new order book and trade to a compressed, append-only log.
+
+    Recording a book or trade batch only appends a reference to a pending
+    list, since both are immutable once parsed; a background task hands the
+    list to a worker thread every `flush_seconds` (or sooner once
+    `batch_size` records are waiting), which encodes, compresses and
+    appends it as one block. If the writer falls behind and
+    `max_pending` records are queued, new records are dropped and counted
+    rather than slowing the parse path.
+    """
+
+    def __init__(self, directory: str, flush_seconds: float = 1.0, batch_size: int = 5000,
+                 max_pending: int = 100_000, retention_hours: float = 0, compression_level: int = 6):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retention_hours = retention_hours
+        self.compression_level = compression_level
+        self._pending: List[Tuple[int, int, Record]] = []
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._running = False
+        self._stopped = asyncio.Event()
+        # Open partition the worker thread appends to: name, log file, index file
+        self._partition: Optional[Tuple[str, Any, Any]] = None
+        self.recorded = {BOOK: 0, TRADES: 0}
+        self.trades = 0
+        self.dropped = 0
+        self.written = 0
+        self.blocks = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.enqueue_ns = 0
+        self.writer_seconds = 0.0
+        self.failures = 0
+        self.last_flush: Optional[float] = None
+        self.started_at = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def record_book(self, book: CompactOrderBook):
+        self._enqueue(BOOK, book)
+
+    def record_trades(self, trades: TradeColumns):
+        if self._enqueue(TRADES, trades):
+            self.trades += len(trades)
+
+    def _enqueue(self, kind: int, record: Record) -> bool:
+        started = time.perf_counter_ns()
+        accepted = len(self._pending) < self.max_pending
+        if accepted:
+            self._pending.append((kind, int(time.time() * 1000), record))
+            self.recorded[kind] += 1
+            if len(self._pending) == self.batch_size:
+                self._wake.set()
+        else:
+            self.dropped += 1
+        self.enqueue_ns += time.perf_counter_ns() - started
+        return accepted
+
+    async def run(self):
+        """Flush pending records until closed; stop it with close(), not by cancelling"""
+        self._running = True
+        try:
+            while not self._closing:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self.flush()
+        finally:
+            self._running = False
+            self._stopped.set()
+
+    async def flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            self.failures += 1
+            self.dropped += len(batch)
+            logger.error(f"Recorder failed to write {len(batch)} records: {e}")
+        self.writer_seconds += time.perf_counter() - started
+        self.last_flush = time.time()
+
+    async def close(self):
+        """Write whatever is still pending and close the open partition"""
+        self._closing = True
+        self._wake.set()
+        if self._running:
+            # A write already in its thread must finish before the last one starts
+            await self._stopped.wait()
+        await self.flush()
+        await asyncio.to_thread(self._close_partition)
+
+    def _write(self, batch: List[Tuple[int, int, Record]]):
+        # A batch spanning an hour boundary is split so each block sits in one partition
+        names = [partition_name(captured) for _, captured, _ in batch]
+        for name in sorted(set(names)):
+            records = [record for record, record_name in zip(batch, names) if record_name == name]
+            log, index = self._open_partition(name)
+            raw = encode_block(records)
+            payload = zlib.compress(raw, self.compression_level)
+            captured = [record[1] for record in records]
+            offset = log.tell()
+            log.write(BLOCK_HEADER.pack(
+                BLOCK_MAGIC, len(payload), len(raw), min(captured), max(captured), len(records), zlib.crc32(payload)
+            ))
+            log.write(payload)
+            log.flush()
+            # The index entry follows its block, so a crash leaves at worst an unindexed block for recover()
+            entry = np.array((offset, BLOCK_HEADER.size + len(payload), min(captured), max(captured), len(records)),
+                             dtype=INDEX_ENTRY)
+            index.write(entry.tobytes())
+            index.flush()
+            self.written += len(records)
+            self.blocks += 1
+            self.raw_bytes += len(raw)
+            self.compressed_bytes += BLOCK_HEADER.size + len(payload)
+
+    def _open_partition(self, name: str) -> Tuple[Any, Any]:
+        if self._partition is not None and self._partition[0] == name:
+            return self._partition[1], self._partition[2]
+        self._close_partition()
+        log_path = os.path.join(self.directory, name + LOG_SUFFIX)
+        index_path = os.path.join(self.directory, name + INDEX_SUFFIX)
+        recover(log_path, index_path)
+        self._partition = (name, open(log_path, "ab"), open(index_path, "ab"))
+        self._prune()
+        return self._partition[1], self._partition[2]
+
+    def _close_partition(self):
+        if self._partition is not None:
+            _, log, index = self._partition
+            log.close()
+            index.close()
+            self._partition = None
+
+    def _prune(self):
+        """Delete partitions that ended more than `retention_hours` ago"""
+        if self.retention_hours <= 0:
+            return
+        cutoff = time.time() * 1000 - self.retention_hours * 3600 * 1000
+        for name in partitions(self.directory):
+            if partition_start(name) + PARTITION_MS < cutoff:
+                for suffix in (LOG_SUFFIX, INDEX_SUFFIX):
+                    path = os.path.join(self.directory, name + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+                logger.info(f"Recorder removed expired partition {name}")
+
+    def stats(self) -> Dict[str, Any]:
+        recorded = self.recorded[BOOK] + self.recorded[TRADES]
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        names = partitions(self.directory)
+        disk = sum(
+            os.path.getsize(os.path.join(self.directory, name + suffix))
+            for name in names for suffix in (LOG_SUFFIX, INDEX_SUFFIX)
+            if os.path.exists(os.path.join(self.directory, name + suffix))
+        )
+        return {
+            "directory": self.directory,
+            "books": self.recorded[BOOK],
+            "trade_batches": self.recorded[TRADES],
+            "trades": self.trades,
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "blocks": self.blocks,
+            "failures": self.failures,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "compression_ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+            # Time the parse path spent recording, and the writer's share of wall time
+            "enqueue_ns_per_record": round(self.enqueue_ns / recorded, 1) if recorded else None,
+            "enqueue_seconds": round(self.enqueue_ns / 1e9, 6),
+            "writer_seconds": round(self.writer_seconds, 3),
+            "writer_busy_fraction": round(self.writer_seconds / elapsed, 6),
+            "last_flush_age_seconds": round(time.time() - self.last_flush, 3) if self.last_flush else None,
+            "partitions": len(names),
+            "disk_bytes": disk
+        }
@@ -0,0 +1,195 @@
+import heapq
+import math
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+# Bounds on any one market's polling interval
+MIN_INTERVAL_SECONDS = 5.0
+MAX_INTERVAL_SECONDS = 1800.0
+
+# Weight of the newest refresh in each market's moving signals
+SIGNAL_SMOOTHING = 0.3
+
+# Volatility (std of trade returns) treated as fully active
+VOLATILITY_SCALE = 0.05
+
+# Extra weight for a market about to expire, relative to one a month out
+EXPIRY_WEIGHT = 3.0
+
+# Activity floor, so a dead market is still polled now and then
+BASELINE_ACTIVITY = 0.05
+
+class MarketSchedule:
+    """Signals and polling state for one tracked market"""
+
+    __slots__ = ("ticker", "change_rate", "volatility", "liquidity", "time_risk",
+                 "score", "interval", "next_due", "last_refreshed", "refreshes", "failures")
+
+    def __init__(self, ticker: str, now: float):
+        self.ticker = ticker
+        # Unknown markets start neutral and are polled soon to learn their signals
+        self.change_rate = 0.5
+        self.volatility = 0.0
+        self.liquidity = 0.5
+        self.time_risk = 0.5
+        self.score = 0.0
+        self.interval = MAX_INTERVAL_SECONDS
+        self.next_due = now
+        self.last_refreshed: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def update_score(self):
+        activity = (0.5 * self.change_rate
+                    + 0.3 * min(1.0, self.volatility / VOLATILITY_SCALE)
+                    + 0.2 * self.liquidity)
+        self.score = (BASELINE_ACTIVITY + activity) * (1 + EXPIRY_WEIGHT * self.time_risk)
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ticker": self.ticker,
+            "interval_seconds": round(self.interval, 3),
+            "due_in_seconds": round(max(0.0, self.next_due - now), 3),
+            "last_refreshed_ago": round(now - self.last_refreshed, 3) if self.last_refreshed else None,
+            "score": round(self.score, 4),
+            "change_rate": round(self.change_rate, 4),
+            "volatility": round(self.volatility, 6),
+            "liquidity": round(self.liquidity, 4),
+            "time_risk": round(self.time_risk, 4),
+            "refreshes": self.refreshes,
+            "failures": self.failures
+        }
+
+class RefreshScheduler:
+    """Per-market polling intervals sized from activity, within a call budget.
+
+    Each market's score combines how often its book actually changes
+    between polls, recent trade volatility, liquidity, and proximity to
+    expiry. Polling rates are then shared out in proportion to score
+    (water-filling between the interval bounds) so their sum fits the
+    calls per minute the caller can spare, which it re-supplies as the
+    upstream budget tightens or frees up.
+    """
+
+    def __init__(self, min_interval: float = MIN_INTERVAL_SECONDS,
+                 max_interval: float = MAX_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.markets: Dict[str, MarketSchedule] = {}
+        self.calls_per_minute = 0.0
+        self._due: List[Tuple[float, str]] = []
+
+    def track(self, tickers: List[str], time_risks: Optional[Dict[str, float]] = None):
+        """Follow exactly these markets; new ones are due immediately"""
+        now = time.time()
+        wanted = set(tickers)
+        for ticker in [ticker for ticker in self.markets if ticker not in wanted]:
+            del self.markets[ticker]
+
+        for ticker in tickers:
+            market = self.markets.get(ticker)
+            if market is None:
+                market = self.markets[ticker] = MarketSchedule(ticker, now)
+                heapq.heappush(self._due, (market.next_due, ticker))
+            if time_risks and ticker in time_risks:
+                market.time_risk = time_risks[ticker]
+            market.update_score()
+
+    def rebalance(self, calls_per_minute: float):
+        """Resize every interval so the total polling rate fits `calls_per_minute`"""
+        self.calls_per_minute = calls_per_minute
+        if not self.markets:
+            return
+
+        markets = list(self.markets.values())
+        scores = [market.score for market in markets]
+        rates = _water_fill(scores, calls_per_minute / 60, 1 / self.max_interval, 1 / self.min_interval)
+        for market, rate in zip(markets, rates):
+            interval = 1 / rate
+            if market.last_refreshed is not None and not math.isclose(interval, market.interval):
+                # Pull a shortened interval's due time forward; let lengthened ones run out
+                due = market.last_refreshed + interval
+                if due < market.next_due:
+                    market.next_due = due
+                    heapq.heappush(self._due, (due, market.ticker))
+            market.interval = interval
+
+    def due(self, now: float, limit: int) -> List[str]:
+        """Pop up to `limit` markets whose refresh is due"""
+        tickers = []
+        while self._due and len(tickers) < limit and self._due[0][0] <= now:
+            next_due, ticker = heapq.heappop(self._due)
+            market = self.markets.get(ticker)
+            # Skip untracked markets and entries superseded by a rescheduling
+            if market is None or next_due != market.next_due:
+                continue
+            tickers.append(ticker)
+        return tickers
+
+    def next_due(self) -> Optional[float]:
+        while self._due:
+            next_due, ticker = self._due[0]
+            market = self.markets.get(ticker)
+            if market is not None and next_due == market.next_due:
+                return next_due
+            heapq.heappop(self._due)
+        return None
+
+    def record(self, ticker: str, changed: bool, liquidity: Optional[float] = None,
+               volatility: Optional[float] = None):
+        """Fold one refresh's observations into the market's signals and reschedule it"""
+        market = self.markets.get(ticker)
+        if market is None:
+            return
+        market.change_rate += SIGNAL_SMOOTHING * ((1.0 if changed else 0.0) - market.change_rate)
+        if liquidity is not None:
+            market.liquidity += SIGNAL_SMOOTHING * (liquidity - market.liquidity)
+        if volatility is not None:
+            market.volatility += SIGNAL_SMOOTHING * (volatility - market.volatility)
+        market.failures = 0
+        market.refreshes += 1
+        market.update_score()
+        self._reschedule(market, market.interval)
+
+    def record_failure(self, ticker: str):
+        """Back off a market whose refresh failed"""
+        market = self.markets.get(ticker)
+        if market is None:
+            return
+        market.failures += 1
+        self._reschedule(market, min(self.max_interval, market.interval * 2 ** market.failures))
+
+    def _reschedule(self, market: MarketSchedule, interval: float):
+        now = time.time()
+        market.last_refreshed = now
+        market.next_due = now + interval
+        heapq.heappush(self._due, (market.next_due, market.ticker))
+
+    def stats(self, limit: int = 100) -> Dict[str, Any]:
+        now = time.time()
+        markets = sorted(self.markets.values(), key=lambda market: market.interval)
+        return {
+            "tracked": len(self.markets),
+            "calls_per_minute": round(self.calls_per_minute, 3),
+            "scheduled_calls_per_minute": round(sum(60 / market.interval for market in markets), 3),
+            "markets": [market.to_dict(now) for market in markets[:limit]]
+        }
+
+def _water_fill(scores: List[float], total: float, low: float, high: float) -> List[float]:
+    """Rates proportional to score, clipped to [low, high], summing to `total` where possible"""
+    if total <= low * len(scores):
+        return [low] * len(scores)
+    if total >= high * len(scores):
+        return [high] * len(scores)
+
+    def spent(scale: float) -> float:
+        return sum(min(high, max(low, scale * score)) for score in scores)
+
+    lower, upper = 0.0, high / max(min(score for score in scores), 1e-9)
+    for _ in range(60):
+        middle = (lower + upper) / 2
+        if spent(middle) > total:
+            upper = middle
+        else:
+            lower = middle
+    return [min(high, max(low, lower * score)) for score in scores]
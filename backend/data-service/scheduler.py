@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional, Dict, Any, List
+from loguru import logger
+
+class Priority(IntEnum):
+    """Upstream request classes; lower values are served first"""
+    INTERACTIVE = 0  # A user is waiting on the response
+    BACKGROUND = 1   # Periodic refreshes: market sync, streams, dashboard sweeps
+    BULK = 2         # Backfills and exports
+
+# Seconds of waiting that lift a request by one priority class, so bulk work
+# queued behind a steady stream of interactive calls still gets through
+AGING_SECONDS = 5.0
+
+_priority: ContextVar[Priority] = ContextVar("upstream_priority", default=Priority.INTERACTIVE)
+
+@contextmanager
+def priority(level: Priority):
+    """Run upstream calls made inside the block at the given priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+class _Waiter:
+    __slots__ = ("priority", "sequence", "enqueued", "future")
+
+    def __init__(self, priority: Priority, sequence: int, future: asyncio.Future):
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued = time.monotonic()
+        self.future = future
+
+    def rank(self, now: float) -> tuple:
+        return (self.priority - (now - self.enqueued) / AGING_SECONDS, self.sequence)
+
+class ClassStats:
+    def __init__(self):
+        self.queued = 0
+        self.max_queued = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "dispatched": self.dispatched,
+            "avg_wait_ms": round(self.total_wait / self.dispatched * 1000, 3) if self.dispatched else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3)
+        }
+
+class RequestScheduler:
+    """Orders upstream calls by priority in front of the rate limiter.
+
+    A call runs straight away when a rate-limit slot and an in-flight slot
+    are both free and nothing is queued. Otherwise it waits in a queue that
+    is drained highest priority first, with ageing so lower classes are
+    never starved.
+    """
+
+    def __init__(self, rate_limiter, max_in_flight: int = 8):
+        self.rate_limiter = rate_limiter
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._waiting: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats_by_class: Dict[Priority, ClassStats] = {level: ClassStats() for level in Priority}
+
+    async def acquire(self, level: Optional[Priority] = None):
+        """Wait for an upstream slot; pair every call with release()"""
+        level = current_priority() if level is None else level
+        stats = self.stats_by_class[level]
+        started = time.monotonic()
+
+        if not self._waiting and self.in_flight < self.max_in_flight and self.rate_limiter.try_acquire():
+            self.in_flight += 1
+        else:
+            waiter = _Waiter(level, next(self._sequence), asyncio.get_running_loop().create_future())
+            self._waiting.append(waiter)
+            stats.queued += 1
+            stats.max_queued = max(stats.max_queued, stats.queued)
+            self._dispatch()
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    stats.queued -= 1
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just as we were cancelled; pass the slot on
+                    self.in_flight -= 1
+                    self._dispatch()
+                raise
+
+        waited = time.monotonic() - started
+        stats.dispatched += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant slots to the best-ranked waiters while capacity allows"""
+        # Waiters cancelled while queued may not have run their own cleanup yet;
+        # granting them a slot would leak it, so drop them first
+        for waiter in [waiter for waiter in self._waiting if waiter.future.done()]:
+            self._waiting.remove(waiter)
+            self.stats_by_class[waiter.priority].queued -= 1
+
+        while self._waiting and self.in_flight < self.max_in_flight:
+            if not self.rate_limiter.try_acquire():
+                self._schedule_retry(self.rate_limiter.seconds_until_available())
+                return
+
+            now = time.monotonic()
+            waiter = min(self._waiting, key=lambda candidate: candidate.rank(now))
+            self._waiting.remove(waiter)
+            self.stats_by_class[waiter.priority].queued -= 1
+            # The slot is counted here so later dispatches see it as taken
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _schedule_retry(self, delay: float):
+        if self._timer is not None:
+            return
+        logger.warning(f"Rate limit reached. {len(self._waiting)} upstream calls queued for {delay:.2f} seconds.")
+
+        def retry():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(max(delay, 0.01), retry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": len(self._waiting),
+            "classes": {level.name.lower(): self.stats_by_class[level].to_dict() for level in Priority}
+        }
@@ -0,0 +1,345 @@
+import re
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+from models import KalshiMarket
+from compact import CompactOrderBook, to_epoch
+
+# Metrics held as float64 columns; NaN until first computed
+NUMERIC_COLUMNS = (
+    "yes_price", "last_price", "volume", "open_interest", "expiry_ts",
+    "spread", "mid_price", "bid_depth", "ask_depth",
+    "liquidity_score", "volatility", "momentum", "risk_score", "updated_at"
+)
+
+# Labels held as integer codes into a per-column vocabulary
+TEXT_COLUMNS = ("status", "event_ticker", "series_ticker", "category")
+
+# Columns derived from stored ones when a screen runs
+VIRTUAL_COLUMNS = ("hours_to_expiry", "depth")
+
+COLUMNS = ("ticker",) + TEXT_COLUMNS + NUMERIC_COLUMNS + VIRTUAL_COLUMNS
+
+# Columns a screen returns when none are asked for
+DEFAULT_COLUMNS = (
+    "ticker", "status", "yes_price", "spread", "depth", "liquidity_score",
+    "volatility", "momentum", "risk_score", "hours_to_expiry"
+)
+
+INITIAL_CAPACITY = 1024
+
+class MetricsTable:
+    """One row of computed metrics per tracked market, stored column by column.
+
+    Rows are written as data arrives (market listings, order book and
+    trade refreshes, analytics requests) and never by a screen, so
+    screening the whole universe is a handful of vectorized comparisons
+    over arrays already in memory with no upstream calls.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.size = 0
+        self.tickers: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.numeric = {name: np.full(capacity, np.nan) for name in NUMERIC_COLUMNS}
+        self.codes = {name: np.full(capacity, -1, dtype=np.int32) for name in TEXT_COLUMNS}
+        self.vocabulary: Dict[str, Dict[str, int]] = {name: {} for name in TEXT_COLUMNS}
+        self.labels: Dict[str, List[str]] = {name: [] for name in TEXT_COLUMNS}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def update_markets(self, markets: List[KalshiMarket], removed: List[str]):
+        """Market store listener: refresh listing columns and drop removed markets"""
+        for ticker in removed:
+            self.remove(ticker)
+        for market in markets:
+            row = self._row(market.ticker)
+            for name in TEXT_COLUMNS:
+                value = getattr(market, name)
+                self.codes[name][row] = self._code(name, value.value if hasattr(value, "value") else value)
+            self.numeric["yes_price"][row] = _number(market.yes_price)
+            self.numeric["last_price"][row] = _number(market.last_price)
+            self.numeric["volume"][row] = _number(market.volume)
+            self.numeric["open_interest"][row] = _number(market.open_interest)
+            self.numeric["expiry_ts"][row] = to_epoch(market.expiry_date) if market.expiry_date else np.nan
+
+    def update(self, market_ticker: str, **values: Optional[float]):
+        """Set computed metrics for one market; None leaves a column unchanged"""
+        row = self._row(market_ticker)
+        for name, value in values.items():
+            if value is not None:
+                self.numeric[name][row] = value
+        self.numeric["updated_at"][row] = time.time()
+
+    def update_book(self, book: CompactOrderBook, liquidity_score: Optional[float] = None):
+        """Spread, mid and depth from a compact book, best levels first"""
+        best_bid, best_ask = book.best("yes_bids"), book.best("yes_asks")
+        self.update(
+            book.market_ticker,
+            spread=best_ask - best_bid,
+            mid_price=(best_ask + best_bid) / 2,
+            bid_depth=float(book.side("yes_bids")[1].sum()),
+            ask_depth=float(book.side("yes_asks")[1].sum()),
+            liquidity_score=liquidity_score
+        )
+
+    def remove(self, market_ticker: str):
+        """Drop a market by moving the last row into its slot"""
+        row = self.rows.pop(market_ticker, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved = self.tickers[last]
+            self.tickers[row] = moved
+            self.rows[moved] = row
+            for column in list(self.numeric.values()) + list(self.codes.values()):
+                column[row] = column[last]
+        self.tickers.pop()
+        for column in self.numeric.values():
+            column[last] = np.nan
+        for column in self.codes.values():
+            column[last] = -1
+        self.size = last
+
+    def column(self, name: str, now: Optional[float] = None) -> np.ndarray:
+        """Values of one column over the live rows; text columns come back as codes"""
+        if name in self.numeric:
+            return self.numeric[name][:self.size]
+        if name in self.codes:
+            return self.codes[name][:self.size]
+        if name == "hours_to_expiry":
+            return (self.numeric["expiry_ts"][:self.size] - (now or time.time())) / 3600
+        if name == "depth":
+            return self.numeric["bid_depth"][:self.size] + self.numeric["ask_depth"][:self.size]
+        if name == "ticker":
+            return np.array(self.tickers, dtype=object)
+        raise ValueError(f"Unknown column: {name}; expected one of {', '.join(COLUMNS)}")
+
+    def screen(self, where: Optional[str] = None, sort: Optional[str] = None,
+               columns: Optional[List[str]] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """Rows matching `where`, ordered by `sort`; returns the page and the number of matches.
+
+        `where` combines comparisons such as `spread < 2c and risk_score < 0.3`
+        with and/or/not and parentheses. `sort` is a comma-separated list of
+        columns, each prefixed with `-` for descending; missing values sort last.
+        """
+        columns = list(columns or DEFAULT_COLUMNS)
+        for name in columns:
+            if name not in COLUMNS:
+                raise ValueError(f"Unknown column: {name}; expected one of {', '.join(COLUMNS)}")
+
+        now = time.time()
+        matches = np.arange(self.size)
+        if where:
+            mask = Predicate(where).evaluate(self, now)
+            matches = np.flatnonzero(mask)
+
+        if sort:
+            keys = []
+            for term in sort.split(","):
+                term = term.strip()
+                descending = term.startswith("-")
+                values = self._sort_key(term.lstrip("+-"), now)[matches]
+                # lexsort puts NaN last ascending; flip the sign rather than the order to keep it there
+                keys.append(-values if descending else values)
+            matches = matches[np.lexsort(keys[::-1])]
+
+        page = matches[:limit]
+        values = {name: self._values(name, page, now) for name in columns}
+        rows = [{name: values[name][i] for name in columns} for i in range(len(page))]
+        return rows, len(matches)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "markets": self.size,
+            "capacity": len(self.numeric["updated_at"]),
+            "with_book_metrics": int(np.count_nonzero(~np.isnan(self.column("spread")))),
+            "with_trade_metrics": int(np.count_nonzero(~np.isnan(self.column("volatility")))),
+            "with_risk_score": int(np.count_nonzero(~np.isnan(self.column("risk_score"))))
+        }
+
+    def _row(self, market_ticker: str) -> int:
+        row = self.rows.get(market_ticker)
+        if row is not None:
+            return row
+        if self.size == len(self.numeric["updated_at"]):
+            self._grow()
+        row = self.rows[market_ticker] = self.size
+        self.tickers.append(market_ticker)
+        self.size += 1
+        return row
+
+    def _grow(self):
+        capacity = 2 * len(self.numeric["updated_at"])
+        for name, column in self.numeric.items():
+            grown = np.full(capacity, np.nan)
+            grown[:len(column)] = column
+            self.numeric[name] = grown
+        for name, column in self.codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:len(column)] = column
+            self.codes[name] = grown
+
+    def _code(self, name: str, label: Optional[str]) -> int:
+        if label is None:
+            return -1
+        vocabulary = self.vocabulary[name]
+        code = vocabulary.get(label)
+        if code is None:
+            code = vocabulary[label] = len(self.labels[name])
+            self.labels[name].append(label)
+        return code
+
+    def _sort_key(self, name: str, now: float) -> np.ndarray:
+        if name == "ticker":
+            return np.argsort(np.argsort(np.array(self.tickers))).astype(np.float64)
+        values = self.column(name, now)
+        if name in self.codes:
+            # Codes are in first-seen order; rank them alphabetically, missing last
+            labels = self.labels[name]
+            ranks = np.empty(len(labels) + 1)
+            ranks[np.argsort(np.array(labels, dtype=object))] = np.arange(len(labels))
+            ranks[-1] = np.nan
+            return ranks[values]
+        return values
+
+    def _values(self, name: str, rows: np.ndarray, now: float) -> List[Any]:
+        if name == "ticker":
+            return [self.tickers[row] for row in rows.tolist()]
+        values = self.column(name, now)[rows]
+        if name in self.codes:
+            labels = self.labels[name]
+            return [labels[code] if code >= 0 else None for code in values.tolist()]
+        return [None if np.isnan(value) else value for value in values.tolist()]
+
+def _number(value) -> float:
+    return np.nan if value is None else float(value)
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d*)?(?:[eE][+-]?\d+)?c?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op><=|>=|!=|==|=|<|>)
+      | (?P<paren>[()])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_.\-]*)
+    )""", re.VERBOSE)
+
+_COMPARISONS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "=": np.equal, "!=": np.not_equal
+}
+
+class Predicate:
+    """A parsed `where` expression, evaluated to a boolean mask over a MetricsTable.
+
+    Grammar: or-terms of and-terms of `not`, parentheses or `column op value`.
+    Numbers may carry a `c` suffix for cents (`2c` is 0.02); text columns
+    compare against quoted or bare labels with `=` / `!=`. Comparisons with
+    a missing metric are false.
+    """
+
+    def __init__(self, expression: str):
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+        self.tree = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.position][1]}' in where expression")
+
+    def evaluate(self, table: MetricsTable, now: Optional[float] = None) -> np.ndarray:
+        return self._evaluate(self.tree, table, now or time.time())
+
+    @staticmethod
+    def _tokenize(expression: str) -> List[Tuple[str, str]]:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _TOKEN.match(expression, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"Cannot parse where expression at: {expression[position:]!r}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "name" and value.lower() in ("and", "or", "not"):
+                kind, value = "keyword", value.lower()
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def _peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, kind: str, expected: str) -> str:
+        token_kind, value = self._peek()
+        if token_kind != kind:
+            raise ValueError(f"Expected {expected} in where expression, got {value or 'end of input'!r}")
+        self.position += 1
+        return value
+
+    def _or(self):
+        node = self._and()
+        while self._peek() == ("keyword", "or"):
+            self.position += 1
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._peek() == ("keyword", "and"):
+            self.position += 1
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        if self._peek() == ("keyword", "not"):
+            self.position += 1
+            return ("not", self._not())
+        if self._peek() == ("paren", "("):
+            self.position += 1
+            node = self._or()
+            if self._take("paren", "')'") != ")":
+                raise ValueError("Expected ')' in where expression")
+            return node
+        return self._comparison()
+
+    def _comparison(self):
+        column = self._take("name", "a column")
+        if column not in COLUMNS or column == "ticker":
+            raise ValueError(f"Cannot filter on {column}; expected one of {', '.join(COLUMNS[1:])}")
+        op = self._take("op", "a comparison")
+        kind, value = self._peek()
+        self.position += 1
+
+        if column in TEXT_COLUMNS:
+            if op not in ("=", "==", "!="):
+                raise ValueError(f"{column} only supports = and !=")
+            if kind == "string":
+                return ("text", column, op, value[1:-1])
+            if kind in ("name", "number"):
+                return ("text", column, op, value)
+            raise ValueError(f"Expected a label after {column} {op}")
+
+        if kind != "number":
+            raise ValueError(f"Expected a number after {column} {op}")
+        number = float(value[:-1]) / 100 if value.endswith("c") else float(value)
+        return ("numeric", column, op, number)
+
+    def _evaluate(self, node, table: MetricsTable, now: float) -> np.ndarray:
+        kind = node[0]
+        if kind == "and":
+            return self._evaluate(node[1], table, now) & self._evaluate(node[2], table, now)
+        if kind == "or":
+            return self._evaluate(node[1], table, now) | self._evaluate(node[2], table, now)
+        if kind == "not":
+            return ~self._evaluate(node[1], table, now)
+
+        _, column, op, value = node
+        if kind == "text":
+            codes = table.column(column)
+            # An unseen label matches nothing, so compare against an impossible code
+            return _COMPARISONS[op](codes, table.vocabulary[column].get(value, -2)) & (codes >= 0)
+        values = table.column(column, now)
+        return _COMPARISONS[op](values, value) & ~np.isnan(values)
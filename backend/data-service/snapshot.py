@@ -0,0 +1,219 @@
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+from loguru import logger
+
+from models import KalshiMarket, DashboardStats
+from compact import CompactOrderBook, TradeBuffer, TradeColumns, BOOK_SIDES
+
+# File layout: MAGIC, little-endian uint64 header length, JSON header, then
+# raw array sections at the offsets the header lists (relative to DATA_ALIGN
+# aligned data start), so numeric sections load straight out of the mapping.
+MAGIC = b"KSNAP\x00\x00\x01"
+HEADER_LENGTH = struct.Struct("<Q")
+DATA_ALIGN = 64
+
+# Trade columns stored as raw arrays; trade ids go into a JSON section
+TRADE_ARRAYS = ("timestamps", "prices", "sizes", "sides", "yes_no")
+
+class SnapshotData:
+    """Everything a warm start restores, captured at one point in time"""
+
+    def __init__(self, created_at: float,
+                 market_records: List[Dict[str, Any]],
+                 events: Dict[str, Dict[str, Any]],
+                 series: Dict[str, Dict[str, Any]],
+                 orderbooks: List[CompactOrderBook],
+                 trades: List[Tuple[TradeColumns, int]],
+                 dashboard_stats: Optional[Dict[str, Any]] = None,
+                 dashboard_stats_at: Optional[float] = None):
+        self.created_at = created_at
+        self.market_records = market_records
+        self.events = events
+        self.series = series
+        self.orderbooks = orderbooks
+        # (buffered trades oldest first, buffer capacity) per market
+        self.trades = trades
+        self.dashboard_stats = dashboard_stats
+        self.dashboard_stats_at = dashboard_stats_at
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+def capture(store, client, analytics) -> SnapshotData:
+    """Take references to the current caches; cheap enough to run on the event loop.
+
+    Market records and books are replaced rather than mutated, so holding
+    references is enough; trade buffers mutate in place and are copied.
+    """
+    stats = analytics.dashboard_stats
+    return SnapshotData(
+        created_at=time.time(),
+        market_records=store.records(),
+        events=dict(store.hierarchy.events),
+        series=dict(store.hierarchy.series),
+        orderbooks=list(client.orderbooks.values()),
+        trades=[(buffer.columns(), buffer.capacity) for buffer in client.trade_buffers.values() if len(buffer)],
+        dashboard_stats=stats.model_dump(mode="json") if stats is not None else None,
+        dashboard_stats_at=analytics.dashboard_stats_at if stats is not None else None
+    )
+
+def write(path: str, data: SnapshotData) -> int:
+    """Encode and atomically replace the snapshot file; returns its size in bytes"""
+    sections: List[Tuple[str, np.ndarray]] = []
+
+    def json_section(name: str, value: Any):
+        sections.append((name, np.frombuffer(json.dumps(value, separators=(",", ":")).encode(), dtype=np.uint8)))
+
+    json_section("markets", data.market_records)
+    json_section("events", data.events)
+    json_section("series", data.series)
+
+    books = data.orderbooks
+    sections.append(("book_prices", np.concatenate([book.prices for book in books]) if books else np.zeros(0)))
+    sections.append(("book_sizes", np.concatenate([book.sizes for book in books]) if books else np.zeros(0, np.int64)))
+    # Per-book side bounds shifted to absolute positions in the concatenated arrays
+    bases = np.cumsum([0] + [len(book.prices) for book in books[:-1]])
+    bounds = np.array([book.bounds for book in books], dtype=np.int64).reshape(-1, len(BOOK_SIDES) + 1)
+    sections.append(("book_bounds", (bounds + np.asarray(bases, dtype=np.int64)[:len(books), None]).reshape(-1)))
+    sections.append(("book_timestamps", np.array([book.timestamp for book in books], dtype=np.int64)))
+
+    trades = [columns for columns, _ in data.trades]
+    sections.append(("trade_offsets", np.cumsum([0] + [len(columns) for columns in trades]).astype(np.int64)))
+    for name in TRADE_ARRAYS:
+        arrays = [getattr(columns, name) for columns in trades]
+        dtype = getattr(TradeColumns.empty(""), name).dtype
+        sections.append((f"trade_{name}", np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype)))
+    json_section("trade_ids", [trade_id for columns in trades for trade_id in columns.trade_ids.tolist()])
+
+    layout = {}
+    offset = 0
+    for name, array in sections:
+        layout[name] = {"dtype": array.dtype.str, "offset": offset, "count": int(array.size)}
+        offset += -(-array.nbytes // DATA_ALIGN) * DATA_ALIGN
+
+    header = json.dumps({
+        "created_at": data.created_at,
+        "book_tickers": [book.market_ticker for book in books],
+        "trade_tickers": [columns.market_ticker for columns in trades],
+        "trade_capacities": [capacity for _, capacity in data.trades],
+        "dashboard_stats": data.dashboard_stats,
+        "dashboard_stats_at": data.dashboard_stats_at,
+        "sections": layout
+    }).encode()
+
+    prefix = len(MAGIC) + HEADER_LENGTH.size + len(header)
+    data_start = -(-prefix // DATA_ALIGN) * DATA_ALIGN
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(MAGIC)
+        handle.write(HEADER_LENGTH.pack(len(header)))
+        handle.write(header)
+        handle.write(b"\x00" * (data_start - prefix))
+        for name, array in sections:
+            handle.seek(data_start + layout[name]["offset"])
+            handle.write(array.tobytes())
+        handle.truncate(data_start + offset)
+    os.replace(temporary, path)
+    return data_start + offset
+
+def read(path: str) -> Optional[SnapshotData]:
+    """Memory-map and decode a snapshot; None when there is no usable file"""
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:len(MAGIC)] != MAGIC:
+            logger.warning(f"Ignoring snapshot {path}: unrecognised format")
+            return None
+
+        (header_length,) = HEADER_LENGTH.unpack_from(mapped, len(MAGIC))
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        header = json.loads(mapped[header_start:header_start + header_length])
+        data_start = -(-(header_start + header_length) // DATA_ALIGN) * DATA_ALIGN
+
+        def section(name: str) -> np.ndarray:
+            spec = header["sections"][name]
+            # Copy out of the mapping so it can be closed once loading is done
+            return np.frombuffer(
+                mapped, dtype=np.dtype(spec["dtype"]), count=spec["count"],
+                offset=data_start + spec["offset"]
+            ).copy()
+
+        def json_section(name: str) -> Any:
+            return json.loads(section(name).tobytes())
+
+        book_prices = section("book_prices")
+        book_sizes = section("book_sizes")
+        book_bounds = section("book_bounds").reshape(-1, len(BOOK_SIDES) + 1)
+        book_timestamps = section("book_timestamps")
+
+        orderbooks = []
+        for row, ticker in enumerate(header["book_tickers"]):
+            bounds = book_bounds[row]
+            start, stop = bounds[0], bounds[-1]
+            # Books are slices of the shared arrays, re-based to start at zero
+            orderbooks.append(CompactOrderBook.from_arrays(
+                ticker, book_prices[start:stop], book_sizes[start:stop],
+                bounds - start, book_timestamps[row]
+            ))
+
+        offsets = section("trade_offsets")
+        trade_arrays = {name: section(f"trade_{name}") for name in TRADE_ARRAYS}
+        trade_ids = np.array(json_section("trade_ids"), dtype=object)
+
+        trades = []
+        for row, (ticker, capacity) in enumerate(zip(header["trade_tickers"], header["trade_capacities"])):
+            start, stop = offsets[row], offsets[row + 1]
+            columns = TradeColumns(
+                ticker,
+                *(trade_arrays[name][start:stop] for name in TRADE_ARRAYS),
+                trade_ids[start:stop]
+            )
+            trades.append((columns, capacity))
+
+        return SnapshotData(
+            created_at=header["created_at"],
+            market_records=json_section("markets"),
+            events=json_section("events"),
+            # Snapshots written before series were kept have no series section
+            series=json_section("series") if "series" in header["sections"] else {},
+            orderbooks=orderbooks,
+            trades=trades,
+            dashboard_stats=header.get("dashboard_stats"),
+            dashboard_stats_at=header.get("dashboard_stats_at")
+        )
+
+def restore(data: SnapshotData, store, client, analytics):
+    """Load snapshot contents into the live caches ahead of the first sync"""
+    markets = []
+    for record in data.market_records:
+        try:
+            markets.append(KalshiMarket.parse_obj(record))
+        except Exception as e:
+            logger.warning(f"Skipping snapshot market {record.get('ticker')}: {e}")
+
+    store.apply(markets, complete=True)
+    store.hierarchy.apply_events(list(data.events.values()), complete=True)
+    store.hierarchy.apply_series(list(data.series.values()), complete=True)
+    store.ready = bool(markets)
+
+    for book in data.orderbooks:
+        client.orderbooks.setdefault(book.market_ticker, book)
+
+    for columns, capacity in data.trades:
+        buffer = client.trade_buffers.get(columns.market_ticker)
+        if buffer is None:
+            buffer = client.trade_buffers[columns.market_ticker] = TradeBuffer(columns.market_ticker, capacity)
+        buffer.extend_columns(columns)
+
+    if data.dashboard_stats is not None and analytics.dashboard_stats is None:
+        analytics.dashboard_stats = DashboardStats(**data.dashboard_stats)
+        analytics.dashboard_stats_at = data.dashboard_stats_at or data.created_at
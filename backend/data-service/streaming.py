@@ -0,0 +1,135 @@
+import asyncio
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, Set
+from loguru import logger
+from pydantic import BaseModel
+
+Producer = Callable[[], Awaitable[BaseModel]]
+
+class Subscription:
+    """Latest-value slot for one consumer.
+
+    Publishing never blocks: if the consumer has not read the previous value
+    yet it is overwritten, so a slow client only ever sees the newest update.
+    """
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.sequence = 0
+        self.coalesced = 0
+        # Latest model behind the payload, for consumers that encode it themselves (gRPC)
+        self.result: Optional[BaseModel] = None
+        self._payload: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    def publish(self, sequence: int, payload: str, result: Optional[BaseModel] = None):
+        if self._ready.is_set():
+            self.coalesced += 1
+        self.sequence = sequence
+        self._payload = payload
+        self.result = result
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Wait for the next value; returns None if nothing arrived within `timeout`"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        return self._payload
+
+class Topic:
+    def __init__(self, name: str, producer: Producer):
+        self.name = name
+        self.producer = producer
+        self.subscribers: Set[Subscription] = set()
+        self.sequence = 0
+        self.payload: Optional[str] = None
+        self.result: Optional[BaseModel] = None
+        self.updated_at: Optional[float] = None
+        self.refreshes = 0
+        self.errors = 0
+        self.task: Optional[asyncio.Task] = None
+
+class StreamHub:
+    """Shares one refresh loop per topic across all of its subscribers"""
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.topics: Dict[str, Topic] = {}
+
+    def subscribe(self, name: str, producer: Producer) -> Subscription:
+        """Join a topic, starting its refresh loop if this is the first subscriber"""
+        topic = self.topics.get(name)
+        if topic is None:
+            topic = self.topics[name] = Topic(name, producer)
+            topic.task = asyncio.create_task(self._run(topic))
+            logger.info(f"Started stream topic {name}")
+
+        subscription = Subscription(name)
+        topic.subscribers.add(subscription)
+
+        # New subscribers get the current value straight away
+        if topic.payload is not None:
+            subscription.publish(topic.sequence, topic.payload, topic.result)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Leave a topic, stopping its refresh loop once nobody is listening"""
+        topic = self.topics.get(subscription.topic)
+        if topic is None:
+            return
+
+        topic.subscribers.discard(subscription)
+        if not topic.subscribers:
+            if topic.task:
+                topic.task.cancel()
+            del self.topics[topic.name]
+            logger.info(f"Stopped stream topic {topic.name}")
+
+    async def close(self):
+        for topic in list(self.topics.values()):
+            if topic.task:
+                topic.task.cancel()
+        self.topics.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "refresh_interval": self.refresh_interval,
+            "topics": {
+                name: {
+                    "subscribers": len(topic.subscribers),
+                    "sequence": topic.sequence,
+                    "refreshes": topic.refreshes,
+                    "errors": topic.errors,
+                    "age_seconds": round(now - topic.updated_at, 3) if topic.updated_at else None,
+                    "coalesced": sum(subscription.coalesced for subscription in topic.subscribers)
+                }
+                for name, topic in self.topics.items()
+            }
+        }
+
+    async def _run(self, topic: Topic):
+        """Compute the topic once per interval and fan the encoded result out"""
+        while True:
+            try:
+                result = await topic.producer()
+                # Encode once; every subscriber gets the same string
+                payload = result.model_dump_json(by_alias=True)
+                topic.sequence += 1
+                topic.payload = payload
+                topic.result = result
+                topic.updated_at = time.time()
+                topic.refreshes += 1
+                for subscription in list(topic.subscribers):
+                    subscription.publish(topic.sequence, payload, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                topic.errors += 1
+                logger.warning(f"Stream topic {topic.name} refresh failed: {e}")
+
+            await asyncio.sleep(self.refresh_interval)
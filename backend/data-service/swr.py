@@ -0,0 +1,177 @@
+import asyncio
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable
+
+from loguru import logger
+
+class CacheStatus(str, Enum):
+    FRESH = "fresh"        # Within its fresh window; no refresh
+    STALE = "stale"        # Served at once while one background refresh runs
+    MISS = "miss"          # Nothing usable was cached; waited for upstream
+    ERROR = "stale-error"  # Upstream failed or was too slow; served the last good result
+
+class Served:
+    """A cached value and how old it was when served"""
+
+    __slots__ = ("value", "status", "age", "fresh_seconds", "stale_seconds", "max_stale_seconds", "error")
+
+    def __init__(self, value: Any, status: CacheStatus, age: float, fresh_seconds: float,
+                 stale_seconds: float, max_stale_seconds: float, error: Optional[str] = None):
+        self.value = value
+        self.status = status
+        self.age = age
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.error = error
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "Age": str(int(self.age)),
+            "X-Data-Age": f"{self.age:.3f}",
+            "X-Cache-Status": self.status.value,
+            "Cache-Control": (
+                f"max-age={max(0, int(self.fresh_seconds - self.age))}, "
+                f"stale-while-revalidate={int(self.stale_seconds)}, "
+                f"stale-if-error={int(self.max_stale_seconds)}"
+            )
+        }
+        if self.error:
+            headers["X-Cache-Error"] = self.error[:200]
+        return headers
+
+class Entry:
+    __slots__ = ("value", "fetched_at", "refresh", "failed_at", "error")
+
+    def __init__(self):
+        self.value: Any = None
+        self.fetched_at: Optional[float] = None
+        # The one refresh in flight for this key, shared by every waiter
+        self.refresh: Optional[asyncio.Task] = None
+        self.failed_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def age(self, now: float) -> float:
+        return now - self.fetched_at if self.fetched_at is not None else float("inf")
+
+class StaleWhileRevalidate:
+    """Endpoint-level cache that answers from the last good result and refreshes behind it.
+
+    Within `fresh_seconds` a result is served as is. For `stale_seconds`
+    after that it is still served immediately while a single background
+    refresh runs. Past that the request waits for upstream, but for no
+    longer than `wait_seconds`, and if upstream fails or is too slow the
+    last good result is served anyway until it is `max_stale_seconds`
+    old. Only then does the caller see the upstream error.
+    """
+
+    def __init__(self, fresh_seconds: float = 5.0, stale_seconds: float = 60.0,
+                 max_stale_seconds: float = 900.0, wait_seconds: float = 2.0,
+                 max_entries: int = 4096,
+                 background: Optional[Callable[[Callable[[], Awaitable]], Callable[[], Awaitable]]] = None):
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.wait_seconds = wait_seconds
+        self.max_entries = max_entries
+        # Wraps refreshes nobody is waiting on, e.g. to lower their upstream priority
+        self.background = background or (lambda fetch: fetch)
+        self.entries: "OrderedDict[Hashable, Entry]" = OrderedDict()
+        self.served = {status: 0 for status in CacheStatus}
+        self.refreshes = 0
+        self.failures = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]],
+                  fresh_seconds: Optional[float] = None) -> Served:
+        """Serve `key`, calling `fetch` for a new value only when it is due"""
+        fresh_seconds = self.fresh_seconds if fresh_seconds is None else fresh_seconds
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = Entry()
+            self._evict()
+        else:
+            self.entries.move_to_end(key)
+
+        age = entry.age(now)
+        if age < fresh_seconds:
+            return self._serve(entry, CacheStatus.FRESH, now, fresh_seconds)
+
+        if age < fresh_seconds + self.stale_seconds:
+            # Back off for a fresh window after a failed refresh instead of retrying on every request
+            if entry.refresh is None and (entry.failed_at is None or now - entry.failed_at >= fresh_seconds):
+                self._start_refresh(key, entry, self.background(fetch))
+            return self._serve(entry, CacheStatus.STALE, now, fresh_seconds)
+
+        usable = age < self.max_stale_seconds
+        if entry.refresh is None:
+            if usable and entry.failed_at is not None and now - entry.failed_at < fresh_seconds:
+                return self._serve(entry, CacheStatus.ERROR, now, fresh_seconds)
+            self._start_refresh(key, entry, fetch)
+        refresh = entry.refresh
+        try:
+            failure = await asyncio.wait_for(asyncio.shield(refresh), self.wait_seconds if usable else None)
+        except asyncio.TimeoutError:
+            return self._serve(entry, CacheStatus.ERROR, time.time(), fresh_seconds,
+                               error=f"Upstream slower than {self.wait_seconds:g}s")
+        if failure is not None:
+            if usable:
+                return self._serve(entry, CacheStatus.ERROR, time.time(), fresh_seconds)
+            raise failure
+        return self._serve(entry, CacheStatus.MISS, time.time(), fresh_seconds)
+
+    def _start_refresh(self, key: Hashable, entry: Entry, fetch: Callable[[], Awaitable[Any]]):
+        self.refreshes += 1
+        entry.refresh = asyncio.create_task(self._refresh(key, entry, fetch))
+
+    async def _refresh(self, key: Hashable, entry: Entry,
+                       fetch: Callable[[], Awaitable[Any]]) -> Optional[Exception]:
+        """Fetch into the entry; returns the failure rather than raising it, as nobody may be waiting"""
+        try:
+            entry.value = await fetch()
+            entry.fetched_at = time.time()
+            entry.failed_at = None
+            entry.error = None
+        except Exception as e:
+            self.failures += 1
+            entry.failed_at = time.time()
+            entry.error = str(e)
+            logger.debug(f"Refresh of {key} failed: {e}")
+            return e
+        finally:
+            entry.refresh = None
+
+    def _serve(self, entry: Entry, status: CacheStatus, now: float, fresh_seconds: float,
+               error: Optional[str] = None) -> Served:
+        self.served[status] += 1
+        return Served(
+            entry.value, status, max(0.0, entry.age(now)), fresh_seconds,
+            self.stale_seconds, self.max_stale_seconds, error or entry.error
+        )
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            key, entry = next(iter(self.entries.items()))
+            if entry.refresh is not None:
+                # Never drop an entry with waiters; move it back and stop
+                self.entries.move_to_end(key)
+                break
+            del self.entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        ages = [entry.age(now) for entry in self.entries.values() if entry.fetched_at is not None]
+        return {
+            "entries": len(self.entries),
+            "refreshing": sum(1 for entry in self.entries.values() if entry.refresh is not None),
+            "served": {status.value: count for status, count in self.served.items()},
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "oldest_seconds": round(max(ages), 3) if ages else None,
+            "fresh_seconds": self.fresh_seconds,
+            "stale_seconds": self.stale_seconds,
+            "max_stale_seconds": self.max_stale_seconds,
+            "wait_seconds": self.wait_seconds
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service runs from its own directory with flat module imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import pytest
+
+from budget import UpstreamBudget, AdmissionMode, BudgetExhausted, _current
+
+class FixedLimiter:
+    requests_per_minute = 60
+
+    def __init__(self, used: int):
+        self.used = used
+
+    def remaining(self) -> int:
+        return self.requests_per_minute - self.used
+
+    def seconds_until_available(self) -> float:
+        return 1.0
+
+@pytest.mark.parametrize("used, mode", [
+    (0, AdmissionMode.FULL),
+    (8, AdmissionMode.DEGRADED),
+    (40, AdmissionMode.DEGRADED),
+    (48, AdmissionMode.CACHED)
+])
+def test_expensive_degradable_route_degrades_before_serving_cached(used, mode):
+    budget = UpstreamBudget(FixedLimiter(used))
+    admission = budget.admit("/dashboard/stats", 53, degraded_cost=13)
+    assert admission.mode == mode
+    budget.release(admission)
+    assert _current.get() is None
+
+def test_expensive_route_without_cheaper_plan_is_rejected():
+    budget = UpstreamBudget(FixedLimiter(50))
+    with pytest.raises(BudgetExhausted):
+        budget.admit("/export/markets/{market_ticker}/trades", 10)
+
+def test_background_calls_draw_on_their_reserved_share():
+    budget = UpstreamBudget(FixedLimiter(18), background_fraction=0.3)
+    for _ in range(18):
+        budget.charge(background=True)
+    assert budget.interactive_remaining() == 42
+    admission = budget.admit("/markets/{market_ticker}/analytics", 3)
+    assert admission.mode == AdmissionMode.FULL
+    budget.release(admission)
+
+def test_background_calls_beyond_their_share_reduce_interactive_budget():
+    budget = UpstreamBudget(FixedLimiter(50), background_fraction=0.3)
+    for _ in range(50):
+        budget.charge(background=True)
+    assert budget.interactive_remaining() == 10
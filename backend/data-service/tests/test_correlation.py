@@ -0,0 +1,25 @@
+import math
+
+from correlation import RollingCorrelation
+
+def test_source_change_skips_the_next_return():
+    tracker = RollingCorrelation(window=10, interval_seconds=1.0)
+    tracker.track(["A"])
+    tracker.observe({"A": 0.50}, 0.0, sources={"A": "last"})
+    tracker.observe({"A": 0.52}, 1.0, sources={"A": "last"})
+    # The book mid sits half a spread away from the last trade
+    tracker.observe({"A": 0.60}, 2.0, sources={"A": "book"})
+    tracker.observe({"A": 0.61}, 3.0, sources={"A": "book"})
+    tracker.observe({"A": 0.61}, 4.0, sources={"A": "book"})
+
+    returns = tracker._returns[:tracker.filled, tracker.slots["A"]]
+    assert math.isnan(returns[2])
+    assert [round(value, 6) for value in returns[[1, 3]]] == [0.02, 0.01]
+    assert tracker.sources == {"A": "book"}
+
+def test_dropped_market_forgets_its_source():
+    tracker = RollingCorrelation(window=10, interval_seconds=1.0)
+    tracker.track(["A", "B"])
+    tracker.observe({"A": 0.5, "B": 0.4}, 0.0, sources={"A": "book", "B": "last"})
+    tracker.track(["A"])
+    assert tracker.sources == {"A": "book"}
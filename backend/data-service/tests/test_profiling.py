@@ -0,0 +1,37 @@
+import asyncio
+
+import profiling
+
+def request_work():
+    return sum(range(20000))
+
+def other_work():
+    return sum(range(20000))
+
+def test_hotspots_cover_only_the_requests_own_phases():
+    async def other():
+        for _ in range(5):
+            other_work()
+            await asyncio.sleep(0)
+
+    async def request():
+        profile, token = profiling.start_request_profile()
+        try:
+            with profiling.phase("upstream_io"):
+                await asyncio.sleep(0.01)
+            with profiling.phase("compute"):
+                request_work()
+        finally:
+            report = profile.finish()
+            profiling.end_request_profile(token)
+        return report
+
+    async def scenario():
+        report, _ = await asyncio.gather(request(), other())
+        return report
+
+    report = asyncio.run(scenario())
+    functions = [hotspot["function"] for hotspot in report["hotspots"]]
+    assert any("request_work" in function for function in functions)
+    assert not any("other_work" in function for function in functions)
+    assert set(report["phases"]) == {"upstream_io", "compute"}
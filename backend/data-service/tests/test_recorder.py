@@ -0,0 +1,32 @@
+import asyncio
+import threading
+import time
+
+from recorder import MarketRecorder
+
+def test_close_waits_for_the_write_in_flight(tmp_path):
+    async def scenario():
+        recorder = MarketRecorder(str(tmp_path), flush_seconds=0.01)
+        writing = threading.Lock()
+        batches = []
+
+        def slow_write(batch):
+            # A second writer arriving while the first still runs would fail to take the lock
+            assert writing.acquire(blocking=False)
+            try:
+                time.sleep(0.1)
+                batches.append(len(batch))
+            finally:
+                writing.release()
+
+        recorder._write = slow_write
+        task = asyncio.create_task(recorder.run())
+        recorder._pending.append((0, 0, None))
+        await asyncio.sleep(0.05)
+        # The first batch is being written; this one is left for close()
+        recorder._pending.append((0, 0, None))
+        await recorder.close()
+        await asyncio.wait_for(task, timeout=1)
+        return batches
+
+    assert asyncio.run(scenario()) == [1, 1]
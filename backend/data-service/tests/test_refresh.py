@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+import main
+from analytics import AnalyticsEngine
+from market_store import MarketStore
+from models import KalshiMarket
+from refresh import RefreshScheduler
+
+def market(ticker: str, expiration_time: str) -> KalshiMarket:
+    return KalshiMarket.parse_obj({
+        "ticker": ticker, "title": ticker, "event_ticker": "EV", "status": "open",
+        "expiration_time": expiration_time
+    })
+
+def test_rebalance_tracks_markets_with_aware_expiries(monkeypatch):
+    soon = (datetime.now(timezone.utc) + timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    store = MarketStore()
+    store.apply([market("SOON", soon), market("LATER", "2099-12-01T00:00:00Z")])
+    monkeypatch.setattr(main, "market_store", store)
+    monkeypatch.setattr(main, "analytics_engine", AnalyticsEngine())
+
+    scheduler = RefreshScheduler()
+    tickers = ["SOON", "LATER", "UNKNOWN"]
+    risks = main.time_risks(tickers)
+    scheduler.track(tickers, risks)
+    scheduler.rebalance(60)
+
+    assert set(scheduler.markets) == set(tickers)
+    assert risks["LATER"] == 0
+    assert 0.9 < risks["SOON"] < 1
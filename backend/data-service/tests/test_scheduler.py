@@ -0,0 +1,29 @@
+import asyncio
+
+from kalshi_client import RateLimiter
+from scheduler import RequestScheduler, Priority
+
+def test_release_skips_waiter_cancelled_while_queued():
+    async def scenario():
+        scheduler = RequestScheduler(RateLimiter(600), max_in_flight=1)
+        await scheduler.acquire()
+
+        queued = asyncio.create_task(scheduler.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 1
+
+        # Cancel without letting the waiter's own handler run, then free the slot
+        queued.cancel()
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+        await asyncio.wait_for(scheduler.acquire(), timeout=1)
+        assert scheduler.in_flight == 1
+        scheduler.release()
+
+        await asyncio.gather(queued, return_exceptions=True)
+        assert scheduler.in_flight == 0
+        assert scheduler.stats()["queued"] == 0
+        assert scheduler.stats_by_class[Priority.BACKGROUND].queued == 0
+
+    asyncio.run(scenario())
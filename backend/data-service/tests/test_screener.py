@@ -0,0 +1,20 @@
+import time
+from datetime import datetime, timezone
+
+from models import KalshiMarket
+from screener import MetricsTable
+
+def test_naive_expiry_is_read_as_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        table = MetricsTable()
+        table.update_markets([KalshiMarket.parse_obj({
+            "ticker": "X", "title": "X", "event_ticker": "EV", "status": "open",
+            "expiration_time": datetime(2026, 12, 1)
+        })], [])
+        expected = datetime(2026, 12, 1, tzinfo=timezone.utc).timestamp()
+        assert table.numeric["expiry_ts"][table.rows["X"]] == expected
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
@@ -0,0 +1,142 @@
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from compact import TradeColumns, SIDE_CODES, YES_NO_CODES
+from models import OrderSide
+
+# Trailing windows for VWAP and order-flow imbalance, ending at the latest trade
+WINDOWS_MS = {"5m": 5 * 60_000, "1h": 60 * 60_000, "24h": 24 * 60 * 60_000}
+
+# How long after a trade the quote midpoint is read for its realized spread
+REALIZED_SPREAD_HORIZON_MS = 5 * 60_000
+
+# Consecutive trades per bucket when regressing midpoint moves on order flow
+KYLE_BUCKET_TRADES = 10
+
+_BID = SIDE_CODES[OrderSide.BID]
+_YES = YES_NO_CODES["yes"]
+
+def trade_signs(trades: TradeColumns) -> np.ndarray:
+    """+1 where the taker bought yes exposure, -1 where they sold it.
+
+    A taker buying no is selling yes, so the yes/no leg flips the sign of
+    the bid/ask side and every trade is signed on the yes price scale.
+    """
+    buys = trades.sides == _BID
+    yes = trades.yes_no == _YES
+    return np.where(buys == yes, 1.0, -1.0)
+
+def quote_midpoints(prices: np.ndarray, signs: np.ndarray) -> np.ndarray:
+    """Midpoint proxy after each trade: halfway between the latest buy and latest sell.
+
+    Buys fill near the ask and sells near the bid, so without a quote
+    history the last fill on each side stands in for that side's quote.
+    NaN until both sides have traded.
+    """
+    index = np.arange(len(prices))
+    last_buy = np.maximum.accumulate(np.where(signs > 0, index, -1))
+    last_sell = np.maximum.accumulate(np.where(signs < 0, index, -1))
+    seen = (last_buy >= 0) & (last_sell >= 0)
+    return np.where(seen, (prices[last_buy] + prices[last_sell]) / 2, np.nan)
+
+def trade_flow(trades: TradeColumns, windows_ms: Dict[str, int] = WINDOWS_MS,
+               horizon_ms: int = REALIZED_SPREAD_HORIZON_MS) -> Dict[str, Any]:
+    """Microstructure metrics for one market's trades, in a single vectorized pass.
+
+    Prefix sums of volume, notional and signed volume are built once and
+    every window reads two entries of them. Spreads are in price units and
+    volume-weighted; the effective spread splits into the realized spread
+    (what liquidity providers kept after `horizon_ms`) and price impact
+    (what the market moved against them). Kyle's lambda is the slope of
+    midpoint changes on net signed size, in price per contract.
+    """
+    count = len(trades)
+    if count and np.any(np.diff(trades.timestamps) < 0):
+        trades = trades.sorted()
+
+    timestamps = trades.timestamps
+    prices = trades.prices
+    sizes = trades.sizes.astype(np.float64)
+    signs = trade_signs(trades)
+
+    volume = np.concatenate(([0.0], np.cumsum(sizes)))
+    notional = np.concatenate(([0.0], np.cumsum(prices * sizes)))
+    flow = np.concatenate(([0.0], np.cumsum(signs * sizes)))
+
+    names = list(windows_ms) + ["all"]
+    if count:
+        spans = np.array([windows_ms[name] for name in windows_ms], dtype=np.int64)
+        starts = np.append(np.searchsorted(timestamps, timestamps[-1] - spans, side="right"), 0)
+    else:
+        starts = np.zeros(len(names), dtype=np.int64)
+    window_volume = volume[-1] - volume[starts]
+    window_trades = count - starts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = (notional[-1] - notional[starts]) / window_volume
+        imbalance = (flow[-1] - flow[starts]) / window_volume
+
+    metrics: Dict[str, Any] = {
+        "trades": count,
+        "windows": [
+            {
+                "window": name,
+                "trades": int(window_trades[i]),
+                "volume": int(window_volume[i]),
+                "vwap": _finite(vwap[i]),
+                "order_flow_imbalance": _finite(imbalance[i])
+            }
+            for i, name in enumerate(names)
+        ],
+        "order_flow_imbalance": _finite(imbalance[-1]),
+        "size_distribution": None,
+        "kyle_lambda": None,
+        "effective_spread": None,
+        "mean_effective_spread": None,
+        "realized_spread": None,
+        "price_impact": None
+    }
+    if count == 0:
+        return metrics
+
+    median, p90 = np.percentile(sizes, [50, 90])
+    metrics["size_distribution"] = {
+        "mean": float(sizes.mean()),
+        "median": float(median),
+        "p90": float(p90),
+        "max": int(sizes.max()),
+        "large_trade_share": float(sizes[sizes >= p90].sum() / volume[-1]) if volume[-1] > 0 else None
+    }
+
+    # Midpoint standing just before each trade, and where it stood `horizon_ms` later
+    midpoints = quote_midpoints(prices, signs)
+    before = np.concatenate(([np.nan], midpoints[:-1]))
+    ahead = np.searchsorted(timestamps, timestamps + horizon_ms, side="right") - 1
+    after = np.where(timestamps + horizon_ms <= timestamps[-1], midpoints[ahead], np.nan)
+
+    effective = 2 * signs * (prices - before)
+    realized = 2 * signs * (prices - after)
+    metrics["effective_spread"] = _weighted_mean(effective, sizes)
+    metrics["mean_effective_spread"] = _weighted_mean(effective, np.ones(count))
+    metrics["realized_spread"] = _weighted_mean(realized, sizes)
+    metrics["price_impact"] = _weighted_mean(effective - realized, sizes)
+
+    # Kyle's lambda over buckets of trades, which average out the proxy's lag behind the true midpoint
+    buckets = np.arange(0, count, KYLE_BUCKET_TRADES)
+    net_flow = np.add.reduceat(signs * sizes, buckets)[1:]
+    moves = np.diff(midpoints[np.minimum(buckets + KYLE_BUCKET_TRADES, count) - 1])
+    valid = np.isfinite(moves)
+    if np.count_nonzero(valid) >= 3:
+        flow_dev = net_flow[valid] - net_flow[valid].mean()
+        variance = float(flow_dev @ flow_dev)
+        if variance > 0:
+            metrics["kyle_lambda"] = float(flow_dev @ (moves[valid] - moves[valid].mean())) / variance
+    return metrics
+
+def _weighted_mean(values: np.ndarray, weights: np.ndarray) -> Optional[float]:
+    valid = np.isfinite(values)
+    total = float(weights[valid].sum())
+    return float(values[valid] @ weights[valid]) / total if total > 0 else None
+
+def _finite(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None